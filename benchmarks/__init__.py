@@ -0,0 +1 @@
+"""Offline benchmarks for Home Assistant Template Metrics."""
@@ -0,0 +1,290 @@
+"""Benchmark the render-and-export pipeline on synthetic Home Assistant states.
+
+Every scenario fills a fresh state machine, renders a metric configuration
+through the coordinator and exports the collected data points through each
+exporter stage, once through OpenTelemetry and once through the direct
+backend's SeriesStore. Results are printed and can be written as JSON to compare
+releases.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --entities 1000 --series 1000 \\
+        --output results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, Sequence
+
+import snappy
+from homeassistant.const import __version__ as HA_VERSION
+from homeassistant.core import HomeAssistant
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.resources import Resource
+
+from custom_components.template_metrics.const import DOMAIN, METER
+from custom_components.template_metrics.coordinator import (
+    TemplateMetricsCoordinator,
+)
+from custom_components.template_metrics.direct import DirectMeterProvider
+from custom_components.template_metrics.prometheus_remote_write import (
+    PrometheusRemoteWriteMetricsExporter,
+    SeriesStore,
+)
+
+DEFAULT_ENTITY_COUNTS = (1_000, 10_000, 50_000)
+DEFAULT_SERIES_COUNTS = (1_000, 10_000)
+METRIC_COUNT = 50
+ENDPOINT = "http://127.0.0.1:9/api/v1/write"
+
+
+def populate_states(hass: HomeAssistant, entity_count: int) -> None:
+    """Create battery sensors with a realistic attribute set."""
+    for index in range(entity_count):
+        hass.states.async_set(
+            f"sensor.device_{index}_battery",
+            str(index % 100),
+            {
+                "friendly_name": f"Device {index} Battery",
+                "device_class": "battery",
+                "unit_of_measurement": "%",
+                "type": "AAA" if index % 3 else "CR2032",
+                "area": f"area_{index % 20}",
+            },
+        )
+
+
+def _entity(index: int, entity_count: int) -> str:
+    return f"sensor.device_{index * entity_count // METRIC_COUNT}_battery"
+
+
+def metric_configs(
+    entity_count: int, series_counts: Sequence[int]
+) -> Dict[str, list[Dict[str, Any]]]:
+    """Return the metric configurations to render against entity_count states."""
+    configs = {
+        "simple": [
+            {
+                "name": f"battery_level_{index}",
+                "template": f"{{{{ states('{_entity(index, entity_count)}') "
+                "| float(0) }}",
+            }
+            for index in range(METRIC_COUNT)
+        ],
+        "attributes": [
+            {
+                "name": f"battery_level_{index}",
+                "template": f"{{{{ states('{_entity(index, entity_count)}') "
+                "| float(0) }}",
+                "attributes": {
+                    f"attribute_{attribute}": (
+                        f"{{{{ state_attr('{_entity(index, entity_count)}', "
+                        f"'{name}') }}}}"
+                    )
+                    for attribute, name in enumerate(
+                        (
+                            "friendly_name",
+                            "device_class",
+                            "type",
+                            "area",
+                            "unit_of_measurement",
+                        )
+                    )
+                },
+            }
+            for index in range(METRIC_COUNT)
+        ],
+    }
+    for series_count in series_counts:
+        if series_count > entity_count:
+            continue
+        configs[f"json_{series_count}"] = [
+            {
+                "name": "battery_level",
+                "template": (
+                    "[{% for s in (states.sensor | list)[:"
+                    f"{series_count}"
+                    "] %}"
+                    '{"value": {{ s.state | float(0) }}, "attributes": '
+                    '{"entity_id": "{{ s.entity_id }}", '
+                    '"type": "{{ s.attributes.type }}", '
+                    '"area": "{{ s.attributes.area }}"}}'
+                    '{{ "," if not loop.last }}{% endfor %}]'
+                ),
+            }
+        ]
+    return configs
+
+
+def _timings(samples: Sequence[float]) -> Dict[str, float]:
+    return {"best": min(samples), "mean": statistics.fmean(samples)}
+
+
+def _measure(repeat: int, func, *args) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return _timings(samples)
+
+
+async def bench_scenario(
+    hass: HomeAssistant, metrics: list[Dict[str, Any]], repeat: int
+) -> Dict[str, Any]:
+    """Measure a coordinator cycle and each exporter stage for one config."""
+    reader = InMemoryMetricReader()
+    provider = MeterProvider(
+        resource=Resource(attributes={"service.name": "homeassistant"}),
+        metric_readers=[reader],
+    )
+    hass.data[DOMAIN] = {METER: provider.get_meter("bench")}
+    coordinator = TemplateMetricsCoordinator(
+        hass, config={"metrics": metrics, "instance_label": "bench"}
+    )
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = await coordinator._async_update_data()
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    await coordinator._async_update_data()
+    _, cycle_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    metrics_data = reader.get_metrics_data()
+    provider.shutdown()
+
+    store = SeriesStore({"service.name": "homeassistant"})
+    hass.data[DOMAIN] = {METER: DirectMeterProvider(store).get_meter("bench")}
+    direct_coordinator = TemplateMetricsCoordinator(
+        hass, config={"metrics": metrics, "instance_label": "bench"}
+    )
+    direct_samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await direct_coordinator._async_update_data()
+        direct_samples.append(time.perf_counter() - start)
+
+    exporter = PrometheusRemoteWriteMetricsExporter(ENDPOINT)
+    try:
+        translate_cold = []
+        for _ in range(repeat):
+            exporter._label_cache.clear()
+            start = time.perf_counter()
+            exporter._translate_data(metrics_data)
+            translate_cold.append(time.perf_counter() - start)
+        series = exporter._translate_data(metrics_data)
+        translate_warm = _measure(repeat, exporter._translate_data, metrics_data)
+        translate_store = []
+        for _ in range(repeat):
+            await direct_coordinator._async_update_data()
+            start = time.perf_counter()
+            exporter._translate_store(store)
+            translate_store.append(time.perf_counter() - start)
+        build_v1 = _measure(repeat, exporter._build_message, series)
+        build_v2 = _measure(repeat, exporter._build_message_v2, series)
+        payload = exporter._build_message(series)
+        compress = _measure(repeat, snappy.compress, payload)
+    finally:
+        exporter.shutdown(timeout_millis=1_000)
+
+    return {
+        "metrics": len(metrics),
+        "series": sum(len(item) for item in data["series"].values()),
+        "cycle_seconds": _timings(samples),
+        "cycle_peak_bytes": cycle_peak,
+        "direct_cycle_seconds": _timings(direct_samples),
+        "translate_cold_seconds": _timings(translate_cold),
+        "translate_warm_seconds": translate_warm,
+        "translate_store_seconds": _timings(translate_store),
+        "build_message_v1_seconds": build_v1,
+        "build_message_v2_seconds": build_v2,
+        "payload_bytes": len(payload),
+        "compressed_bytes": len(snappy.compress(payload)),
+        "snappy_seconds": compress,
+        "snappy_mb_per_second": len(payload) / compress["best"] / 1_000_000,
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(
+    entity_counts: Sequence[int], series_counts: Sequence[int], repeat: int
+) -> Dict[str, Any]:
+    results = []
+    print(
+        f"{'entities':>9} {'config':>11} {'series':>7} {'cycle s':>9} "
+        f"{'direct s':>9} {'peak MiB':>9} {'translate s':>12} {'store s':>9} "
+        f"{'build s':>9} {'snappy MB/s':>12}"
+    )
+    for entity_count in entity_counts:
+        with tempfile.TemporaryDirectory() as config_dir:
+            hass = HomeAssistant(config_dir)
+            populate_states(hass, entity_count)
+            for name, metrics in metric_configs(entity_count, series_counts).items():
+                result = await bench_scenario(hass, metrics, repeat)
+                result = {"entities": entity_count, "config": name, **result}
+                results.append(result)
+                print(
+                    f"{entity_count:>9} {name:>11} {result['series']:>7} "
+                    f"{result['cycle_seconds']['best']:>9.4f} "
+                    f"{result['direct_cycle_seconds']['best']:>9.4f} "
+                    f"{result['cycle_peak_bytes'] / 2**20:>9.2f} "
+                    f"{result['translate_warm_seconds']['best']:>12.4f} "
+                    f"{result['translate_store_seconds']['best']:>9.4f} "
+                    f"{result['build_message_v1_seconds']['best']:>9.4f} "
+                    f"{result['snappy_mb_per_second']:>12.1f}"
+                )
+            await hass.async_stop(force=True)
+    return {
+        "metadata": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "homeassistant": HA_VERSION,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--entities", type=int, nargs="+", default=DEFAULT_ENTITY_COUNTS
+    )
+    parser.add_argument("--series", type=int, nargs="+", default=DEFAULT_SERIES_COUNTS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.entities, args.series, args.repeat))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
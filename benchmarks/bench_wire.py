@@ -0,0 +1,113 @@
+"""Compare the wire encoder with the generated protobuf classes.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_wire
+    python -m benchmarks.bench_wire --samples 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from custom_components.template_metrics.prometheus_remote_write.gen.remote_pb2 import (
+    WriteRequest,
+)
+from custom_components.template_metrics.prometheus_remote_write.gen.types_pb2 import (
+    Label,
+    Sample,
+    TimeSeries,
+)
+from custom_components.template_metrics.prometheus_remote_write.wire import (
+    WriteRequestEncoder,
+    encode_label_block,
+)
+
+DEFAULT_SAMPLE_COUNTS = (10_000, 100_000, 1_000_000)
+TIMESTAMP = 1_760_000_000_000
+
+
+def make_series(sample_count: int):
+    """Build one sample per series with a realistic battery label set."""
+    return [
+        (
+            (
+                ("__name__", "battery_notes_quantity"),
+                ("entity_id", f"sensor.device_{index}_battery_type"),
+                ("friendly_name", f"Device {index} Battery type"),
+                ("instance", "ha-main"),
+                ("service_name", "homeassistant"),
+                ("type", "AAA" if index % 3 else "CR2032"),
+            ),
+            [(float(index % 4), TIMESTAMP)],
+        )
+        for index in range(sample_count)
+    ]
+
+
+def encode_generated(series) -> bytes:
+    write_request = WriteRequest()
+    for labels, samples in series:
+        timeseries = TimeSeries()
+        for name, value in labels:
+            label = Label()
+            label.name = name
+            label.value = value
+            timeseries.labels.append(label)
+        for value, timestamp in samples:
+            sample = Sample()
+            sample.value = value
+            sample.timestamp = timestamp
+            timeseries.samples.append(sample)
+        write_request.timeseries.append(timeseries)
+    return write_request.SerializeToString()
+
+
+def encode_wire(encoder: WriteRequestEncoder, series) -> bytes:
+    return encoder.encode_v1(
+        (encode_label_block(labels), samples) for labels, samples in series
+    )
+
+
+def encode_wire_cached(encoder: WriteRequestEncoder, blocks, series) -> bytes:
+    return encoder.encode_v1(
+        (block, samples) for block, (_, samples) in zip(blocks, series)
+    )
+
+
+def _best_of(repeat: int, func, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, nargs="+", default=DEFAULT_SAMPLE_COUNTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    encoder = WriteRequestEncoder()
+    print(
+        f"{'samples':>10} {'generated s':>12} {'wire s':>10} {'cached s':>10} "
+        f"{'speedup':>8}"
+    )
+    for sample_count in args.samples:
+        series = make_series(sample_count)
+        assert encode_wire(encoder, series) == encode_generated(series)
+        generated = _best_of(args.repeat, encode_generated, series)
+        wire = _best_of(args.repeat, encode_wire, encoder, series)
+        blocks = [encode_label_block(labels) for labels, _ in series]
+        cached = _best_of(args.repeat, encode_wire_cached, encoder, blocks, series)
+        print(
+            f"{sample_count:>10} {generated:>12.3f} {wire:>10.3f} {cached:>10.3f} "
+            f"{generated / cached:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
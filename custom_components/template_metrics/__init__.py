@@ -2,53 +2,268 @@
 
 from __future__ import annotations
 
+import asyncio
+import importlib
 import logging
-from typing import Any, Dict
-import base64
+from datetime import timedelta
+from functools import partial
+from typing import TYPE_CHECKING, Any, Dict
 
 import voluptuous as vol
 from homeassistant.const import (
     Platform,
 )
 from homeassistant.core import (
+    Event,
     HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
 )
 from homeassistant.const import EVENT_HOMEASSISTANT_STOP
 from homeassistant.helpers.discovery import async_load_platform
-from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.exceptions import ConfigEntryNotReady, HomeAssistantError
 from homeassistant.helpers import config_validation as cv
-from opentelemetry import metrics
-from .prometheus_remote_write import (
-    PrometheusRemoteWriteMetricsExporter,
-)
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
-from opentelemetry.sdk.resources import Resource
-
+from homeassistant.helpers.reload import async_integration_yaml_config
+from homeassistant.util import dt as dt_util
 from .const import (
     COORDINATOR,
     DOMAIN,
     USER,
     TOKEN,
     REMOTE_WRITE_URL,
+    REMOTE_WRITE_VERSION,
+    REMOTE_WRITE_VERSION_1,
+    REMOTE_WRITE_VERSIONS,
+    COMPRESSION,
+    COMPRESSION_CODECS,
+    WRITE_RELABEL_CONFIGS,
+    RELABEL_ACTION,
+    RELABEL_ACTIONS,
+    SOURCE_LABELS,
+    SEPARATOR,
+    REGEX,
+    TARGET_LABEL,
+    REPLACEMENT,
+    MODULUS,
+    REMOTE_WRITE,
+    TARGET_URL,
+    TIMEOUT,
+    QUEUE_SIZE,
+    MAX_RETRIES,
+    FAILURE_THRESHOLD,
+    RESET_TIMEOUT,
+    FILE_SINK,
+    FILE_SINK_PATH,
+    MAX_FILE_SIZE,
+    MAX_FILE_AGE,
+    MAX_TOTAL_SIZE,
+    FSYNC_INTERVAL,
+    SCRAPE_ENDPOINT,
+    EXPORT_MODE,
+    EXPORT_MODE_PERIODIC,
+    EXPORT_MODE_COORDINATOR,
+    BACKEND,
+    BACKEND_OTEL,
+    BACKEND_DIRECT,
+    SEND_ON_CHANGE,
+    HEARTBEAT,
+    SELF_METRICS,
     UPDATE_INTERVAL,
+    RENDER_INTERVAL,
+    RENDER_BUDGET_MS,
+    MIN_INTERVAL,
+    COST_ENTITY,
+    COST_DOMAIN,
+    COST_ALL_STATES,
+    ADAPTIVE_INTERVAL,
+    MAX_INTERVAL,
+    UNCHANGED_RENDERS,
+    PUSH_ON,
+    PUSH_ENTITIES,
+    PUSH_EVENTS,
+    PUSH_DEBOUNCE,
+    SHUTDOWN_TIMEOUT,
     METRICS,
     TEMPLATE_NAME,
     TEMPLATE,
     TEMPLATE_ATTRIBUTES,
     INSTANCE_LABEL,
+    RESOURCE_ATTRIBUTES,
     METER,
     PROVIDER,
+    READER,
+    SAMPLE_BUFFER,
+    EXPORT_STATS,
+    SERIES_STORE,
+    EXPORTER,
+    SERVICE_SLOWEST_TEMPLATES,
+    SERVICE_RELOAD,
+    SERVICE_BACKFILL,
+    SERVICE_SHIP,
+    SERVICE_PUSH,
+    ATTR_TOP,
+    ATTR_START,
+    ATTR_END,
+    ATTR_STEP,
+    ATTR_METRICS,
+    ATTR_MAX_SAMPLES,
+    ATTR_REQUEST_INTERVAL,
+    ATTR_URL,
+    ATTR_USER,
+    ATTR_TOKEN,
+    ATTR_KEEP,
 )
 from .coordinator import TemplateMetricsCoordinator
 
+if TYPE_CHECKING:
+    from .telemetry import Telemetry
+
 _LOGGER = logging.getLogger(__name__)
 
+# State changes of the entities and events that push a metric right away.
+PUSH_ON_SCHEMA = vol.Schema(
+    {
+        vol.Optional(PUSH_ENTITIES, default=[]): cv.entity_ids,
+        vol.Optional(PUSH_EVENTS, default=[]): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+
 TEMPLATE_SCHEMA = vol.Schema(
     {
         vol.Required(TEMPLATE_NAME): cv.string,
         vol.Required(TEMPLATE): cv.string,
         vol.Optional(TEMPLATE_ATTRIBUTES, default={}): {cv.string: cv.string},
+        vol.Optional(PUSH_ON): PUSH_ON_SCHEMA,
+    }
+)
+
+# cv.positive_int accepts 0, which the targets and the file sink reject.
+AT_LEAST_ONE = vol.All(vol.Coerce(int), vol.Range(min=1))
+
+REMOTE_WRITE_VERSION_SCHEMA = vol.All(vol.Coerce(str), vol.In(REMOTE_WRITE_VERSIONS))
+
+REMOTE_WRITE_TARGET_SCHEMA = vol.Schema(
+    {
+        vol.Required(TARGET_URL): cv.url,
+        vol.Inclusive(USER, "credentials"): cv.string,
+        vol.Inclusive(TOKEN, "credentials"): cv.string,
+        vol.Optional(TIMEOUT, default=30): AT_LEAST_ONE,
+        vol.Optional(REMOTE_WRITE_VERSION): REMOTE_WRITE_VERSION_SCHEMA,
+        vol.Optional(COMPRESSION): vol.In(COMPRESSION_CODECS),
+        vol.Optional(QUEUE_SIZE, default=10): AT_LEAST_ONE,
+        vol.Optional(MAX_RETRIES, default=3): cv.positive_int,
+        vol.Optional(FAILURE_THRESHOLD, default=5): AT_LEAST_ONE,
+        vol.Optional(RESET_TIMEOUT, default=60): cv.positive_int,
+    }
+)
+
+
+def _file_sink_sizes_valid(config: Dict[str, Any]) -> Dict[str, Any]:
+    if config[MAX_FILE_SIZE] > config[MAX_TOTAL_SIZE]:
+        raise vol.Invalid(f"{MAX_FILE_SIZE} cannot exceed {MAX_TOTAL_SIZE}")
+    return config
+
+
+FILE_SINK_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Required(FILE_SINK_PATH): cv.string,
+            vol.Optional(MAX_FILE_SIZE, default=16): AT_LEAST_ONE,
+            vol.Optional(MAX_FILE_AGE, default=3600): cv.positive_int,
+            vol.Optional(MAX_TOTAL_SIZE, default=512): AT_LEAST_ONE,
+            vol.Optional(FSYNC_INTERVAL, default=60): cv.positive_int,
+        }
+    ),
+    _file_sink_sizes_valid,
+)
+
+
+def _relabel_rule_valid(rule: Dict[str, Any]) -> Dict[str, Any]:
+    cv.is_regex(rule[REGEX])
+    action = rule[RELABEL_ACTION]
+    if action in ("replace", "hashmod", "lowercase", "uppercase") and not rule.get(
+        TARGET_LABEL
+    ):
+        raise vol.Invalid(f"Relabel action {action} needs a {TARGET_LABEL}")
+    if action == "hashmod" and MODULUS not in rule:
+        raise vol.Invalid(f"Relabel action hashmod needs a {MODULUS}")
+    return rule
+
+
+# Prometheus write_relabel_configs, applied to every series before it is sent.
+RELABEL_RULE_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(RELABEL_ACTION, default="replace"): vol.In(RELABEL_ACTIONS),
+            vol.Optional(SOURCE_LABELS, default=[]): vol.All(
+                cv.ensure_list, [cv.string]
+            ),
+            vol.Optional(SEPARATOR, default=";"): cv.string,
+            vol.Optional(REGEX, default="(.*)"): cv.string,
+            vol.Optional(TARGET_LABEL): cv.string,
+            vol.Optional(REPLACEMENT, default="$1"): cv.string,
+            vol.Optional(MODULUS): AT_LEAST_ONE,
+        }
+    ),
+    _relabel_rule_valid,
+)
+
+# Options the reload service applies; the rest configure the export pipeline.
+RELOADABLE_OPTIONS = (
+    METRICS,
+    INSTANCE_LABEL,
+    RENDER_BUDGET_MS,
+    MIN_INTERVAL,
+    ADAPTIVE_INTERVAL,
+    PUSH_DEBOUNCE,
+)
+
+# Seconds between renders of a metric by the most expensive state access of
+# its templates. Skipped renders export the last rendered value.
+MIN_INTERVAL_SCHEMA = vol.Schema(
+    {
+        vol.Optional(COST_ENTITY, default=0): cv.positive_int,
+        vol.Optional(COST_DOMAIN, default=60): cv.positive_int,
+        vol.Optional(COST_ALL_STATES, default=300): cv.positive_int,
+    }
+)
+
+# Metrics whose output did not change for unchanged_renders renders are
+# rendered less and less often, up to every max_interval seconds.
+ADAPTIVE_INTERVAL_SCHEMA = vol.Schema(
+    {
+        vol.Optional(MAX_INTERVAL, default=600): cv.positive_int,
+        vol.Optional(UNCHANGED_RENDERS, default=3): cv.positive_int,
+    }
+)
+
+SLOWEST_TEMPLATES_SCHEMA = vol.Schema(
+    {vol.Optional(ATTR_TOP, default=10): cv.positive_int}
+)
+
+BACKFILL_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_STEP): cv.positive_int,
+        vol.Optional(ATTR_METRICS): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_MAX_SAMPLES, default=5000): cv.positive_int,
+        vol.Optional(ATTR_REQUEST_INTERVAL, default=1.0): cv.positive_float,
+    }
+)
+
+PUSH_SCHEMA = vol.Schema(
+    {vol.Optional(ATTR_METRICS): vol.All(cv.ensure_list, [cv.string])}
+)
+
+SHIP_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_URL): cv.url,
+        vol.Inclusive(ATTR_USER, "credentials"): cv.string,
+        vol.Inclusive(ATTR_TOKEN, "credentials"): cv.string,
+        vol.Optional(ATTR_KEEP, default=False): cv.boolean,
     }
 )
 
@@ -56,10 +271,37 @@ CONFIG_SCHEMA = vol.Schema(
     {
         DOMAIN: vol.Schema(
             {
-                vol.Required(USER): cv.string,
-                vol.Required(TOKEN): cv.string,
-                vol.Required(REMOTE_WRITE_URL): cv.url,
+                vol.Inclusive(USER, "credentials"): cv.string,
+                vol.Inclusive(TOKEN, "credentials"): cv.string,
+                vol.Optional(REMOTE_WRITE_URL): cv.url,
+                vol.Optional(REMOTE_WRITE, default=[]): vol.All(
+                    cv.ensure_list, [REMOTE_WRITE_TARGET_SCHEMA]
+                ),
+                vol.Optional(FILE_SINK): FILE_SINK_SCHEMA,
+                vol.Optional(WRITE_RELABEL_CONFIGS, default=[]): vol.All(
+                    cv.ensure_list, [RELABEL_RULE_SCHEMA]
+                ),
+                vol.Optional(
+                    REMOTE_WRITE_VERSION, default=REMOTE_WRITE_VERSION_1
+                ): REMOTE_WRITE_VERSION_SCHEMA,
+                vol.Optional(COMPRESSION, default="snappy"): vol.In(COMPRESSION_CODECS),
                 vol.Optional(UPDATE_INTERVAL, default=60): cv.positive_int,
+                vol.Optional(RENDER_INTERVAL): cv.positive_int,
+                vol.Optional(RENDER_BUDGET_MS): cv.positive_float,
+                vol.Optional(MIN_INTERVAL, default={}): MIN_INTERVAL_SCHEMA,
+                vol.Optional(ADAPTIVE_INTERVAL): ADAPTIVE_INTERVAL_SCHEMA,
+                vol.Optional(PUSH_DEBOUNCE, default=0.5): cv.positive_float,
+                vol.Optional(SHUTDOWN_TIMEOUT, default=10): cv.positive_float,
+                vol.Optional(SCRAPE_ENDPOINT, default=False): cv.boolean,
+                vol.Optional(EXPORT_MODE, default=EXPORT_MODE_PERIODIC): vol.In(
+                    [EXPORT_MODE_PERIODIC, EXPORT_MODE_COORDINATOR]
+                ),
+                vol.Optional(BACKEND, default=BACKEND_OTEL): vol.In(
+                    [BACKEND_OTEL, BACKEND_DIRECT]
+                ),
+                vol.Optional(SEND_ON_CHANGE, default=False): cv.boolean,
+                vol.Optional(HEARTBEAT, default=240): AT_LEAST_ONE,
+                vol.Optional(SELF_METRICS, default=False): cv.boolean,
                 vol.Optional(INSTANCE_LABEL): cv.string,
                 vol.Required(METRICS): vol.All(
                     cv.ensure_list,
@@ -72,6 +314,34 @@ CONFIG_SCHEMA = vol.Schema(
 )
 
 
+def _config_valid(config_data: Dict[str, Any]) -> bool:
+    if (
+        (USER in config_data and (not config_data[USER] or not config_data[TOKEN]))
+        or not (
+            config_data.get(REMOTE_WRITE_URL)
+            or config_data.get(REMOTE_WRITE)
+            or config_data.get(FILE_SINK)
+            or config_data.get(SCRAPE_ENDPOINT)
+        )
+        or not len(config_data[METRICS])
+        or (INSTANCE_LABEL in config_data and not config_data[INSTANCE_LABEL])
+        or config_data.get(RENDER_INTERVAL, 0) > config_data.get(UPDATE_INTERVAL, 60)
+    ):
+        _LOGGER.error(
+            "A remote write target, file sink or the scrape endpoint, and at least "
+            "one metric "
+            "must be provided, and render_interval cannot exceed update_interval"
+        )
+        return False
+    return True
+
+
+def _setup_telemetry(config_data: Dict[str, Any]) -> Telemetry:
+    from .telemetry import setup_telemetry  # pylint: disable=import-outside-toplevel
+
+    return setup_telemetry(config_data)
+
+
 async def async_setup(hass: HomeAssistant, config: Dict[str, Any]) -> bool:
     """Set up the integration."""
     if DOMAIN not in config:
@@ -80,43 +350,59 @@ async def async_setup(hass: HomeAssistant, config: Dict[str, Any]) -> bool:
     config_data = config[DOMAIN]
     hass.data.setdefault(DOMAIN, {})
 
-    if (
-        not config_data[USER]
-        or not config_data[TOKEN]
-        or not config_data[REMOTE_WRITE_URL]
-        or not len(config_data[METRICS])
-        or (INSTANCE_LABEL in config_data and not config_data[INSTANCE_LABEL])
-    ):
-        _LOGGER.error(
-            "User, Token, Remote Write URL and at least one metric must be provided"
-        )
+    if not _config_valid(config_data):
         raise ConfigEntryNotReady
 
-    resource_attributes = {"service.name": "homeassistant"}
-
-    provider = MeterProvider(
-        resource=Resource(attributes=resource_attributes),
-        metric_readers=[
-            PeriodicExportingMetricReader(
-                PrometheusRemoteWriteMetricsExporter(
-                    endpoint=config_data[REMOTE_WRITE_URL],
-                    headers={
-                        "Authorization": f"Basic {base64.b64encode(f'{config_data[USER]}:{config_data[TOKEN]}'.encode()).decode()}"
-                    },
+    telemetry_config = config_data
+    if FILE_SINK in config_data:
+        # Relative sink paths are relative to the configuration directory.
+        telemetry_config = {
+            **config_data,
+            FILE_SINK: {
+                **config_data[FILE_SINK],
+                FILE_SINK_PATH: hass.config.path(
+                    config_data[FILE_SINK][FILE_SINK_PATH]
                 ),
-                export_interval_millis=1000 * config_data.get(UPDATE_INTERVAL, 60),
-            )
-        ],
-    )
-    metrics.set_meter_provider(provider)
-    hass.data[DOMAIN][METER] = metrics.get_meter("ha_metrics")
+            },
+        }
+    # Imported in the executor to keep the OpenTelemetry SDK, snappy and the
+    # protobuf modules off the event loop and Home Assistant's startup path.
+    telemetry = await hass.async_add_executor_job(_setup_telemetry, telemetry_config)
+    provider = telemetry.provider
+    hass.data[DOMAIN][METER] = telemetry.meter
     hass.data[DOMAIN][PROVIDER] = provider
+    if telemetry.reader is not None:
+        hass.data[DOMAIN][READER] = telemetry.reader
+    if telemetry.sample_buffer is not None:
+        hass.data[DOMAIN][SAMPLE_BUFFER] = telemetry.sample_buffer
+    if telemetry.stats is not None:
+        hass.data[DOMAIN][EXPORT_STATS] = telemetry.stats
+    if telemetry.series_store is not None:
+        hass.data[DOMAIN][SERIES_STORE] = telemetry.series_store
+    if telemetry.exporter is not None:
+        hass.data[DOMAIN][EXPORTER] = telemetry.exporter
+    if telemetry.file_sink is not None:
+        hass.data[DOMAIN][FILE_SINK] = telemetry.file_sink
 
     # Ensure OpenTelemetry background threads are shut down when HA stops
+    shutdown_timeout = config_data.get(SHUTDOWN_TIMEOUT, 10)
+
     async def _shutdown_otel(_event):
         try:
-            # The SDK exposes a shutdown on the provider to flush and stop readers
-            provider.shutdown()
+            # The provider flushes and stops its readers and exporter. It runs
+            # in the executor so the final sends cannot block the event loop,
+            # and HA stop waits for it no longer than shutdown_timeout.
+            await asyncio.wait_for(
+                hass.async_add_executor_job(
+                    partial(provider.shutdown, timeout_millis=shutdown_timeout * 1000)
+                ),
+                shutdown_timeout,
+            )
+        except TimeoutError:
+            _LOGGER.warning(
+                "Metrics were not flushed within %s seconds of shutdown",
+                shutdown_timeout,
+            )
         except Exception as err:
             _LOGGER.debug("Error during OpenTelemetry shutdown: %s", err)
 
@@ -126,6 +412,8 @@ async def async_setup(hass: HomeAssistant, config: Dict[str, Any]) -> bool:
         hass,
         config=config_data,
     )
+    # Templates that do not compile are left out instead of failing setup.
+    await coordinator.async_validate_templates()
     await coordinator.async_refresh()
 
     if not coordinator.last_update_success:
@@ -133,7 +421,191 @@ async def async_setup(hass: HomeAssistant, config: Dict[str, Any]) -> bool:
 
     hass.data[DOMAIN][COORDINATOR] = coordinator
 
+    @callback
+    def _shutdown_push(_event: Event) -> None:
+        coordinator.async_shutdown_push()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _shutdown_push)
+
+    async def _async_slowest_templates(call: ServiceCall) -> ServiceResponse:
+        return {"templates": coordinator.template_report(call.data[ATTR_TOP])}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SLOWEST_TEMPLATES,
+        _async_slowest_templates,
+        schema=SLOWEST_TEMPLATES_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def _async_reload(call: ServiceCall) -> ServiceResponse:
+        config = await async_integration_yaml_config(hass, DOMAIN)
+        if not config or DOMAIN not in config or not _config_valid(config[DOMAIN]):
+            raise HomeAssistantError("The template_metrics configuration is invalid")
+        new_config = config[DOMAIN]
+        # The exporter, its targets and the meter provider are kept as they
+        # are, so only the metrics and their labels can change on reload.
+        restart_required = sorted(
+            key
+            for key in new_config.keys() | coordinator.config.keys()
+            if key not in RELOADABLE_OPTIONS
+            and new_config.get(key) != coordinator.config.get(key)
+        )
+        if restart_required:
+            _LOGGER.warning(
+                "Changes to %s take effect after a restart",
+                ", ".join(restart_required),
+            )
+        diff = coordinator.async_reload(new_config)
+        _LOGGER.info(
+            "Reloaded metrics: %s added, %s changed, %s removed",
+            len(diff["added"]),
+            len(diff["changed"]),
+            len(diff["removed"]),
+        )
+        invalid = await coordinator.async_validate_templates()
+        await coordinator.async_refresh()
+        return {**diff, "invalid": invalid, "restart_required": restart_required}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_RELOAD,
+        _async_reload,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def _async_backfill(call: ServiceCall) -> ServiceResponse:
+        exporter = hass.data[DOMAIN].get(EXPORTER)
+        if exporter is None:
+            raise HomeAssistantError("Backfill needs a remote write target")
+        if "recorder" not in hass.config.components:
+            raise HomeAssistantError("Backfill needs the recorder integration")
+        start = dt_util.as_utc(call.data[ATTR_START])
+        end = dt_util.as_utc(call.data.get(ATTR_END) or dt_util.utcnow())
+        if start >= end:
+            raise HomeAssistantError("The backfill start must be before its end")
+        metrics = coordinator.config[METRICS]
+        if ATTR_METRICS in call.data:
+            unknown = set(call.data[ATTR_METRICS]) - {
+                metric[TEMPLATE_NAME] for metric in metrics
+            }
+            if unknown:
+                raise HomeAssistantError(
+                    f"Unknown metrics: {', '.join(sorted(unknown))}"
+                )
+            metrics = [
+                metric
+                for metric in metrics
+                if metric[TEMPLATE_NAME] in call.data[ATTR_METRICS]
+            ]
+        step = call.data.get(ATTR_STEP, coordinator.config.get(UPDATE_INTERVAL, 60))
+        # Imported here so the recorder is only needed when backfilling.
+        backfill = await hass.async_add_import_executor_job(
+            importlib.import_module, f"{__name__}.backfill"
+        )
+        summary = await backfill.async_backfill(
+            hass,
+            coordinator,
+            exporter,
+            metrics,
+            start,
+            end,
+            timedelta(seconds=step),
+            call.data[ATTR_MAX_SAMPLES],
+            call.data[ATTR_REQUEST_INTERVAL],
+        )
+        _LOGGER.info(
+            "Backfilled %s samples from %s to %s in %s requests",
+            summary["samples"],
+            start,
+            end,
+            summary["requests"],
+        )
+        return summary
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_BACKFILL,
+        _async_backfill,
+        schema=BACKFILL_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def _async_push(call: ServiceCall) -> ServiceResponse:
+        names = [metric[TEMPLATE_NAME] for metric in coordinator.config[METRICS]]
+        if ATTR_METRICS in call.data:
+            unknown = set(call.data[ATTR_METRICS]) - set(names)
+            if unknown:
+                raise HomeAssistantError(
+                    f"Unknown metrics: {', '.join(sorted(unknown))}"
+                )
+            names = call.data[ATTR_METRICS]
+        return {"pushed": await coordinator.async_push(names)}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PUSH,
+        _async_push,
+        schema=PUSH_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    if telemetry.file_sink is not None:
+        file_sink = telemetry.file_sink
+
+        async def _async_ship(call: ServiceCall) -> ServiceResponse:
+            sink = await hass.async_add_import_executor_job(
+                importlib.import_module, f"{__name__}.prometheus_remote_write.sink"
+            )
+            basic_auth = None
+            if ATTR_USER in call.data:
+                basic_auth = {
+                    "username": call.data[ATTR_USER],
+                    "password": call.data[ATTR_TOKEN],
+                }
+
+            def _ship() -> Dict[str, int]:
+                # Close the current segment so everything written so far ships.
+                file_sink.rotate()
+                return sink.ship(
+                    file_sink.closed_segments(),
+                    call.data[ATTR_URL],
+                    basic_auth=basic_auth,
+                    delete=not call.data[ATTR_KEEP],
+                )
+
+            try:
+                summary = await hass.async_add_executor_job(_ship)
+            except (OSError, ValueError) as err:
+                raise HomeAssistantError(f"Shipping metrics failed: {err}") from err
+            _LOGGER.info(
+                "Shipped %s frames from %s segments to %s",
+                summary["frames"],
+                summary["segments"],
+                call.data[ATTR_URL],
+            )
+            return summary
+
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_SHIP,
+            _async_ship,
+            schema=SHIP_SCHEMA,
+            supports_response=SupportsResponse.OPTIONAL,
+        )
+
+    if config_data.get(SCRAPE_ENDPOINT):
+        # Imported here so the http component is only needed when scraping.
+        scrape = await hass.async_add_import_executor_job(
+            importlib.import_module, f"{__name__}.scrape"
+        )
+        hass.http.register_view(
+            scrape.TemplateMetricsScrapeView(coordinator, RESOURCE_ATTRIBUTES)
+        )
+
     await async_load_platform(hass, Platform.BINARY_SENSOR, DOMAIN, {}, config)
     await async_load_platform(hass, Platform.SWITCH, DOMAIN, {}, config)
+    if EXPORT_STATS in hass.data[DOMAIN]:
+        await async_load_platform(hass, Platform.SENSOR, DOMAIN, {}, config)
 
     return True
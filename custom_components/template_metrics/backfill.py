@@ -0,0 +1,207 @@
+"""Replay metric templates against recorder history."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import ChainMap, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Tuple
+
+from homeassistant.components.recorder import get_instance, history
+from homeassistant.core import HomeAssistant, State
+from homeassistant.exceptions import TemplateError
+from homeassistant.helpers.template import Template, TemplateEnvironment
+from homeassistant.helpers.update_coordinator import UpdateFailed
+
+from .const import TEMPLATE_ATTRIBUTES
+from .coordinator import TemplateMetricsCoordinator
+from .prometheus_remote_write import PrometheusRemoteWriteMetricsExporter
+
+_LOGGER = logging.getLogger(__name__)
+
+# Recorder history is fetched one page at a time to bound memory.
+HISTORY_PAGE = timedelta(hours=1)
+
+SamplesType = Dict[str, Dict[Tuple[Tuple[str, Any], ...], list[Tuple[float, int]]]]
+
+
+class HistoricalStates:
+    """Read-only state machine holding the states at one point in the past.
+
+    It implements the part of StateMachine that templates read.
+    """
+
+    def __init__(self) -> None:
+        self._states: Dict[str, State] = {}
+
+    def set(self, state: State) -> None:
+        self._states[state.entity_id] = state
+
+    def get(self, entity_id: str) -> State | None:
+        return self._states.get(entity_id.lower())
+
+    def async_all(
+        self, domain_filter: str | Iterable[str] | None = None
+    ) -> list[State]:
+        if domain_filter is None:
+            return list(self._states.values())
+        if isinstance(domain_filter, str):
+            domain_filter = (domain_filter,)
+        domains = {domain.lower() for domain in domain_filter}
+        return [state for state in self._states.values() if state.domain in domains]
+
+    def async_entity_ids(
+        self, domain_filter: str | Iterable[str] | None = None
+    ) -> list[str]:
+        return [state.entity_id for state in self.async_all(domain_filter)]
+
+    def async_entity_ids_count(self, domain_filter: str | None = None) -> int:
+        return len(self.async_all(domain_filter))
+
+
+class _HistoricalHass:
+    """Home Assistant as templates see it, with its states replaced by history.
+
+    Template environments bind the hass they were created with, so the ones
+    cached for the live instance are masked and a separate one is built.
+    """
+
+    def __init__(self, hass: HomeAssistant, states: HistoricalStates) -> None:
+        self._hass = hass
+        self.states = states
+        self.data = ChainMap(
+            {
+                key: None
+                for key, value in hass.data.items()
+                if isinstance(value, TemplateEnvironment)
+            },
+            hass.data,
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._hass, name)
+
+
+def _tracked_entities(hass: HomeAssistant, sources: Iterable[str]) -> list[str]:
+    """Entities the templates read now, which are the ones to fetch history for."""
+    entity_ids: set[str] = set()
+    for source in sources:
+        info = Template(source, hass).async_render_to_info()
+        if info.all_states or info.all_states_lifecycle:
+            return hass.states.async_entity_ids()
+        entity_ids.update(info.entities)
+        domains = info.domains | info.domains_lifecycle
+        if domains:
+            entity_ids.update(hass.states.async_entity_ids(domains))
+    return sorted(entity_ids)
+
+
+async def async_backfill(
+    hass: HomeAssistant,
+    coordinator: TemplateMetricsCoordinator,
+    exporter: PrometheusRemoteWriteMetricsExporter,
+    metrics: list[Dict[str, Any]],
+    start: datetime,
+    end: datetime,
+    step: timedelta,
+    max_samples: int,
+    request_interval: float,
+) -> Dict[str, int]:
+    """Render metrics at every step from start to end and send the samples.
+
+    History is read from the recorder one page at a time. Samples are sent in
+    time order, in requests of at most max_samples samples, at most one request
+    per request_interval seconds, and each request is delivered before the
+    next one is built. Steps at which a template fails are skipped.
+    """
+    sources = [metric["template"] for metric in metrics] + [
+        source
+        for metric in metrics
+        for source in metric.get(TEMPLATE_ATTRIBUTES, {}).values()
+    ]
+    entity_ids = _tracked_entities(hass, sources)
+    states = HistoricalStates()
+    historical_hass = _HistoricalHass(hass, states)
+    templates = {
+        metric["name"]: Template(metric["template"], historical_hass)
+        for metric in metrics
+    }
+    attribute_templates: Dict[str, Template] = {}
+
+    def render_attribute(key: str, source: str) -> Any:
+        template = attribute_templates.get(key)
+        if template is None:
+            template = attribute_templates[key] = Template(source, historical_hass)
+        return template.async_render()
+
+    summary = {"samples": 0, "requests": 0, "skipped": 0}
+    samples: SamplesType = defaultdict(lambda: defaultdict(list))
+    pending = 0
+    last_request = 0.0
+
+    async def send() -> None:
+        nonlocal samples, pending, last_request
+        wait = last_request + request_interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        batch, samples, pending = samples, defaultdict(lambda: defaultdict(list)), 0
+        await hass.async_add_executor_job(exporter.export_samples, batch)
+        if not await hass.async_add_executor_job(exporter.force_flush):
+            _LOGGER.warning("Backfill request was not delivered in time")
+        last_request = time.monotonic()
+        summary["requests"] += 1
+
+    moment = start
+    while moment < end:
+        page_end = min(moment + HISTORY_PAGE, end)
+        page = await get_instance(hass).async_add_executor_job(
+            history.get_significant_states,
+            hass,
+            moment,
+            page_end,
+            entity_ids,
+            None,
+            True,
+            False,
+        )
+        changes = sorted(
+            (state for entity_states in page.values() for state in entity_states),
+            key=lambda state: state.last_updated,
+        )
+        index = 0
+        while moment < page_end:
+            while index < len(changes) and changes[index].last_updated <= moment:
+                states.set(changes[index])
+                index += 1
+            timestamp = int(moment.timestamp() * 1000)
+            for metric in metrics:
+                try:
+                    series = coordinator.render_series(
+                        metric, templates[metric["name"]], render_attribute
+                    )
+                except (TemplateError, UpdateFailed) as err:
+                    _LOGGER.debug("Skipped %s at %s: %s", metric["name"], moment, err)
+                    summary["skipped"] += 1
+                    continue
+                for attributes, value in series:
+                    samples[metric["name"]][tuple(attributes.items())].append(
+                        (value, timestamp)
+                    )
+                    pending += 1
+                    if pending >= max_samples:
+                        summary["samples"] += pending
+                        await send()
+            moment += step
+            # Let the event loop breathe between steps.
+            await asyncio.sleep(0)
+    if pending:
+        summary["samples"] += pending
+        await send()
+    if summary["skipped"]:
+        _LOGGER.info(
+            "Skipped %s metric steps whose templates did not render a number",
+            summary["skipped"],
+        )
+    return summary
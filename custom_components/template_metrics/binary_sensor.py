@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+from typing import TYPE_CHECKING, Any
+
 from homeassistant.components.binary_sensor import (
     BinarySensorEntity,
 )
@@ -11,7 +13,10 @@ from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from . import TemplateMetricsCoordinator
-from .const import COORDINATOR, DOMAIN
+from .const import CIRCUIT_BREAKER_OPEN, COORDINATOR, DOMAIN, EXPORT_STATS
+
+if TYPE_CHECKING:
+    from .prometheus_remote_write.stats import ExportStats, TargetStats
 
 
 async def async_setup_platform(
@@ -44,10 +49,38 @@ class TemplateMetricsBinarySensor(CoordinatorEntity, BinarySensorEntity):
         """Initialize."""
         super().__init__(coordinator)
 
+    @property
+    def _target_stats(self) -> list[TargetStats]:
+        stats: ExportStats | None = self.hass.data[DOMAIN].get(EXPORT_STATS)
+        return stats.targets if stats is not None else []
+
     @property
     def is_on(self) -> bool | None:
-        """Return true if connection is successful."""
-        return self.coordinator.enabled and self.coordinator.last_update_success
+        """Return true if connection is successful.
+
+        The connection is also off while the circuit breaker of a remote write
+        target is open.
+        """
+        return (
+            self.coordinator.enabled
+            and self.coordinator.last_update_success
+            and all(
+                target.circuit_state != CIRCUIT_BREAKER_OPEN
+                for target in self._target_stats
+            )
+        )
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return the circuit breaker state of each remote write target."""
+        targets = self._target_stats
+        if not targets:
+            return None
+        return {
+            "circuit_breakers": {
+                target.name: target.circuit_state for target in targets
+            }
+        }
 
     @property
     def available(self) -> bool:
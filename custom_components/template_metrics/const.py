@@ -1,10 +1,75 @@
 """Constants for the integration."""
 
 DOMAIN = "template_metrics"
+# Attributes of the OpenTelemetry resource, sent and scraped as labels.
+RESOURCE_ATTRIBUTES = {"service.name": "homeassistant"}
 USER = "user"
 TOKEN = "token"
 REMOTE_WRITE_URL = "remote_write_url"
+REMOTE_WRITE_VERSION = "remote_write_version"
+REMOTE_WRITE_VERSION_1 = "1.0"
+REMOTE_WRITE_VERSION_2 = "2.0"
+REMOTE_WRITE_VERSIONS = (REMOTE_WRITE_VERSION_1, REMOTE_WRITE_VERSION_2)
+COMPRESSION = "compression"
+COMPRESSION_CODECS = ("snappy", "snappy_framed", "zstd", "gzip")
+REMOTE_WRITE = "remote_write"
+TARGET_URL = "url"
+TIMEOUT = "timeout"
+QUEUE_SIZE = "queue_size"
+MAX_RETRIES = "max_retries"
+FAILURE_THRESHOLD = "failure_threshold"
+RESET_TIMEOUT = "reset_timeout"
+FILE_SINK = "file_sink"
+WRITE_RELABEL_CONFIGS = "write_relabel_configs"
+RELABEL_ACTION = "action"
+RELABEL_ACTIONS = (
+    "replace",
+    "keep",
+    "drop",
+    "hashmod",
+    "labelmap",
+    "labeldrop",
+    "labelkeep",
+    "lowercase",
+    "uppercase",
+)
+SOURCE_LABELS = "source_labels"
+SEPARATOR = "separator"
+REGEX = "regex"
+TARGET_LABEL = "target_label"
+REPLACEMENT = "replacement"
+MODULUS = "modulus"
+FILE_SINK_PATH = "path"
+MAX_FILE_SIZE = "max_file_size"
+MAX_FILE_AGE = "max_file_age"
+MAX_TOTAL_SIZE = "max_total_size"
+FSYNC_INTERVAL = "fsync_interval"
+CIRCUIT_BREAKER_OPEN = "open"
+SCRAPE_ENDPOINT = "scrape_endpoint"
+EXPORT_MODE = "export_mode"
+EXPORT_MODE_PERIODIC = "periodic"
+EXPORT_MODE_COORDINATOR = "coordinator"
+BACKEND = "backend"
+BACKEND_OTEL = "otel"
+BACKEND_DIRECT = "direct"
+SEND_ON_CHANGE = "send_on_change"
+HEARTBEAT = "heartbeat"
+SELF_METRICS = "self_metrics"
 UPDATE_INTERVAL = "update_interval"
+RENDER_INTERVAL = "render_interval"
+RENDER_BUDGET_MS = "render_budget_ms"
+MIN_INTERVAL = "min_interval"
+COST_ENTITY = "entity"
+COST_DOMAIN = "domain"
+COST_ALL_STATES = "all_states"
+ADAPTIVE_INTERVAL = "adaptive_interval"
+MAX_INTERVAL = "max_interval"
+UNCHANGED_RENDERS = "unchanged_renders"
+PUSH_ON = "push_on"
+PUSH_ENTITIES = "entities"
+PUSH_EVENTS = "events"
+PUSH_DEBOUNCE = "push_debounce"
+SHUTDOWN_TIMEOUT = "shutdown_timeout"
 METRICS = "metrics"
 TEMPLATE_NAME = "name"
 TEMPLATE = "template"
@@ -14,3 +79,24 @@ METRIC_LABEL_INSTANCE = "instance"
 METER = "meter"
 COORDINATOR = "coordinator"
 PROVIDER = "provider"
+READER = "reader"
+SAMPLE_BUFFER = "sample_buffer"
+EXPORT_STATS = "export_stats"
+SERIES_STORE = "series_store"
+EXPORTER = "exporter"
+SERVICE_SLOWEST_TEMPLATES = "slowest_templates"
+SERVICE_RELOAD = "reload"
+SERVICE_BACKFILL = "backfill"
+SERVICE_SHIP = "ship"
+SERVICE_PUSH = "push"
+ATTR_TOP = "top"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_STEP = "step"
+ATTR_METRICS = "metrics"
+ATTR_MAX_SAMPLES = "max_samples"
+ATTR_REQUEST_INTERVAL = "request_interval"
+ATTR_URL = "url"
+ATTR_USER = "user"
+ATTR_TOKEN = "token"
+ATTR_KEEP = "keep"
@@ -1,28 +1,70 @@
 """DataUpdateCoordinator for Grafana Metrics."""
 
+from __future__ import annotations
+
 import json
 import logging
+import time
 from datetime import timedelta
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Tuple
 
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.template import Template
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import (
+    TrackStates,
+    async_track_state_change_event,
+    async_track_state_change_filtered,
+)
+from homeassistant.helpers.template import RenderInfo, Template
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.exceptions import TemplateError
-from opentelemetry.sdk.metrics import Meter
 
+from .cost import classify_all
+from .profiling import RenderProfiler
+from .template_cache import TemplateCodeCache
 from .const import (
     DOMAIN,
+    EXPORTER,
     METER,
+    READER,
+    SAMPLE_BUFFER,
+    SERIES_STORE,
     UPDATE_INTERVAL,
+    RENDER_INTERVAL,
+    RENDER_BUDGET_MS,
+    MIN_INTERVAL,
+    ADAPTIVE_INTERVAL,
+    MAX_INTERVAL,
+    UNCHANGED_RENDERS,
+    PUSH_ON,
+    PUSH_ENTITIES,
+    PUSH_EVENTS,
+    PUSH_DEBOUNCE,
     INSTANCE_LABEL,
     METRIC_LABEL_INSTANCE,
+    METRICS,
+    TEMPLATE_NAME,
     TEMPLATE_ATTRIBUTES,
 )
 
+if TYPE_CHECKING:
+    from opentelemetry.sdk.metrics import Meter
+    from opentelemetry.sdk.metrics.export import MetricReader
+
+    from .prometheus_remote_write import (
+        PrometheusRemoteWriteMetricsExporter,
+        SampleBuffer,
+        SeriesStore,
+    )
+
 _LOGGER = logging.getLogger(__name__)
 
 
+def _bind_template_env(template: Template) -> None:
+    """Create a template's environment now, on the event loop, not in the executor."""
+    getattr(template, "_env", None)
+
+
 class TemplateMetricsCoordinator(DataUpdateCoordinator[Dict[str, Any]]):
     """Class to push metrics data."""
 
@@ -32,17 +74,40 @@ class TemplateMetricsCoordinator(DataUpdateCoordinator[Dict[str, Any]]):
         config: Any,
     ) -> None:
         """Initialize."""
-        self._config = config
         self.meter: Meter = hass.data[DOMAIN][METER]
+        self._reader: MetricReader | None = hass.data[DOMAIN].get(READER)
+        self._sample_buffer: SampleBuffer | None = hass.data[DOMAIN].get(SAMPLE_BUFFER)
+        self._series_store: SeriesStore | None = hass.data[DOMAIN].get(SERIES_STORE)
+        self._exporter: PrometheusRemoteWriteMetricsExporter | None = hass.data[
+            DOMAIN
+        ].get(EXPORTER)
         self.enabled = True
         self.last_update_success = True
-        self._attributes: dict[str, Any] = {}
+        self.profiler = RenderProfiler()
+        self._templates: Dict[str, Tuple[str, Template]] = {}
+        # Monotonic time, series and multi-series flag of each metric's last render.
+        self._last_renders: Dict[
+            str, Tuple[float, list[tuple[Dict[str, Any], float]], bool]
+        ] = {}
+        # Adaptive interval state: renders without a change, current backoff in
+        # seconds and the (entities, domains, all states) the metric and its
+        # attributes read, with the listener for those of backed off metrics.
+        self._unchanged: Dict[str, int] = {}
+        self._backoff: Dict[str, float] = {}
+        self._tracked: Dict[str, Tuple[frozenset, frozenset, bool]] = {}
+        self._state_tracker: Any = None
+        self._code_cache: TemplateCodeCache | None = None
+        # Metrics whose templates do not compile, with the error, left out of
+        # every render until they are fixed and reloaded.
+        self.invalid_metrics: Dict[str, str] = {}
+        # Metrics waiting for the push debouncer, and the push_on listeners.
+        self._push_pending: set[str] = set()
+        self._unsub_push: list[CALLBACK_TYPE] = []
+        self._apply_config(config)
 
-        instance_label = config.get(INSTANCE_LABEL)
-        if instance_label:
-            self._attributes[METRIC_LABEL_INSTANCE] = instance_label
-
-        update_interval = timedelta(seconds=config.get(UPDATE_INTERVAL, 60))
+        update_interval = timedelta(
+            seconds=config.get(RENDER_INTERVAL) or config.get(UPDATE_INTERVAL, 60)
+        )
         super().__init__(
             hass,
             _LOGGER,
@@ -50,6 +115,333 @@ class TemplateMetricsCoordinator(DataUpdateCoordinator[Dict[str, Any]]):
             update_interval=update_interval,
             always_update=False,
         )
+        self._push_debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=config.get(PUSH_DEBOUNCE, 0.5),
+            immediate=True,
+            function=self._async_push_pending,
+        )
+        self._update_push_listeners()
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """The configuration the coordinator renders."""
+        return self._config
+
+    def _apply_config(self, config: Dict[str, Any]) -> None:
+        self._config = config
+        self._attributes: dict[str, Any] = {}
+        instance_label = config.get(INSTANCE_LABEL)
+        if instance_label:
+            self._attributes[METRIC_LABEL_INSTANCE] = instance_label
+        self._render_budget: float | None = None
+        if config.get(RENDER_BUDGET_MS):
+            self._render_budget = config[RENDER_BUDGET_MS] / 1000
+        self._min_intervals: Dict[str, int] = config.get(MIN_INTERVAL, {})
+        self.costs: Dict[str, str] = {
+            metric[TEMPLATE_NAME]: classify_all(
+                [metric["template"], *metric.get(TEMPLATE_ATTRIBUTES, {}).values()]
+            )
+            for metric in config[METRICS]
+        }
+        for name, cost in self.costs.items():
+            if self._min_intervals.get(cost):
+                _LOGGER.debug(
+                    "Metric %s reads %s states, rendered at most every %ss",
+                    name,
+                    cost,
+                    self._min_intervals[cost],
+                )
+
+        self._adaptive: Dict[str, int] | None = config.get(ADAPTIVE_INTERVAL)
+        if not self._adaptive:
+            self._unchanged.clear()
+            self._backoff.clear()
+            self._tracked.clear()
+
+    def _update_state_listener(self) -> None:
+        """Listen to changes of the states that backed off metrics read."""
+        if not self._adaptive or not self._backoff:
+            if self._state_tracker is not None:
+                self._state_tracker.async_remove()
+                self._state_tracker = None
+            return
+        track_states = TrackStates(False, set(), set())
+        for name in self._backoff:
+            entities, domains, all_states = self._tracked.get(
+                name, (frozenset(), frozenset(), False)
+            )
+            track_states.entities.update(entities)
+            track_states.domains.update(domains)
+            track_states.all_states |= all_states
+        if self._state_tracker is None:
+            self._state_tracker = async_track_state_change_filtered(
+                self.hass, track_states, self._async_state_changed
+            )
+        else:
+            self._state_tracker.async_update_listeners(track_states)
+
+    @callback
+    def _async_state_changed(self, event: Event) -> None:
+        """Render a backed off metric again once an entity it read changed."""
+        if not self._backoff:
+            return
+        entity_id: str = event.data["entity_id"]
+        domain = entity_id.partition(".")[0]
+        for name in list(self._backoff):
+            entities, domains, all_states = self._tracked.get(
+                name, (frozenset(), frozenset(), False)
+            )
+            if all_states or entity_id in entities or domain in domains:
+                _LOGGER.debug("%s changed, rendering %s at full rate", entity_id, name)
+                del self._backoff[name]
+                self._unchanged[name] = 0
+
+    def _update_push_listeners(self) -> None:
+        """Listen to the entities and events of every metric's push_on."""
+        for unsub in self._unsub_push:
+            unsub()
+        self._unsub_push = []
+        by_entity: Dict[str, set[str]] = {}
+        by_event: Dict[str, set[str]] = {}
+        for metric in self._config[METRICS]:
+            push_on = metric.get(PUSH_ON) or {}
+            for entity_id in push_on.get(PUSH_ENTITIES, []):
+                by_entity.setdefault(entity_id, set()).add(metric[TEMPLATE_NAME])
+            for event_type in push_on.get(PUSH_EVENTS, []):
+                by_event.setdefault(event_type, set()).add(metric[TEMPLATE_NAME])
+
+        if by_entity:
+
+            @callback
+            def _state_changed(event: Event) -> None:
+                self.async_schedule_push(by_entity[event.data["entity_id"]])
+
+            self._unsub_push.append(
+                async_track_state_change_event(
+                    self.hass, list(by_entity), _state_changed
+                )
+            )
+        for event_type, names in by_event.items():
+            self._unsub_push.append(
+                self.hass.bus.async_listen(
+                    event_type,
+                    callback(
+                        lambda _event, names=names: self.async_schedule_push(names)
+                    ),
+                )
+            )
+
+    @callback
+    def async_schedule_push(self, metric_names: Iterable[str]) -> None:
+        """Push metrics soon, coalescing the requests of one debounce cooldown."""
+        self._push_pending.update(metric_names)
+        self._push_debouncer.async_schedule_call()
+
+    async def _async_push_pending(self) -> None:
+        metric_names, self._push_pending = self._push_pending, set()
+        await self.async_push(metric_names)
+
+    async def async_push(self, metric_names: Iterable[str]) -> list[str]:
+        """Render only the given metrics and export them right away.
+
+        The rendered samples are sent in their own request, outside the
+        exports of the reader, and also set on the gauges so the next regular
+        export carries them. Returns the names of the metrics pushed.
+        """
+        if not self.enabled:
+            return []
+        names = set(metric_names)
+        rendered_at = time.time_ns() // 1_000_000
+        samples: Dict[str, Dict[Tuple[Tuple[str, Any], ...], list]] = {}
+        for metric in self._config[METRICS]:
+            name = metric[TEMPLATE_NAME]
+            if name not in names or name in self.invalid_metrics:
+                continue
+            try:
+                series, _ = self._async_render_metric(metric)
+            except (TemplateError, UpdateFailed) as err:
+                _LOGGER.error("Could not push %s: %s", name, err)
+                continue
+            self._set_series(name, series, rendered_at)
+            samples[name] = {
+                tuple(attributes.items()): [(value, rendered_at)]
+                for attributes, value in series
+            }
+        if samples and self._exporter is not None:
+            try:
+                await self.hass.async_add_executor_job(
+                    self._exporter.export_samples, samples
+                )
+            except Exception as err:  # pylint: disable=broad-except
+                _LOGGER.error("Error pushing metrics: %s", err)
+        _LOGGER.debug("Pushed %s", ", ".join(samples))
+        return list(samples)
+
+    @callback
+    def async_shutdown_push(self) -> None:
+        """Stop the push_on listeners and any push still waiting."""
+        for unsub in self._unsub_push:
+            unsub()
+        self._unsub_push = []
+        self._push_debouncer.async_shutdown()
+
+    def min_interval(self, metric_name: str) -> int:
+        """Seconds a metric's last render is reused, from its cost class."""
+        return self._min_intervals.get(self.costs.get(metric_name), 0)
+
+    def render_interval(self, metric_name: str) -> float:
+        """Seconds a metric's last render is reused, by cost and backoff."""
+        return max(self.min_interval(metric_name), self._backoff.get(metric_name, 0))
+
+    def _render_due(self, metric_name: str, rendered_at: float) -> bool:
+        """Whether a metric's last render is old enough to render it again.
+
+        Refreshes are scheduled on whole seconds and renders stamped when they
+        finish, so the time between two cycles comes out slightly short of
+        update_interval. Half an update interval of slack keeps a metric from
+        waiting an extra cycle past its render interval.
+        """
+        slack = self.update_interval.total_seconds() / 2
+        return (
+            time.monotonic() - rendered_at >= self.render_interval(metric_name) - slack
+        )
+
+    def _adapt_interval(self, metric_name: str, changed: bool) -> None:
+        """Back off a metric whose output stopped changing, or reset it.
+
+        After unchanged_renders renders with the same output the interval
+        doubles, starting from twice the update interval, with every further
+        unchanged render up to max_interval.
+        """
+        if changed:
+            self._unchanged[metric_name] = 0
+            self._backoff.pop(metric_name, None)
+            return
+        unchanged = self._unchanged[metric_name] = (
+            self._unchanged.get(metric_name, 0) + 1
+        )
+        excess = unchanged - self._adaptive[UNCHANGED_RENDERS]
+        if excess >= 0:
+            self._backoff[metric_name] = min(
+                self.update_interval.total_seconds() * 2 ** (excess + 1),
+                self._adaptive[MAX_INTERVAL],
+            )
+
+    def template_report(self, top: int = 10) -> list[Dict[str, Any]]:
+        """The slowest templates with the cost class of their metric."""
+        report = self.profiler.report(top)
+        for item in report:
+            metric_name = item["template"].split(".attributes.", 1)[0]
+            item["cost"] = self.costs.get(metric_name)
+            item["min_interval"] = self.min_interval(metric_name)
+            item["render_interval"] = self.render_interval(metric_name)
+        return report
+
+    def async_reload(self, config: Dict[str, Any]) -> Dict[str, list[str]]:
+        """Apply a new configuration without touching the export pipeline.
+
+        Compiled templates and render timings of unchanged metrics are kept.
+        Removed metrics are forgotten, so their series stop being exported.
+        Returns the names of the added, changed and removed metrics.
+        """
+        old = {metric[TEMPLATE_NAME]: metric for metric in self._config[METRICS]}
+        new = {metric[TEMPLATE_NAME]: metric for metric in config[METRICS]}
+        diff = {
+            "added": [name for name in new if name not in old],
+            "changed": [name for name in new if name in old and new[name] != old[name]],
+            "removed": [name for name in old if name not in new],
+        }
+        for name in diff["changed"] + diff["removed"]:
+            self._forget_metric(name)
+        if self._series_store is not None:
+            for name in diff["removed"]:
+                self._series_store.remove(name)
+        self._apply_config(config)
+        self._push_debouncer.cooldown = config.get(PUSH_DEBOUNCE, 0.5)
+        self._update_state_listener()
+        self._update_push_listeners()
+        return diff
+
+    def _forget_metric(self, name: str) -> None:
+        """Drop the compiled templates and render timings of a metric."""
+        prefix = f"{name}.attributes."
+        for key in [
+            key for key in self._templates if key == name or key.startswith(prefix)
+        ]:
+            del self._templates[key]
+        self._last_renders.pop(name, None)
+        self._unchanged.pop(name, None)
+        self._backoff.pop(name, None)
+        self._tracked.pop(name, None)
+        self.invalid_metrics.pop(name, None)
+        self.profiler.forget(name)
+
+    def _template(self, key: str, source: str) -> Template:
+        """Return the template for key, compiling it again only if source changed."""
+        cached = self._templates.get(key)
+        if cached is not None and cached[0] == source:
+            return cached[1]
+        template = Template(source, self.hass)
+        self._templates[key] = (source, template)
+        return template
+
+    async def async_validate_templates(self) -> Dict[str, str]:
+        """Compile every template once, before the first render.
+
+        Compiled code is loaded from and saved to the persistent cache, so
+        only new or changed templates are compiled. Compilation runs in a
+        single executor job to keep it off the event loop. Metrics with a
+        template that does not compile are isolated in invalid_metrics.
+        Returns the error of every invalid metric.
+        """
+        if self._code_cache is None:
+            self._code_cache = TemplateCodeCache(self.hass)
+            await self._code_cache.async_load()
+        cache = self._code_cache
+        templates: Dict[str, list[Tuple[str, Template]]] = {}
+        cached = 0
+        for metric in self._config[METRICS]:
+            name = metric[TEMPLATE_NAME]
+            sources = {name: metric["template"]}
+            for attribute, source in metric.get(TEMPLATE_ATTRIBUTES, {}).items():
+                sources[f"{name}.attributes.{attribute}"] = source
+            templates[name] = [
+                (key, self._template(key, source)) for key, source in sources.items()
+            ]
+            for _, template in templates[name]:
+                _bind_template_env(template)
+                cached += cache.apply(template)
+
+        def compile_all() -> Dict[str, str]:
+            errors = {}
+            for name, metric_templates in templates.items():
+                for key, template in metric_templates:
+                    try:
+                        template.ensure_valid()
+                    except TemplateError as err:
+                        errors[name] = f"{key}: {err}"
+                        break
+            return errors
+
+        errors = await self.hass.async_add_executor_job(compile_all)
+        for metric_templates in templates.values():
+            for _, template in metric_templates:
+                cache.add(template)
+        await cache.async_save()
+        self.invalid_metrics = errors
+        for name, error in errors.items():
+            _LOGGER.error(
+                "Metric %s is not exported, its template is invalid: %s", name, error
+            )
+        _LOGGER.debug(
+            "Validated templates of %s metrics, %s loaded from cache, %s invalid",
+            len(templates),
+            cached,
+            len(errors),
+        )
+        return errors
 
     def set_enabled(self, enabled: bool) -> None:
         """Set the enabled state."""
@@ -89,8 +481,20 @@ class TemplateMetricsCoordinator(DataUpdateCoordinator[Dict[str, Any]]):
             return value
         return value
 
-    def _render_metric_attributes(self, metric: Dict[str, Any]) -> Dict[str, Any]:
-        """Render configured default attributes for a metric."""
+    def _render_metric_attributes(
+        self,
+        metric: Dict[str, Any],
+        render: Callable[[str, str], Any] | None = None,
+        quiet: bool = False,
+    ) -> Dict[str, Any]:
+        """Render configured default attributes for a metric.
+
+        render(key, source) renders a single attribute template, by default
+        the cached template with its render time recorded. With quiet set,
+        failures only raise UpdateFailed instead of also logging an error.
+        """
+        if render is None:
+            render = self._async_render_cached
         metric_attributes = dict(self._attributes)
         custom_attribute_templates = metric.get(TEMPLATE_ATTRIBUTES, {})
         if custom_attribute_templates:
@@ -98,15 +502,17 @@ class TemplateMetricsCoordinator(DataUpdateCoordinator[Dict[str, Any]]):
                 attribute_name,
                 attribute_template,
             ) in custom_attribute_templates.items():
-                rendered_attribute = Template(
-                    attribute_template, self.hass
-                ).async_render()
+                rendered_attribute = render(
+                    f"{metric['name']}.attributes.{attribute_name}",
+                    attribute_template,
+                )
                 if rendered_attribute is None:
-                    _LOGGER.error(
-                        "Template for attribute %s of %s returned None",
-                        attribute_name,
-                        metric["name"],
-                    )
+                    if not quiet:
+                        _LOGGER.error(
+                            "Template for attribute %s of %s returned None",
+                            attribute_name,
+                            metric["name"],
+                        )
                     raise UpdateFailed(
                         f"Template attribute {attribute_name} returned None for {metric['name']}"
                     )
@@ -116,7 +522,7 @@ class TemplateMetricsCoordinator(DataUpdateCoordinator[Dict[str, Any]]):
         return metric_attributes
 
     def _extract_series_entries(
-        self, rendered_value: Any, metric_name: str
+        self, rendered_value: Any, metric_name: str, quiet: bool = False
     ) -> list[dict[str, Any]] | None:
         """Interpret the template output as optional multi-series data."""
         candidate = rendered_value
@@ -128,11 +534,12 @@ class TemplateMetricsCoordinator(DataUpdateCoordinator[Dict[str, Any]]):
                 try:
                     candidate = json.loads(stripped_value)
                 except json.JSONDecodeError as err:
-                    _LOGGER.error(
-                        "Template for %s returned invalid JSON payload: %s",
-                        metric_name,
-                        stripped_value,
-                    )
+                    if not quiet:
+                        _LOGGER.error(
+                            "Template for %s returned invalid JSON payload: %s",
+                            metric_name,
+                            stripped_value,
+                        )
                     raise UpdateFailed(
                         f"Template {metric_name} returned invalid JSON payload"
                     ) from err
@@ -166,28 +573,105 @@ class TemplateMetricsCoordinator(DataUpdateCoordinator[Dict[str, Any]]):
             return entries
         return None
 
+    def render_series(
+        self,
+        metric: Dict[str, Any],
+        template: Template,
+        render_attribute: Callable[[str, str], Any],
+    ) -> list[tuple[Dict[str, Any], float]]:
+        """Render a metric into (attributes, value) series without exporting it.
+
+        The templates are passed in, so a metric can be replayed against
+        states other than the live ones. Failures are not logged, as values
+        like unavailable are routine in history; UpdateFailed still says why.
+        """
+        rendered_value = template.async_render()
+        if rendered_value is None:
+            raise UpdateFailed(f"Template {metric['name']} returned None")
+        series, _ = self._rendered_series(
+            metric["name"],
+            rendered_value,
+            self._render_metric_attributes(metric, render_attribute, quiet=True),
+            quiet=True,
+        )
+        return series
+
+    def _rendered_series(
+        self,
+        metric_name: str,
+        rendered_value: Any,
+        base_attributes: Dict[str, Any],
+        quiet: bool = False,
+    ) -> tuple[list[tuple[Dict[str, Any], float]], bool]:
+        """Turn template output into (attributes, value) series.
+
+        Also returns whether the output was multi-series JSON rather than a
+        single value.
+        """
+        series_entries = self._extract_series_entries(
+            rendered_value, metric_name, quiet
+        )
+        if series_entries is None:
+            float_value = self._coerce_to_float(
+                rendered_value, metric_name, quiet=quiet
+            )
+            return [(base_attributes, float_value)], False
+        series = []
+        for index, series_entry in enumerate(series_entries):
+            float_value = self._coerce_to_float(
+                series_entry["value"], metric_name, series_index=index, quiet=quiet
+            )
+            entry_attributes = dict(base_attributes)
+            entry_attributes.update(series_entry["attributes"])
+            series.append((entry_attributes, float_value))
+        return series, True
+
     def _coerce_to_float(
         self,
         raw_value: Any,
         metric_name: str,
         *,
         series_index: int | None = None,
+        quiet: bool = False,
     ) -> float:
         """Ensure template output can be exported as a numeric metric."""
         try:
             return float(raw_value)
         except (TypeError, ValueError) as err:
             context = f" entry {series_index}" if series_index is not None else ""
-            _LOGGER.error(
-                "Invalid numeric value for %s%s: %s",
-                metric_name,
-                context,
-                raw_value,
-            )
+            if not quiet:
+                _LOGGER.error(
+                    "Invalid numeric value for %s%s: %s",
+                    metric_name,
+                    context,
+                    raw_value,
+                )
             raise UpdateFailed(
                 f"Invalid numeric value for {metric_name}{context}: {raw_value}"
             ) from err
 
+    def _async_render_cached(self, key: str, source: str) -> Any:
+        return self._async_render_timed(key, self._template(key, source))
+
+    def _async_render_timed(self, name: str, template: Template) -> Any:
+        """Render a template and record how long it took."""
+        started = time.perf_counter()
+        rendered = template.async_render()
+        self._record_render(name, time.perf_counter() - started, 1, rendered)
+        return rendered
+
+    def _record_render(
+        self, name: str, seconds: float, series: int, rendered: Any
+    ) -> None:
+        self.profiler.record(name, seconds, series, len(str(rendered)))
+        if self._render_budget is not None and seconds > self._render_budget:
+            _LOGGER.warning(
+                "Template %s took %.1f ms to render, over the %.1f ms budget",
+                name,
+                seconds * 1000,
+                self._render_budget * 1000,
+            )
+
     async def _async_update_data(self) -> Dict[str, Any]:
         """Push metrics to endpoint."""
         if not self.enabled:
@@ -196,69 +680,131 @@ class TemplateMetricsCoordinator(DataUpdateCoordinator[Dict[str, Any]]):
 
         try:
             metrics_data: Dict[str, Any] = {}
+            metrics_series: Dict[str, list[tuple[Dict[str, Any], float]]] = {}
             for metric in self._config["metrics"]:
+                if metric["name"] in self.invalid_metrics:
+                    continue
                 try:
-                    template = Template(metric["template"], self.hass)
-                    rendered_value = template.async_render()
-                    if rendered_value is None:
-                        _LOGGER.error(f"Template for {metric['name']} returned None")
-                        raise UpdateFailed(f"Template {metric['name']} returned None")
-
-                    gauge = self.meter.create_gauge(
-                        metric["name"], description=f"HA {metric['name']}"
+                    last_render = self._last_renders.get(metric["name"])
+                    if last_render is not None and not self._render_due(
+                        metric["name"], last_render[0]
+                    ):
+                        # Too expensive to render this often or not changing,
+                        # so export the last value to keep the series fresh.
+                        _, series, multi_series = last_render
+                    else:
+                        series, multi_series = self._async_render_metric(metric)
+                    self._set_series(
+                        metric["name"], series, time.time_ns() // 1_000_000
                     )
-                    base_attributes = self._render_metric_attributes(metric)
-
-                    series_entries = self._extract_series_entries(
-                        rendered_value, metric["name"]
-                    )
-                    if series_entries is None:
-                        float_value = self._coerce_to_float(
-                            rendered_value, metric["name"]
-                        )
-                        set_kwargs: Dict[str, Any] = {}
-                        if base_attributes:
-                            set_kwargs["attributes"] = base_attributes
-                        gauge.set(float_value, **set_kwargs)
-                        metrics_data[metric["name"]] = float_value
-                        _LOGGER.debug(
-                            "Updated metric %s: %s", metric["name"], float_value
-                        )
-                        continue
-
-                    metrics_data[metric["name"]] = []
-                    for index, series_entry in enumerate(series_entries):
-                        float_value = self._coerce_to_float(
-                            series_entry["value"],
-                            metric["name"],
-                            series_index=index,
-                        )
-                        entry_attributes = dict(base_attributes)
-                        entry_attributes.update(series_entry["attributes"])
-                        set_kwargs: Dict[str, Any] = {}
-                        if entry_attributes:
-                            set_kwargs["attributes"] = entry_attributes
-                        gauge.set(float_value, **set_kwargs)
-                        metrics_data[metric["name"]].append(
-                            {"value": float_value, "attributes": entry_attributes}
-                        )
-                        _LOGGER.debug(
-                            "Updated metric %s series %s: %s",
-                            metric["name"],
-                            entry_attributes,
-                            float_value,
-                        )
+                    if multi_series:
+                        metrics_data[metric["name"]] = [
+                            {"value": float_value, "attributes": attributes}
+                            for attributes, float_value in series
+                        ]
+                    else:
+                        metrics_data[metric["name"]] = series[0][1]
+                    metrics_series[metric["name"]] = series
                 except TemplateError as err:
                     _LOGGER.error(f"Template {metric} is invalid: {err}")
                     raise UpdateFailed(f"Template {metric} is invalid: {err}")
 
             self.last_update_success = True
-            return {"success": True, "data": metrics_data, "enabled": True}
+            self._update_state_listener()
+            if self._reader is not None:
+                await self._async_export()
+            return {
+                "success": True,
+                "data": metrics_data,
+                "series": metrics_series,
+                "enabled": True,
+            }
         except Exception as err:
             self.last_update_success = False
             _LOGGER.error(f"Error updating metrics: {err}")
             raise UpdateFailed(f"Failed to update metrics: {err}")
 
+    def _set_series(
+        self,
+        metric_name: str,
+        series: list[tuple[Dict[str, Any], float]],
+        rendered_at: int,
+    ) -> None:
+        """Set the rendered series of a metric on its gauge."""
+        gauge = self.meter.create_gauge(metric_name, description=f"HA {metric_name}")
+        for attributes, float_value in series:
+            set_kwargs: Dict[str, Any] = {}
+            if attributes:
+                set_kwargs["attributes"] = attributes
+            gauge.set(float_value, **set_kwargs)
+            if self._sample_buffer is not None:
+                self._sample_buffer.add(
+                    metric_name, attributes, float_value, rendered_at
+                )
+            _LOGGER.debug(
+                "Updated metric %s series %s: %s",
+                metric_name,
+                attributes,
+                float_value,
+            )
+
+    def _async_render_metric(
+        self, metric: Dict[str, Any]
+    ) -> tuple[list[tuple[Dict[str, Any], float]], bool]:
+        """Render a metric and its attributes, recording how long it took."""
+        template = self._template(metric["name"], metric["template"])
+        infos: list[RenderInfo] = []
+        render_attribute = None
+        started = time.perf_counter()
+        if self._adaptive:
+            # Also record which states the templates read, to notice changes.
+            info = template.async_render_to_info()
+            rendered_value = info.result()
+            infos.append(info)
+
+            def render_attribute(key: str, source: str) -> Any:
+                attribute_started = time.perf_counter()
+                attribute_info = self._template(key, source).async_render_to_info()
+                rendered = attribute_info.result()
+                self._record_render(
+                    key, time.perf_counter() - attribute_started, 1, rendered
+                )
+                infos.append(attribute_info)
+                return rendered
+
+        else:
+            rendered_value = template.async_render()
+        render_time = time.perf_counter() - started
+        if rendered_value is None:
+            _LOGGER.error(f"Template for {metric['name']} returned None")
+            raise UpdateFailed(f"Template {metric['name']} returned None")
+        base_attributes = self._render_metric_attributes(metric, render_attribute)
+        series, multi_series = self._rendered_series(
+            metric["name"], rendered_value, base_attributes
+        )
+        self._record_render(metric["name"], render_time, len(series), rendered_value)
+        if self._adaptive:
+            self._tracked[metric["name"]] = (
+                frozenset().union(*(info.entities for info in infos)),
+                frozenset().union(
+                    *(info.domains | info.domains_lifecycle for info in infos)
+                ),
+                any(info.all_states or info.all_states_lifecycle for info in infos),
+            )
+            last_render = self._last_renders.get(metric["name"])
+            self._adapt_interval(
+                metric["name"], last_render is None or last_render[1] != series
+            )
+        self._last_renders[metric["name"]] = (time.monotonic(), series, multi_series)
+        return series, multi_series
+
+    async def _async_export(self) -> None:
+        """Collect and export the values rendered in this cycle."""
+        try:
+            await self.hass.async_add_executor_job(self._reader.collect)
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.error("Error exporting metrics: %s", err)
+
     async def async_request_refresh(self) -> None:
         """Request a refresh and always notify listeners to re-evaluate.
 
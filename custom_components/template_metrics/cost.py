@@ -0,0 +1,93 @@
+"""Static render cost classes of metric templates."""
+
+from __future__ import annotations
+
+from typing import Iterable, Iterator
+
+import jinja2
+from jinja2 import nodes
+
+from .const import COST_ALL_STATES, COST_DOMAIN, COST_ENTITY
+
+COST_CLASSES = (COST_ENTITY, COST_DOMAIN, COST_ALL_STATES)
+
+# Functions and filters that look entities up in the registries. Looking up an
+# integration walks every registry entry, the others use a registry index.
+_REGISTRY_SCANS = {
+    "integration_entities": COST_ALL_STATES,
+    "area_entities": COST_DOMAIN,
+    "device_entities": COST_DOMAIN,
+    "floor_entities": COST_DOMAIN,
+    "label_entities": COST_DOMAIN,
+}
+
+_ENVIRONMENT = jinja2.Environment(
+    extensions=["jinja2.ext.loopcontrols", "jinja2.ext.do"]
+)
+
+
+def _walk(
+    node: nodes.Node, parent: nodes.Node | None = None
+) -> Iterator[tuple[nodes.Node, nodes.Node | None]]:
+    yield node, parent
+    for child in node.iter_child_nodes():
+        yield from _walk(child, node)
+
+
+def _states_cost(
+    node: nodes.Name, parent: nodes.Node | None, grandparent: nodes.Node | None
+) -> str:
+    """Cost of one use of the states object, by what is done with it."""
+    if isinstance(parent, nodes.Call) and parent.node is node:
+        # states('sensor.temp')
+        return COST_ENTITY
+    if isinstance(parent, (nodes.Getattr, nodes.Getitem)) and parent.node is node:
+        if (
+            isinstance(grandparent, (nodes.Getattr, nodes.Getitem))
+            and grandparent.node is parent
+        ):
+            # states.sensor.temp
+            return COST_ENTITY
+        # states.sensor, iterated over or filtered
+        return COST_DOMAIN
+    # states iterated over, filtered or passed on as a whole
+    return COST_ALL_STATES
+
+
+def classify(source: str) -> str:
+    """Classify how much of the state machine a template reads when rendered.
+
+    A template reading a fixed set of entities costs COST_ENTITY, one reading
+    every state of a domain COST_DOMAIN and one iterating every state or the
+    whole entity registry COST_ALL_STATES. Templates that do not parse are
+    classified COST_ENTITY and left to fail when they are rendered.
+    """
+    try:
+        tree = _ENVIRONMENT.parse(source)
+    except jinja2.TemplateSyntaxError:
+        return COST_ENTITY
+    cost = COST_ENTITY
+    parents: dict[int, nodes.Node | None] = {}
+    for node, parent in _walk(tree):
+        parents[id(node)] = parent
+        found = COST_ENTITY
+        if isinstance(node, nodes.Name) and node.name == "states":
+            grandparent = parents.get(id(parent)) if parent is not None else None
+            found = _states_cost(node, parent, grandparent)
+        elif isinstance(node, nodes.Call) and isinstance(node.node, nodes.Name):
+            found = _REGISTRY_SCANS.get(node.node.name, COST_ENTITY)
+        elif isinstance(node, nodes.Filter):
+            found = _REGISTRY_SCANS.get(node.name, COST_ENTITY)
+        cost = max(cost, found, key=COST_CLASSES.index)
+        if cost == COST_ALL_STATES:
+            break
+    return cost
+
+
+def classify_all(sources: Iterable[str]) -> str:
+    """The highest cost class of several templates."""
+    return max(
+        (classify(source) for source in sources),
+        key=COST_CLASSES.index,
+        default=COST_ENTITY,
+    )
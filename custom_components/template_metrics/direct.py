@@ -0,0 +1,138 @@
+"""Direct metric backend that writes gauges into a SeriesStore.
+
+The coordinator only needs a meter that creates gauges and a provider that can
+be shut down. These classes give it both without the OpenTelemetry SDK: gauge
+values go straight into the store and the readers hand the store to the
+remote write exporter.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Mapping, Sequence
+
+from .prometheus_remote_write import (
+    PrometheusRemoteWriteMetricsExporter,
+    SeriesStore,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _remaining_millis(deadline: float) -> float:
+    return max(deadline - time.monotonic(), 0) * 1000
+
+
+class StoreGauge:
+    """Gauge that sets the current value of a series in the store."""
+
+    def __init__(self, store: SeriesStore, name: str) -> None:
+        self._store = store
+        self.name = name
+
+    def set(self, amount: float, attributes: Mapping[str, Any] | None = None) -> None:
+        self._store.set(self.name, attributes, amount, time.time_ns() // 1_000_000)
+
+
+class StoreMeter:
+    """Create gauges backed by a SeriesStore, one per metric name."""
+
+    def __init__(self, store: SeriesStore) -> None:
+        self._store = store
+        self._gauges: Dict[str, StoreGauge] = {}
+
+    def create_gauge(
+        self, name: str, unit: str = "", description: str = ""
+    ) -> StoreGauge:
+        gauge = self._gauges.get(name)
+        if gauge is None:
+            gauge = self._gauges[name] = StoreGauge(self._store, name)
+        return gauge
+
+
+class StoreReader:
+    """Export the store when the coordinator asks, like CoordinatorMetricReader."""
+
+    def __init__(
+        self, exporter: PrometheusRemoteWriteMetricsExporter, store: SeriesStore
+    ) -> None:
+        self._exporter = exporter
+        self._store = store
+        self._export_lock = threading.Lock()
+
+    def collect(self, timeout_millis: float = 10_000) -> None:
+        with self._export_lock:
+            self._exporter.export_store(self._store, timeout_millis=timeout_millis)
+
+    def force_flush(self, timeout_millis: float = 10_000) -> bool:
+        self.collect(timeout_millis=timeout_millis)
+        return self._exporter.force_flush(timeout_millis=timeout_millis)
+
+    def shutdown(self, timeout_millis: float = 30_000, **kwargs) -> None:
+        self._exporter.shutdown(timeout_millis=timeout_millis)
+
+
+class PeriodicStoreReader(StoreReader):
+    """Export the store every export_interval_millis from a background thread.
+
+    Like OpenTelemetry's PeriodicExportingMetricReader it runs one last export
+    on shutdown before shutting the exporter down.
+    """
+
+    def __init__(
+        self,
+        exporter: PrometheusRemoteWriteMetricsExporter,
+        store: SeriesStore,
+        export_interval_millis: float = 60_000,
+    ) -> None:
+        super().__init__(exporter, store)
+        self._interval = export_interval_millis / 1000
+        self._shutdown_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="PeriodicStoreReader", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._shutdown_event.wait(self._interval):
+            try:
+                self.collect()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Exception while exporting metrics")
+
+    def shutdown(self, timeout_millis: float = 30_000, **kwargs) -> None:
+        # Every step gets what is left of one deadline, not the whole timeout.
+        deadline = time.monotonic() + timeout_millis / 1000
+        self._shutdown_event.set()
+        self._thread.join(timeout=timeout_millis / 1000)
+        if not self._thread.is_alive():
+            try:
+                self.collect(timeout_millis=_remaining_millis(deadline))
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Exception while exporting metrics")
+        super().shutdown(timeout_millis=_remaining_millis(deadline))
+
+
+class DirectMeterProvider:
+    """Meter provider of the direct backend, owning the store and its readers."""
+
+    def __init__(self, store: SeriesStore, readers: Sequence[StoreReader] = ()) -> None:
+        self.store = store
+        self._readers = list(readers)
+        self._meter = StoreMeter(store)
+
+    def get_meter(self, name: str, *args, **kwargs) -> StoreMeter:
+        return self._meter
+
+    def force_flush(self, timeout_millis: float = 10_000) -> bool:
+        return all(
+            reader.force_flush(timeout_millis=timeout_millis)
+            for reader in self._readers
+        )
+
+    def shutdown(self, timeout_millis: float = 30_000) -> None:
+        deadline = time.monotonic() + timeout_millis / 1000
+        for reader in self._readers:
+            reader.shutdown(timeout_millis=_remaining_millis(deadline))
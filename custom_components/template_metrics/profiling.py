@@ -0,0 +1,81 @@
+"""Render timing of the configured templates."""
+
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Any, Deque, Dict
+
+DEFAULT_WINDOW = 100
+
+
+def _percentile(ordered: list[float], percent: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+class TemplateProfile:
+    """Recent render durations and output of a single template."""
+
+    __slots__ = ("durations", "renders", "series", "output_size")
+
+    def __init__(self, window: int) -> None:
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.renders = 0
+        self.series = 0
+        self.output_size = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        ordered = sorted(self.durations)
+        return {
+            "renders": self.renders,
+            "last_ms": round(self.durations[-1] * 1000, 3),
+            "p50_ms": round(_percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(_percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(_percentile(ordered, 99) * 1000, 3),
+            "series": self.series,
+            "output_size": self.output_size,
+        }
+
+
+class RenderProfiler:
+    """Keep rolling render durations per template to find the slow ones.
+
+    Templates are keyed by metric name, and attribute templates by
+    ``<metric>.attributes.<attribute>``. Only the last ``window`` renders of each
+    template count towards its percentiles.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW) -> None:
+        self.window = window
+        self._profiles: Dict[str, TemplateProfile] = {}
+
+    def record(
+        self, template: str, seconds: float, series: int = 1, output_size: int = 0
+    ) -> None:
+        profile = self._profiles.get(template)
+        if profile is None:
+            profile = self._profiles[template] = TemplateProfile(self.window)
+        profile.durations.append(seconds)
+        profile.renders += 1
+        profile.series = series
+        profile.output_size = output_size
+
+    def report(self, top: int = 10) -> list[Dict[str, Any]]:
+        """Return the top templates ordered by their 95th percentile duration."""
+        report = [
+            {"template": template, **profile.as_dict()}
+            for template, profile in self._profiles.items()
+        ]
+        report.sort(key=lambda item: item["p95_ms"], reverse=True)
+        return report[:top]
+
+    def forget(self, metric: str) -> None:
+        """Drop the timings of a metric and of its attribute templates."""
+        prefix = f"{metric}.attributes."
+        for template in [
+            template
+            for template in self._profiles
+            if template == metric or template.startswith(prefix)
+        ]:
+            del self._profiles[template]
@@ -18,12 +18,13 @@ from __future__ import annotations
 
 import logging
 import re
-from collections import defaultdict
+import struct
+import threading
+import time
+from collections import OrderedDict, defaultdict
 from itertools import chain
-from typing import Dict, Mapping, Sequence, Tuple
+from typing import Dict, Mapping, NamedTuple, Sequence, Tuple
 
-import requests
-import snappy
 
 from opentelemetry.sdk.metrics import (
     Counter,
@@ -44,35 +45,131 @@ from opentelemetry.sdk.metrics.export import (
     Sum,
 )
 
-from .gen.remote_pb2 import WriteRequest
-from .gen.types_pb2 import Label, Sample, TimeSeries
+from .breaker import OPEN
+from .buffer import SampleBuffer
+from .compression import Codec
+from .relabel import Relabeler
+from .sink import FileSink
+from .stats import ExportStats, LatencyHistogram
+from .store import SeriesStore
+from .gen.write_v2_pb2 import Metadata
+from .target import (
+    REMOTE_WRITE_VERSION_1,
+    REMOTE_WRITE_VERSION_2,
+    RemoteWriteBatch,
+    RemoteWriteTarget,
+)
+from .wire import WriteRequestEncoder, encode_label_block
 
 logger = logging.getLogger(__name__)
 
+
 PROMETHEUS_NAME_REGEX = re.compile(r"^\d|[^\w:]")
 PROMETHEUS_LABEL_REGEX = re.compile(r"^\d|[^\w]")
 UNDERSCORE_REGEX = re.compile(r"_+")
 
 AttributesType = Tuple[Tuple[str, str], ...]
+LabelsType = Tuple[Tuple[str, str], ...]
 SampleType = Tuple[float, int]
 
 
+class RemoteWriteSeries(NamedTuple):
+    """A translated series, independent of the remote write wire version."""
+
+    labels: LabelsType
+    samples: Sequence[SampleType]
+    metric_type: int = Metadata.METRIC_TYPE_UNSPECIFIED
+    label_block: bytes | None = None
+
+
+class CachedSeries:
+    """Translated labels of a series and what each target last accepted of it.
+
+    sent maps a target to the packed value and timestamp of the last sample
+    it accepted, and is only written once the target delivered the batch.
+    """
+
+    __slots__ = ("labels", "label_block", "sent")
+
+    def __init__(self, labels: LabelsType, label_block: bytes) -> None:
+        self.labels = labels
+        self.label_block = label_block
+        self.sent: Dict[object, Tuple[bytes, int]] = {}
+
+
+class LabelCache:
+    """Bounded LRU cache of translated label sets.
+
+    Maps the raw resource and data point attributes of a series to its sanitized,
+    sorted labels and their pre-encoded 1.0 label block, so a stable series only
+    has its samples encoded on each export. Evicting an entry also forgets when
+    the series was last sent, which at worst sends it again.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        if max_size <= 0:
+            raise ValueError("label cache size must be greater than 0")
+        self.max_size = max_size
+        self._entries: OrderedDict[Tuple, CachedSeries] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> CachedSeries | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple, entry: CachedSeries) -> None:
+        self._entries[key] = entry
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
 class PrometheusRemoteWriteMetricsExporter(MetricExporter):
     """
     Prometheus remote write metric exporter for OpenTelemetry.
 
+    Each export is translated and encoded once and then handed to every target,
+    which sends it from its own queue so a slow endpoint cannot delay the others.
+
     Args:
-        endpoint: url where data will be sent (Required)
+        endpoint: url where data will be sent, unless targets are given (Optional)
         basic_auth: username and password for authentication (Optional)
         headers: additional headers for remote write request (Optional)
         timeout: timeout for remote write requests in seconds, defaults to 30 (Optional)
         proxies: dict mapping request proxy protocols to proxy urls (Optional)
         tls_config: configuration for remote write TLS settings (Optional)
+        protocol_version: remote write protocol, "1.0" or "2.0", defaults to "1.0" (Optional)
+        label_cache_size: number of translated label sets kept between exports,
+            defaults to 20000 (Optional)
+        compression: payload codec, one of snappy, snappy_framed, zstd or gzip,
+            defaults to snappy (Optional)
+        targets: remote write targets or file sinks to fan out to, instead of
+            endpoint (Optional)
+        send_on_change: only send a series when its value changed or its heartbeat
+            elapsed, defaults to False (Optional)
+        heartbeat: seconds after which an unchanged series is sent again when
+            send_on_change is set, defaults to 240 (Optional)
+        sample_buffer: samples rendered since the last export, sent instead of
+            the single current value of each gauge series (Optional)
+        stats: statistics to record exports into, created when omitted (Optional)
+        self_metrics: append template_metrics_* series describing the exporter
+            to every export, defaults to False (Optional)
+        self_metrics_attributes: extra labels for those series (Optional)
+        resource_attributes: resource attributes for series that do not come
+            from an export, until the first export provides them (Optional)
+        relabeler: write relabel rules applied to every series before it is
+            encoded, dropping or rewriting its labels (Optional)
     """
 
     def __init__(
         self,
-        endpoint: str,
+        endpoint: str | None = None,
         basic_auth: Dict | None = None,
         headers: Dict | None = None,
         timeout: int = 30,
@@ -81,14 +178,62 @@ class PrometheusRemoteWriteMetricsExporter(MetricExporter):
         resources_as_labels: bool = True,
         preferred_temporality: Dict[type, AggregationTemporality] | None = None,
         preferred_aggregation: Dict | None = None,
+        protocol_version: str = REMOTE_WRITE_VERSION_1,
+        label_cache_size: int = 20_000,
+        compression: str = "snappy",
+        targets: Sequence[RemoteWriteTarget | FileSink] | None = None,
+        send_on_change: bool = False,
+        heartbeat: float = 240,
+        sample_buffer: SampleBuffer | None = None,
+        stats: ExportStats | None = None,
+        self_metrics: bool = False,
+        self_metrics_attributes: Mapping[str, str] | None = None,
+        resource_attributes: Mapping[str, str] | None = None,
+        relabeler: Relabeler | None = None,
     ) -> None:
-        self.endpoint = endpoint
-        self.basic_auth = basic_auth
-        self.headers = headers
-        self.timeout = timeout
-        self.tls_config = tls_config
-        self.proxies = proxies
+        if targets is None:
+            targets = [
+                RemoteWriteTarget(
+                    endpoint,
+                    basic_auth=basic_auth,
+                    headers=headers,
+                    timeout=timeout,
+                    tls_config=tls_config,
+                    proxies=proxies,
+                    protocol_version=protocol_version,
+                    compression=compression,
+                )
+            ]
+        elif endpoint:
+            raise ValueError("endpoint and targets are mutually exclusive")
+        if not targets:
+            raise ValueError("at least one remote write target required")
+        self.targets = list(targets)
         self.resources_as_labels = resources_as_labels
+        self._encoder = WriteRequestEncoder()
+        self._encoder_lock = threading.Lock()
+        self._label_cache = LabelCache(label_cache_size)
+        if heartbeat <= 0:
+            raise ValueError("heartbeat must be greater than 0")
+        self.send_on_change = send_on_change
+        self._heartbeat_millis = int(heartbeat * 1000)
+        self._suppressed_series = 0
+        # Series of the export being built, recorded as sent per target once
+        # that target accepts the batch.
+        self._deliveries: list[Tuple[CachedSeries, bytes, int]] = []
+        self.relabeler = (
+            relabeler if relabeler is not None and relabeler.rules else None
+        )
+        self._dropped_series = 0
+        self.sample_buffer = sample_buffer
+        self.stats = stats or ExportStats([target.stats for target in self.targets])
+        self.self_metrics = self_metrics
+        self._self_metrics_attributes = tuple((self_metrics_attributes or {}).items())
+        self._resource_labels: Tuple = ()
+        if resources_as_labels and resource_attributes:
+            self._resource_labels = tuple(
+                (name, str(value)) for name, value in resource_attributes.items()
+            )
 
         if not preferred_temporality:
             preferred_temporality = {
@@ -102,83 +247,6 @@ class PrometheusRemoteWriteMetricsExporter(MetricExporter):
 
         super().__init__(preferred_temporality, preferred_aggregation)
 
-    @property
-    def endpoint(self) -> str:
-        return self._endpoint
-
-    @endpoint.setter
-    def endpoint(self, endpoint: str) -> None:
-        if endpoint == "":
-            raise ValueError("endpoint required")
-        self._endpoint = endpoint
-
-    @property
-    def basic_auth(self) -> Dict | None:
-        return self._basic_auth
-
-    @basic_auth.setter
-    def basic_auth(self, basic_auth: Dict | None) -> None:
-        if basic_auth:
-            if "username" not in basic_auth:
-                raise ValueError("username required in basic_auth")
-            if "password_file" in basic_auth:
-                if "password" in basic_auth:
-                    raise ValueError(
-                        "basic_auth cannot contain password and password_file"
-                    )
-                with open(  # pylint: disable=unspecified-encoding
-                    basic_auth["password_file"]
-                ) as file:
-                    basic_auth["password"] = file.readline().strip()
-            elif "password" not in basic_auth:
-                raise ValueError("password required in basic_auth")
-        self._basic_auth = basic_auth
-
-    @property
-    def timeout(self) -> int:
-        return self._timeout
-
-    @timeout.setter
-    def timeout(self, timeout: int) -> None:
-        if timeout <= 0:
-            raise ValueError("timeout must be greater than 0")
-        self._timeout = timeout
-
-    @property
-    def tls_config(self) -> Dict | None:
-        return self._tls_config
-
-    @tls_config.setter
-    def tls_config(self, tls_config: Dict | None) -> None:
-        if tls_config:
-            new_config = {}
-            if "ca_file" in tls_config:
-                new_config["ca_file"] = tls_config["ca_file"]
-            if "cert_file" in tls_config and "key_file" in tls_config:
-                new_config["cert_file"] = tls_config["cert_file"]
-                new_config["key_file"] = tls_config["key_file"]
-            elif "cert_file" in tls_config or "key_file" in tls_config:
-                raise ValueError("tls_config requires both cert_file and key_file")
-            if "insecure_skip_verify" in tls_config:
-                new_config["insecure_skip_verify"] = tls_config["insecure_skip_verify"]
-        self._tls_config = tls_config
-
-    @property
-    def proxies(self) -> Dict | None:
-        return self._proxies
-
-    @proxies.setter
-    def proxies(self, proxies: Dict | None) -> None:
-        self._proxies = proxies
-
-    @property
-    def headers(self) -> Dict | None:
-        return self._headers
-
-    @headers.setter
-    def headers(self, headers: Dict | None) -> None:
-        self._headers = headers
-
     def export(
         self,
         metrics_data: MetricsData,
@@ -187,34 +255,163 @@ class PrometheusRemoteWriteMetricsExporter(MetricExporter):
     ) -> MetricExportResult:
         if not metrics_data:
             return MetricExportResult.SUCCESS
-        timeseries = self._translate_data(metrics_data)
-        if not timeseries:
+        self._suppressed_series = 0
+        self._dropped_series = 0
+        self._deliveries = []
+        buffered = self.sample_buffer.drain() if self.sample_buffer else None
+        started = time.perf_counter()
+        series = self._translate_data(metrics_data, buffered)
+        return self._export_series(series, started)
+
+    def export_store(
+        self, store: SeriesStore, timeout_millis: float = 10_000
+    ) -> MetricExportResult:
+        """Export the series set in a SeriesStore since its last export.
+
+        This is the direct backend's counterpart of export(), reading the store
+        instead of an OpenTelemetry MetricsData tree.
+        """
+        self._suppressed_series = 0
+        self._dropped_series = 0
+        self._deliveries = []
+        buffered = self.sample_buffer.drain() if self.sample_buffer else None
+        started = time.perf_counter()
+        series = self._translate_store(store, buffered)
+        if not series and not self._suppressed_series and not self._dropped_series:
+            return MetricExportResult.SUCCESS
+        return self._export_series(series, started)
+
+    def export_samples(
+        self,
+        samples: Mapping[str, Mapping[AttributesType, Sequence[SampleType]]],
+    ) -> MetricExportResult:
+        """Send already timestamped samples, such as replayed history.
+
+        Every sample is sent: send_on_change and self metrics do not apply, and
+        the label cache shared with export() is left alone, so this is safe to
+        call from another thread while exports run.
+        """
+        series = []
+        for name, metric_series in samples.items():
+            sanitized = self._sanitize_string(name, "name")
+            for attributes, metric_samples in metric_series.items():
+                labels = self._series_labels(
+                    self._resource_labels, attributes + (("__name__", sanitized),)
+                )
+                if labels is None:
+                    continue
+                series.append(
+                    RemoteWriteSeries(
+                        labels,
+                        metric_samples,
+                        Metadata.METRIC_TYPE_GAUGE,
+                        encode_label_block(labels),
+                    )
+                )
+        if not series:
+            return MetricExportResult.SUCCESS
+        batch = RemoteWriteBatch(series, self._encode)
+        for target in self.targets:
+            batch.message(target.protocol_version, target.codec)
+            target.submit(batch)
+        return MetricExportResult.SUCCESS
+
+    def _export_series(
+        self, series: Sequence[RemoteWriteSeries], started: float
+    ) -> MetricExportResult:
+        self.stats.record_export(
+            len(series),
+            sum(len(item.samples) for item in series),
+            time.perf_counter() - started,
+        )
+        if not series and (self._suppressed_series or self._dropped_series):
+            logger.debug(
+                "No series to send, %s unchanged and %s dropped by relabeling",
+                self._suppressed_series,
+                self._dropped_series,
+            )
+            return MetricExportResult.SUCCESS
+        if not series:
             logger.error("All records contain unsupported aggregators, export aborted")
             return MetricExportResult.FAILURE
-        message = self._build_message(timeseries)
-        headers = self._build_headers()
-        return self._send_message(message, headers)
+        if self.self_metrics:
+            series = [*series, *self._self_metric_series()]
+        deliveries, self._deliveries = self._deliveries, []
+
+        def delivered(target) -> None:
+            for entry, value, timestamp in deliveries:
+                entry.sent[target] = (value, timestamp)
 
-    def _translate_data(self, data: MetricsData) -> Sequence[TimeSeries]:
+        batch = RemoteWriteBatch(
+            series, self._encode, delivered if deliveries else None
+        )
+        for target in self.targets:
+            # Encode in the exporting thread so senders only ever do network I/O.
+            batch.message(target.protocol_version, target.codec)
+            target.submit(batch)
+        return MetricExportResult.SUCCESS
+
+    def _translate_data(
+        self,
+        data: MetricsData,
+        buffered: Mapping[str, Mapping[AttributesType, Sequence[SampleType]]]
+        | None = None,
+    ) -> Sequence[RemoteWriteSeries]:
         rw_timeseries = []
 
         for resource_metrics in data.resource_metrics:
             resource = resource_metrics.resource
             if self.resources_as_labels:
-                resource_labels = [
+                resource_labels = tuple(
                     (name, str(value)) for name, value in resource.attributes.items()
-                ]
+                )
             else:
-                resource_labels = []
+                resource_labels = ()
+            self._resource_labels = resource_labels
             for scope_metrics in resource_metrics.scope_metrics:
                 for metric in scope_metrics.metrics:
-                    rw_timeseries.extend(self._parse_metric(metric, resource_labels))
+                    rw_timeseries.extend(
+                        self._parse_metric(
+                            metric,
+                            resource_labels,
+                            buffered.get(metric.name) if buffered else None,
+                        )
+                    )
         return rw_timeseries
 
+    def _translate_store(
+        self,
+        store: SeriesStore,
+        buffered: Mapping[str, Mapping[AttributesType, Sequence[SampleType]]]
+        | None = None,
+    ) -> Sequence[RemoteWriteSeries]:
+        resource_labels = store.resource_labels if self.resources_as_labels else ()
+        self._resource_labels = resource_labels
+        names: Dict[str, str] = {}
+        sample_sets: Dict[AttributesType, Sequence[SampleType]] = {}
+        for name, attributes, value, timestamp in store.collect():
+            sanitized = names.get(name)
+            if sanitized is None:
+                sanitized = names[name] = self._sanitize_string(name, "name")
+            samples = buffered.get(name, {}).get(attributes) if buffered else None
+            sample_sets[attributes + (("__name__", sanitized),)] = samples or [
+                (value, timestamp)
+            ]
+        return self._convert_to_timeseries(
+            sample_sets, resource_labels, Metadata.METRIC_TYPE_GAUGE
+        )
+
     def _parse_metric(
-        self, metric: Metric, resource_labels: Sequence
-    ) -> Sequence[TimeSeries]:
-        """Parse a single metric into Prometheus TimeSeries objects."""
+        self,
+        metric: Metric,
+        resource_labels: Sequence,
+        buffered: Mapping[AttributesType, Sequence[SampleType]] | None = None,
+    ) -> Sequence[RemoteWriteSeries]:
+        """Parse a single metric into Prometheus TimeSeries objects.
+
+        Gauge series with buffered samples send all of them, in render order,
+        instead of only the value current at collection time.
+        """
         if metric.unit:
             name = f"{metric.name}_{metric.unit}"
         else:
@@ -224,44 +421,106 @@ class PrometheusRemoteWriteMetricsExporter(MetricExporter):
         if isinstance(metric.data, (Gauge, Sum)):
             for data_point in metric.data.data_points:
                 attrs, sample = self._parse_data_point(data_point, name)
-                sample_sets[attrs].append(sample)
+                samples = None
+                if buffered and isinstance(metric.data, Gauge):
+                    samples = buffered.get(tuple(data_point.attributes.items()))
+                if samples:
+                    sample_sets[attrs].extend(samples)
+                else:
+                    sample_sets[attrs].append(sample)
+            if isinstance(metric.data, Sum) and metric.data.is_monotonic:
+                metric_type = Metadata.METRIC_TYPE_COUNTER
+            else:
+                metric_type = Metadata.METRIC_TYPE_GAUGE
         elif isinstance(metric.data, Histogram):
             for data_point in metric.data.data_points:
                 data_point_results = self._parse_histogram_data_point(data_point, name)
                 for attrs, sample in data_point_results:
                     sample_sets[attrs].append(sample)
+            metric_type = Metadata.METRIC_TYPE_HISTOGRAM
         else:
             logger.warning("Unsupported Metric Type: %s", type(metric.data))
             return []
-        return self._convert_to_timeseries(sample_sets, resource_labels)
+        return self._convert_to_timeseries(sample_sets, resource_labels, metric_type)
 
     def _convert_to_timeseries(
         self,
         sample_sets: Mapping[AttributesType, Sequence[SampleType]],
         resource_labels: Sequence,
-    ) -> Sequence[TimeSeries]:
-        timeseries: list[TimeSeries] = []
+        metric_type: int = Metadata.METRIC_TYPE_UNSPECIFIED,
+    ) -> Sequence[RemoteWriteSeries]:
+        timeseries: list[RemoteWriteSeries] = []
+        resource_key = tuple(resource_labels)
         for labels, samples in sample_sets.items():
-            timeseries_item = TimeSeries()
-            for label_name, label_value in sorted(chain(resource_labels, labels)):
-                timeseries_item.labels.append(self._label(label_name, str(label_value)))
-            for value, timestamp in samples:
-                timeseries_item.samples.append(self._sample(float(value), timestamp))
-            timeseries.append(timeseries_item)
+            cache_key = (resource_key, labels)
+            entry = self._label_cache.get(cache_key)
+            if entry is None:
+                series_labels = self._series_labels(resource_labels, labels)
+                if series_labels is None:
+                    # Cached too, so a dropped series is only relabeled once.
+                    entry = CachedSeries((), b"")
+                else:
+                    entry = CachedSeries(
+                        series_labels, encode_label_block(series_labels)
+                    )
+                self._label_cache.put(cache_key, entry)
+            if not entry.labels:
+                self._dropped_series += 1
+                continue
+            if self.send_on_change and not self._should_send(entry, samples):
+                self._suppressed_series += 1
+                continue
+            timeseries.append(
+                RemoteWriteSeries(entry.labels, samples, metric_type, entry.label_block)
+            )
         return timeseries
 
-    @staticmethod
-    def _sample(value: float, timestamp: int) -> Sample:
-        sample = Sample()
-        sample.value = value
-        sample.timestamp = timestamp
-        return sample
-
-    def _label(self, name: str, value: str) -> Label:
-        label = Label()
-        label.name = self._sanitize_string(name, "label")
-        label.value = value
-        return label
+    def _series_labels(
+        self, resource_labels: Sequence, labels: AttributesType
+    ) -> LabelsType | None:
+        """Sanitized, sorted and relabeled labels of a series, None to drop it."""
+        series_labels = tuple(
+            (self._sanitize_string(label_name, "label"), str(label_value))
+            for label_name, label_value in sorted(chain(resource_labels, labels))
+        )
+        if self.relabeler is None:
+            return series_labels
+        relabeled = self.relabeler.relabel(series_labels)
+        if relabeled is None or relabeled == series_labels:
+            return relabeled
+        # Rules can write any label, so sanitize what they produced.
+        return tuple(
+            sorted(
+                (
+                    self._sanitize_string(label_name, "label"),
+                    self._sanitize_string(label_value, "name")
+                    if label_name == "__name__"
+                    else label_value,
+                )
+                for label_name, label_value in relabeled
+            )
+        )
+
+    def _should_send(self, entry: CachedSeries, samples: Sequence[SampleType]) -> bool:
+        """Whether some target still lacks the series' value, or its heartbeat elapsed.
+
+        A batch carries every series some target still needs, so a target that
+        missed a change gets it with the next export instead of the next
+        heartbeat. The others receive it again, which receivers deduplicate.
+        """
+        timestamp = samples[-1][1]
+        # Compare bit patterns so NaN and -0.0 count as unchanged only when equal.
+        packed = [struct.pack("<d", value) for value, _ in samples]
+        for target in self.targets:
+            sent = entry.sent.get(target)
+            if (
+                sent is None
+                or any(value != sent[0] for value in packed)
+                or timestamp - sent[1] >= self._heartbeat_millis
+            ):
+                self._deliveries.append((entry, packed[-1], timestamp))
+                return True
+        return False
 
     @staticmethod
     def _sanitize_string(string: str, type_: str) -> str:
@@ -316,62 +575,161 @@ class PrometheusRemoteWriteMetricsExporter(MetricExporter):
         sample = (data_point.value, (data_point.time_unix_nano // 1_000_000))
         return attrs, sample
 
-    @staticmethod
-    def _build_message(timeseries: Sequence[TimeSeries]) -> bytes:
-        write_request = WriteRequest()
-        write_request.timeseries.extend(timeseries)
-        serialized_message = write_request.SerializeToString()
-        return snappy.compress(serialized_message)
-
-    def _build_headers(self) -> Dict:
-        headers = {
-            "Content-Encoding": "snappy",
-            "Content-Type": "application/x-protobuf",
-            "X-Prometheus-Remote-Write-Version": "0.1.0",
-        }
-        if self.headers:
-            for header_name, header_value in self.headers.items():
-                headers[header_name] = header_value
-        return headers
-
-    def _send_message(self, message: bytes, headers: Dict) -> MetricExportResult:
-        auth = None
-        if self.basic_auth:
-            auth = (self.basic_auth["username"], self.basic_auth["password"])
-
-        cert = None
-        verify = True
-        if self.tls_config:
-            if "ca_file" in self.tls_config:
-                verify = self.tls_config["ca_file"]
-            elif "insecure_skip_verify" in self.tls_config:
-                verify = self.tls_config["insecure_skip_verify"]
-
-            if "cert_file" in self.tls_config and "key_file" in self.tls_config:
-                cert = (
-                    self.tls_config["cert_file"],
-                    self.tls_config["key_file"],
+    def _self_metric_series(self) -> Sequence[RemoteWriteSeries]:
+        """Describe the exporter and its targets as template_metrics_* series."""
+        timestamp = time.time_ns() // 1_000_000
+        base = self._self_metrics_attributes
+        gauges: Dict[AttributesType, list[SampleType]] = {}
+        counters: Dict[AttributesType, list[SampleType]] = {}
+        histograms: Dict[AttributesType, list[SampleType]] = {}
+
+        def add(sample_set, name, value, labels=()):
+            sample_set[base + labels + (("__name__", name),)] = [
+                (float(value), timestamp)
+            ]
+
+        def add_histogram(name, histogram: LatencyHistogram, labels=()):
+            buckets, total, count = histogram.snapshot()
+            for bound, bucket_count in buckets:
+                add(
+                    histograms,
+                    f"{name}_bucket",
+                    bucket_count,
+                    labels + (("le", bound),),
                 )
-        try:
-            response = requests.post(
-                self.endpoint,
-                data=message,
-                headers=headers,
-                auth=auth,
-                timeout=self.timeout,
-                proxies=self.proxies,
-                cert=cert,
-                verify=verify,
+            add(histograms, f"{name}_sum", total, labels)
+            add(histograms, f"{name}_count", count, labels)
+
+        stats = self.stats
+        add(gauges, "template_metrics_export_series", stats.last_series)
+        add(gauges, "template_metrics_export_samples", stats.last_samples)
+        for encoding, size in (
+            ("uncompressed", stats.last_uncompressed_bytes),
+            ("compressed", stats.last_compressed_bytes),
+        ):
+            add(
+                gauges,
+                "template_metrics_payload_bytes",
+                size,
+                (("encoding", encoding),),
+            )
+        add(counters, "template_metrics_exports_total", stats.exports)
+        add_histogram("template_metrics_translate_seconds", stats.translate_latency)
+        add_histogram("template_metrics_serialize_seconds", stats.serialize_latency)
+        add_histogram("template_metrics_compress_seconds", stats.compress_latency)
+        for target in stats.targets:
+            labels = (("target", target.name),)
+            if target.last_success is not None:
+                add(
+                    gauges,
+                    "template_metrics_last_success_timestamp_seconds",
+                    target.last_success,
+                    labels,
+                )
+            add(
+                gauges,
+                "template_metrics_circuit_breaker_open",
+                target.circuit_state == OPEN,
+                labels,
+            )
+            add(
+                counters,
+                "template_metrics_dropped_batches_total",
+                target.dropped_batches,
+                labels,
+            )
+            for status, count in sorted(target.responses.items()):
+                add(
+                    counters,
+                    "template_metrics_http_responses_total",
+                    count,
+                    labels + (("status", status),),
+                )
+            add_histogram(
+                "template_metrics_http_request_seconds", target.http_latency, labels
             )
-            if not response.ok:
-                response.raise_for_status()
-        except requests.exceptions.RequestException as err:
-            logger.error("Export POST request failed with reason: %s", err)
-            return MetricExportResult.FAILURE
-        return MetricExportResult.SUCCESS
+
+        resource_labels = self._resource_labels
+        return [
+            *self._convert_to_timeseries(
+                gauges, resource_labels, Metadata.METRIC_TYPE_GAUGE
+            ),
+            *self._convert_to_timeseries(
+                counters, resource_labels, Metadata.METRIC_TYPE_COUNTER
+            ),
+            *self._convert_to_timeseries(
+                histograms, resource_labels, Metadata.METRIC_TYPE_HISTOGRAM
+            ),
+        ]
+
+    def _encode(
+        self,
+        series: Sequence[RemoteWriteSeries],
+        protocol_version: str,
+        codec: Codec,
+    ) -> Tuple[int, bytes]:
+        started = time.perf_counter()
+        with self._encoder_lock:
+            if protocol_version == REMOTE_WRITE_VERSION_2:
+                serialized_message = self._build_message_v2(series)
+            else:
+                serialized_message = self._build_message(series)
+        serialized = time.perf_counter()
+        message = codec.compress(serialized_message)
+        self.stats.record_encode(
+            len(serialized_message),
+            len(message),
+            serialized - started,
+            time.perf_counter() - serialized,
+        )
+        logger.debug(
+            "Remote write payload %s bytes, %s bytes after %s",
+            len(serialized_message),
+            len(message),
+            codec.name,
+        )
+        return len(serialized_message), message
+
+    def _build_message(self, series: Sequence[RemoteWriteSeries]) -> bytes:
+        return self._encoder.encode_v1(
+            (
+                item.label_block
+                if item.label_block is not None
+                else encode_label_block(item.labels),
+                item.samples,
+            )
+            for item in series
+        )
+
+    def _build_message_v2(self, series: Sequence[RemoteWriteSeries]) -> bytes:
+        """Build a 2.0 request, interning every label string into a symbol table."""
+        return self._encoder.encode_v2(
+            (item.labels, item.samples, item.metric_type) for item in series
+        )
 
     def force_flush(self, timeout_millis: float = 10_000) -> bool:
-        return True
+        deadline = time.monotonic() + timeout_millis / 1000
+        # Every target is flushed, even after one of them failed to.
+        flushed = [
+            target.flush(max(deadline - time.monotonic(), 0)) for target in self.targets
+        ]
+        return all(flushed)
 
     def shutdown(self, timeout_millis: float = 30_000, **kwargs) -> None:
-        return None
+        # PeriodicExportingMetricReader passes its remaining time as ``timeout``.
+        timeout = kwargs.get("timeout", timeout_millis) / 1000
+        # Targets flush in parallel, so a slow one does not eat into the time
+        # of the ones after it. Each shutdown is bounded by timeout itself.
+        threads = [
+            threading.Thread(
+                target=target.shutdown,
+                args=(timeout,),
+                name=f"RemoteWriteShutdown-{target.name}",
+                daemon=True,
+            )
+            for target in self.targets
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,71 @@
+"""Circuit breaker that stops sending to an unhealthy endpoint."""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Callable, Deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Track request outcomes of one endpoint and decide whether to send.
+
+    The breaker is closed while the endpoint is healthy. It opens after
+    failure_threshold consecutive failures, or once at least timeout_rate of
+    the last window requests timed out. While open no request is allowed.
+    After reset_timeout seconds it becomes half-open and allows a probe: a
+    success closes it again, a failure opens it for another reset_timeout.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60.0,
+        timeout_rate: float = 0.5,
+        window: int = 10,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if failure_threshold <= 0:
+            raise ValueError("failure_threshold must be greater than 0")
+        if not 0 < timeout_rate <= 1:
+            raise ValueError("timeout_rate must be between 0 and 1")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timeout_rate = timeout_rate
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._timeouts: Deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._clock = clock
+
+    def allow(self) -> bool:
+        """Whether a request may be sent, moving to half-open once it is due."""
+        if self.state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        return self.state != OPEN
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self._timeouts.append(False)
+        if self.state != CLOSED:
+            self.state = CLOSED
+            self._timeouts.clear()
+
+    def record_failure(self, timeout: bool = False) -> None:
+        self.consecutive_failures += 1
+        self._timeouts.append(timeout)
+        if (
+            self.state == HALF_OPEN
+            or self.consecutive_failures >= self.failure_threshold
+            or (
+                len(self._timeouts) == self._timeouts.maxlen
+                and sum(self._timeouts) >= self.timeout_rate * len(self._timeouts)
+            )
+        ):
+            self.state = OPEN
+            self._opened_at = self._clock()
+            self._timeouts.clear()
@@ -0,0 +1,53 @@
+"""Samples rendered between two exports."""
+
+from __future__ import annotations
+
+import threading
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Mapping, Tuple
+
+AttributesType = Tuple[Tuple[str, Any], ...]
+SampleType = Tuple[float, int]
+
+
+class SampleBuffer:
+    """Timestamped samples per series, collected between two exports.
+
+    Series are keyed by metric name and their attributes in the order they were
+    passed to the instrument, which is how the exporter sees them on the data
+    points. Each series keeps at most max_samples, dropping the oldest first.
+    """
+
+    def __init__(self, max_samples: int = 60) -> None:
+        if max_samples <= 0:
+            raise ValueError("max_samples must be greater than 0")
+        self.max_samples = max_samples
+        self._series: Dict[Tuple[str, AttributesType], Deque[SampleType]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def add(
+        self,
+        name: str,
+        attributes: Mapping[str, Any] | None,
+        value: float,
+        timestamp_ms: int,
+    ) -> None:
+        """Buffer a sample rendered at timestamp_ms."""
+        key = (name, tuple((attributes or {}).items()))
+        with self._lock:
+            samples = self._series.get(key)
+            if samples is None:
+                samples = self._series[key] = deque(maxlen=self.max_samples)
+            samples.append((value, timestamp_ms))
+
+    def drain(self) -> Dict[str, Dict[AttributesType, list[SampleType]]]:
+        """Return and forget every buffered sample, grouped by metric name."""
+        with self._lock:
+            series, self._series = self._series, {}
+        drained: Dict[str, Dict[AttributesType, list[SampleType]]] = defaultdict(dict)
+        for (name, attributes), samples in series.items():
+            drained[name][attributes] = list(samples)
+        return drained
@@ -0,0 +1,87 @@
+"""Compression codecs for remote write payloads."""
+
+from __future__ import annotations
+
+import gzip
+from typing import Dict, Type
+
+import snappy
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+class Codec:
+    """Base class for a remote write payload codec."""
+
+    name: str
+    content_encoding: str
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class SnappyCodec(Codec):
+    """Snappy block format, the encoding every remote write receiver accepts."""
+
+    name = "snappy"
+    content_encoding = "snappy"
+
+    def compress(self, data: bytes) -> bytes:
+        return snappy.compress(data)
+
+
+class SnappyFramedCodec(Codec):
+    """Snappy framing format, compressed in bounded chunks for very large payloads."""
+
+    name = "snappy_framed"
+    content_encoding = "x-snappy-framed"
+
+    def compress(self, data: bytes) -> bytes:
+        return snappy.StreamCompressor().add_chunk(data)
+
+
+class ZstdCodec(Codec):
+    """Zstandard, accepted by VictoriaMetrics and other receivers that negotiate it."""
+
+    name = "zstd"
+    content_encoding = "zstd"
+
+    def __init__(self, level: int = 3) -> None:
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+
+class GzipCodec(Codec):
+    """Gzip, for receivers behind proxies that only understand HTTP encodings."""
+
+    name = "gzip"
+    content_encoding = "gzip"
+
+    def __init__(self, level: int = 6) -> None:
+        self._level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self._level, mtime=0)
+
+
+CODECS: Dict[str, Type[Codec]] = {
+    codec.name: codec
+    for codec in (SnappyCodec, SnappyFramedCodec, ZstdCodec, GzipCodec)
+}
+
+
+def get_codec(name: str) -> Codec:
+    """Return a codec instance for a configured compression name."""
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(
+            f"compression must be one of {', '.join(CODECS)}, got {name}"
+        ) from None
@@ -0,0 +1,180 @@
+"""Prometheus style relabeling of series before they are written."""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Any, Dict, Mapping, Sequence, Tuple
+
+LabelsType = Tuple[Tuple[str, str], ...]
+
+REPLACE = "replace"
+KEEP = "keep"
+DROP = "drop"
+HASHMOD = "hashmod"
+LABELMAP = "labelmap"
+LABELDROP = "labeldrop"
+LABELKEEP = "labelkeep"
+LOWERCASE = "lowercase"
+UPPERCASE = "uppercase"
+ACTIONS = (
+    REPLACE,
+    KEEP,
+    DROP,
+    HASHMOD,
+    LABELMAP,
+    LABELDROP,
+    LABELKEEP,
+    LOWERCASE,
+    UPPERCASE,
+)
+
+# $1, ${1} and ${name} refer to regex groups and $$ is a literal $, as in
+# Prometheus.
+_GROUP_REFERENCE = re.compile(r"\$(?:\$|\{(\w+)\}|(\w+))")
+
+
+def _expand(template: str, match: re.Match[str]) -> str:
+    """
+    Expand group references in template, the way Go's Regexp.Expand does.
+
+    Groups that do not exist or did not match expand to an empty string, so
+    $1 with a regex without groups, or $1_x (the group named 1_x), is empty.
+    """
+
+    def group(reference: re.Match[str]) -> str:
+        name = reference.group(1) or reference.group(2)
+        if name is None:
+            return "$"
+        try:
+            return match.group(int(name) if name.isdigit() else name) or ""
+        except IndexError:
+            return ""
+
+    return _GROUP_REFERENCE.sub(group, template)
+
+
+class RelabelRule:
+    """
+    One relabel config, with the semantics of Prometheus write_relabel_configs.
+
+    The regex is anchored at both ends. replace, hashmod, lowercase and
+    uppercase need a target_label, hashmod also a modulus.
+
+    Args:
+        action: one of ACTIONS, defaults to replace (Optional)
+        source_labels: labels whose values, joined by separator, are matched (Optional)
+        separator: defaults to ";" (Optional)
+        regex: defaults to "(.*)" (Optional)
+        target_label: label the result is written to (Optional)
+        replacement: value written on a match, may refer to groups as $1,
+            defaults to "$1" (Optional)
+        modulus: hashmod divisor (Optional)
+    """
+
+    def __init__(
+        self,
+        action: str = REPLACE,
+        source_labels: Sequence[str] = (),
+        separator: str = ";",
+        regex: str = "(.*)",
+        target_label: str | None = None,
+        replacement: str = "$1",
+        modulus: int | None = None,
+    ) -> None:
+        if action not in ACTIONS:
+            raise ValueError(f"unsupported relabel action: {action}")
+        if action in (REPLACE, HASHMOD, LOWERCASE, UPPERCASE) and not target_label:
+            raise ValueError(f"relabel action {action} needs a target_label")
+        if action == HASHMOD and not modulus:
+            raise ValueError("relabel action hashmod needs a modulus")
+        self.action = action
+        self.source_labels = tuple(source_labels)
+        self.separator = separator
+        self.regex = re.compile(f"(?:{regex})")
+        self.target_label = target_label
+        self.replacement = replacement
+        self.modulus = modulus
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> RelabelRule:
+        return cls(**config)
+
+    def apply(self, labels: Dict[str, str]) -> bool:
+        """Apply the rule to labels in place, returning False to drop the series."""
+        action = self.action
+        if action in (LABELDROP, LABELKEEP):
+            keep = action == LABELKEEP
+            for name in [
+                name
+                for name in labels
+                if (self.regex.fullmatch(name) is not None) != keep
+            ]:
+                del labels[name]
+            return True
+        if action == LABELMAP:
+            for name, value in list(labels.items()):
+                match = self.regex.fullmatch(name)
+                if match is not None:
+                    labels[_expand(self.replacement, match)] = value
+            return True
+
+        value = self.separator.join(labels.get(name, "") for name in self.source_labels)
+        if action == KEEP:
+            return self.regex.fullmatch(value) is not None
+        if action == DROP:
+            return self.regex.fullmatch(value) is None
+        if action == HASHMOD:
+            digest = hashlib.md5(value.encode(), usedforsecurity=False).digest()
+            labels[self.target_label] = str(
+                int.from_bytes(digest[8:], "big") % self.modulus
+            )
+            return True
+        if action in (LOWERCASE, UPPERCASE):
+            labels[self.target_label] = (
+                value.lower() if action == LOWERCASE else value.upper()
+            )
+            return True
+        match = self.regex.fullmatch(value)
+        if match is None:
+            return True
+        target = _expand(self.target_label, match)
+        result = _expand(self.replacement, match)
+        if result:
+            labels[target] = result
+        else:
+            labels.pop(target, None)
+        return True
+
+
+class Relabeler:
+    """
+    A compiled pipeline of relabel rules, applied in order.
+
+    Rules see the sanitized labels of a series, including __name__, and a
+    series is dropped when a rule drops it or when it ends without a name.
+    Labels whose value ends up empty are removed. The exporter caches the
+    result with the series' other translated labels, so the rules only run
+    for label sets it has not seen yet.
+    """
+
+    def __init__(self, rules: Sequence[RelabelRule]) -> None:
+        self.rules = tuple(rules)
+
+    @classmethod
+    def from_config(cls, configs: Sequence[Mapping[str, Any]]) -> Relabeler:
+        return cls([RelabelRule.from_config(config) for config in configs])
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def relabel(self, labels: LabelsType) -> LabelsType | None:
+        """Return the relabeled, sorted labels, or None to drop the series."""
+        result = dict(labels)
+        for rule in self.rules:
+            if not rule.apply(result):
+                return None
+        if not result.get("__name__"):
+            return None
+        # Labels left empty are removed, as Prometheus does.
+        return tuple(sorted((name, value) for name, value in result.items() if value))
@@ -0,0 +1,377 @@
+"""Write remote write requests to local files and ship them later.
+
+A FileSink takes the place of a remote write target for sites without a
+network connection. Every batch it receives is appended as one frame to a
+segment file: a 4 byte big-endian length followed by the compressed
+WriteRequest, exactly the body a target would have posted. Each segment starts
+with a header line naming the protocol version and codec of its frames, so
+ship() can post them unchanged.
+
+Run ``python -m custom_components.template_metrics.prometheus_remote_write.sink
+DIRECTORY URL`` to ship the segments of a directory from another machine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Tuple
+
+from .compression import Codec, get_codec
+from .stats import TargetStats
+from .target import (
+    REMOTE_WRITE_VERSION_1,
+    RemoteWriteBatch,
+    RemoteWriteTarget,
+    UnsupportedProtocolError,
+)
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b"TMRW"
+SEGMENT_SUFFIX = ".rwlog"
+FRAME_HEADER = struct.Struct(">I")
+
+
+def _segment_header(protocol_version: str, codec: Codec) -> bytes:
+    return b"%s %s %s\n" % (
+        SEGMENT_MAGIC,
+        protocol_version.encode(),
+        codec.name.encode(),
+    )
+
+
+def read_header(file: BinaryIO) -> Tuple[str, str]:
+    """Read the protocol version and codec name from the start of a segment."""
+    header = file.readline().split()
+    if len(header) != 3 or header[0] != SEGMENT_MAGIC:
+        raise ValueError(f"{file.name} is not a remote write segment")
+    return header[1].decode(), header[2].decode()
+
+
+def read_frames(file: BinaryIO) -> Iterator[bytes]:
+    """Yield the frames after the header of a segment.
+
+    A frame cut short by a crash ends the segment instead of failing it.
+    """
+    while True:
+        length = file.read(FRAME_HEADER.size)
+        if len(length) < FRAME_HEADER.size:
+            return
+        (size,) = FRAME_HEADER.unpack(length)
+        frame = file.read(size)
+        if len(frame) < size:
+            logger.warning("Ignored a truncated frame at the end of %s", file.name)
+            return
+        yield frame
+
+
+def segments(directory: str | os.PathLike) -> list[Path]:
+    """Segment files of a directory, oldest first."""
+    return sorted(Path(directory).glob(f"*{SEGMENT_SUFFIX}"))
+
+
+class FileSink:
+    """
+    Append remote write requests to rotating segment files.
+
+    Frames are collected in memory and written with a single write and fsync
+    once fsync_interval seconds passed since the last one, on flush and on
+    rotation, so a flash card sees one write per interval instead of one per
+    export. At most fsync_interval seconds of samples are lost on power loss.
+
+    Args:
+        directory: where segment files are written (Required)
+        protocol_version: remote write protocol of the frames, defaults to "1.0" (Optional)
+        compression: codec of the frames, defaults to snappy (Optional)
+        max_file_bytes: size at which a segment is closed, defaults to 16 MiB (Optional)
+        max_file_age: seconds after which a segment is closed, defaults to 3600 (Optional)
+        max_total_bytes: size of all segments beyond which the oldest are
+            deleted, defaults to 512 MiB (Optional)
+        fsync_interval: seconds between two writes to disk, defaults to 60 (Optional)
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        protocol_version: str = REMOTE_WRITE_VERSION_1,
+        compression: str = "snappy",
+        max_file_bytes: int = 16 * 1024 * 1024,
+        max_file_age: float = 3600,
+        max_total_bytes: int = 512 * 1024 * 1024,
+        fsync_interval: float = 60,
+        clock=time.monotonic,
+    ) -> None:
+        if max_file_bytes <= 0 or max_total_bytes < max_file_bytes:
+            raise ValueError(
+                "max_file_bytes must be greater than 0 and at most max_total_bytes"
+            )
+        self.directory = Path(directory)
+        self.protocol_version = protocol_version
+        self.codec: Codec = get_codec(compression)
+        self.max_file_bytes = max_file_bytes
+        self.max_file_age = max_file_age
+        self.max_total_bytes = max_total_bytes
+        self.fsync_interval = fsync_interval
+        self.name = "file_sink"
+        self.stats = TargetStats(self.name)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_bytes = 0
+        self._opened_at = 0.0
+        self._synced_at = clock()
+        self._pending = bytearray()
+        self._pending_batches: list[RemoteWriteBatch] = []
+
+    @property
+    def compression(self) -> str:
+        return self.codec.name
+
+    @property
+    def pending_batches(self) -> int:
+        return len(self._pending_batches)
+
+    def submit(self, batch: RemoteWriteBatch) -> None:
+        """Append a batch as one frame, writing to disk when a sync is due."""
+        uncompressed_size, message = batch.message(self.protocol_version, self.codec)
+        with self._lock:
+            self._pending += FRAME_HEADER.pack(len(message))
+            self._pending += message
+            self._pending_batches.append(batch)
+            self.stats.last_uncompressed_bytes = uncompressed_size
+            self.stats.last_compressed_bytes = len(message)
+            if self._clock() - self._synced_at >= self.fsync_interval:
+                self._sync()
+
+    def flush(self, timeout: float = 0) -> bool:
+        """Write every pending frame to disk."""
+        with self._lock:
+            return self._sync()
+
+    def rotate(self) -> None:
+        """Write pending frames and close the current segment."""
+        with self._lock:
+            self._sync()
+            self._close()
+
+    def shutdown(self, timeout: float = 0) -> bool:
+        with self._lock:
+            synced = self._sync()
+            self._close()
+        return synced
+
+    def closed_segments(self) -> list[Path]:
+        """Segments that are no longer written to, oldest first."""
+        with self._lock:
+            current = Path(self._file.name) if self._file is not None else None
+            return [path for path in segments(self.directory) if path != current]
+
+    def _sync(self) -> bool:
+        """Write pending frames to the current segment and fsync it.
+
+        Must be called with the lock held.
+        """
+        self._synced_at = self._clock()
+        if not self._pending:
+            return True
+        started = time.perf_counter()
+        try:
+            if self._file is not None and (
+                self._file_bytes + len(self._pending) > self.max_file_bytes
+                or self._clock() - self._opened_at >= self.max_file_age
+            ):
+                self._close()
+            if self._file is None:
+                self._open()
+            self._file.write(self._pending)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as err:
+            logger.error("Could not write metrics to %s: %s", self.directory, err)
+            self.stats.dropped_batches += len(self._pending_batches)
+            self.stats.record_response("error", time.perf_counter() - started)
+            self._close()
+            written = False
+        else:
+            self._file_bytes += len(self._pending)
+            for batch in self._pending_batches:
+                batch.delivered(self)
+            self.stats.sent_batches += len(self._pending_batches)
+            self.stats.last_success = time.time()
+            self.stats.record_response("written", time.perf_counter() - started)
+            written = True
+        self._pending = bytearray()
+        self._pending_batches = []
+        return written
+
+    def _open(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._enforce_retention()
+        # Named by creation time, bumped past segments opened in the same
+        # millisecond so a new segment never appends to a closed one.
+        stamp = time.time_ns() // 1_000_000
+        path = self.directory / f"{stamp:013d}{SEGMENT_SUFFIX}"
+        while path.exists():
+            stamp += 1
+            path = self.directory / f"{stamp:013d}{SEGMENT_SUFFIX}"
+        self._file = open(path, "ab")  # pylint: disable=consider-using-with
+        header = _segment_header(self.protocol_version, self.codec)
+        self._file.write(header)
+        self._file_bytes = len(header)
+        self._opened_at = self._clock()
+
+    def _close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError as err:
+                logger.error("Could not close %s: %s", self._file.name, err)
+            self._file = None
+
+    def _enforce_retention(self) -> None:
+        """Delete the oldest segments to leave room for a full new one."""
+        files = [(path, path.stat().st_size) for path in segments(self.directory)]
+        total = sum(size for _, size in files) + self.max_file_bytes
+        for path, size in files:
+            if total <= self.max_total_bytes:
+                break
+            logger.warning("Deleted %s to stay within the size limit", path.name)
+            path.unlink()
+            total -= size
+
+
+class _FrameBatch:
+    """A batch whose message was encoded when the frame was written."""
+
+    series = ()
+
+    def __init__(self, protocol_version: str, codec_name: str, frame: bytes) -> None:
+        self._protocol_version = protocol_version
+        self._codec_name = codec_name
+        self._frame = frame
+
+    def message(self, protocol_version: str, codec: Codec) -> Tuple[int, bytes]:
+        if (protocol_version, codec.name) != (self._protocol_version, self._codec_name):
+            raise ValueError(
+                f"frame was written as {self._protocol_version} {self._codec_name}"
+            )
+        return 0, self._frame
+
+    def delivered(self, target: object) -> None:
+        pass
+
+
+def ship(
+    paths: list[Path],
+    endpoint: str,
+    basic_auth: Dict | None = None,
+    headers: Dict | None = None,
+    timeout: int = 30,
+    delete: bool = True,
+) -> Dict[str, int]:
+    """Post every frame of the given segments to a remote write endpoint.
+
+    Frames are posted back to back over one keep-alive connection, with the
+    target's retries. A segment is deleted once all its frames were accepted.
+    Shipping stops at the first frame that fails; that segment is kept and
+    shipped from its start next time, which receivers accept since identical
+    samples are deduplicated. Frames are posted as they were written, so a
+    segment written with 2.0 cannot fall back to 1.0; shipping it to an
+    endpoint without 2.0 support raises an OSError saying so.
+    """
+    summary = {"segments": 0, "frames": 0, "bytes": 0}
+    targets: Dict[Tuple[str, str], RemoteWriteTarget] = {}
+    try:
+        for path in paths:
+            with open(path, "rb") as file:
+                protocol_version, codec_name = read_header(file)
+                key = (protocol_version, codec_name)
+                target = targets.get(key)
+                if target is None:
+                    target = targets[key] = RemoteWriteTarget(
+                        endpoint,
+                        basic_auth=basic_auth,
+                        headers=headers,
+                        timeout=timeout,
+                        protocol_version=protocol_version,
+                        compression=codec_name,
+                        protocol_fallback=False,
+                    )
+                for frame in read_frames(file):
+                    batch = _FrameBatch(protocol_version, codec_name, frame)
+                    try:
+                        accepted = target.send(batch)
+                    except UnsupportedProtocolError as err:
+                        raise OSError(
+                            f"{path.name} was written with remote write "
+                            f"{protocol_version}, but {err}"
+                        ) from err
+                    if not accepted:
+                        raise OSError(
+                            f"{endpoint} did not accept a frame of {path.name}"
+                        )
+                    summary["frames"] += 1
+                    summary["bytes"] += len(frame)
+            summary["segments"] += 1
+            if delete:
+                path.unlink()
+    finally:
+        for target in targets.values():
+            target.shutdown(0)
+    return summary
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Ship remote write segments written by a file sink."
+    )
+    parser.add_argument("directory", help="directory holding the segment files")
+    parser.add_argument("url", help="remote write endpoint")
+    parser.add_argument("--user", help="basic auth user")
+    parser.add_argument("--password", help="basic auth password")
+    parser.add_argument(
+        "--header",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="header to add to every request",
+    )
+    parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument(
+        "--keep", action="store_true", help="keep segments after shipping them"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    headers = dict(header.split("=", 1) for header in args.header)
+    started = time.monotonic()
+    try:
+        summary = ship(
+            segments(args.directory),
+            args.url,
+            basic_auth={"username": args.user, "password": args.password}
+            if args.user
+            else None,
+            headers=headers or None,
+            timeout=args.timeout,
+            delete=not args.keep,
+        )
+    except (OSError, ValueError) as err:
+        parser.exit(1, f"Shipping failed: {err}\n")
+    elapsed = time.monotonic() - started
+    logger.info(
+        "Shipped %s frames, %s bytes from %s segments in %.1fs",
+        summary["frames"],
+        summary["bytes"],
+        summary["segments"],
+        elapsed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Statistics about what the exporter and its targets are doing."""
+
+from __future__ import annotations
+
+import bisect
+import threading
+from collections import Counter
+from typing import Sequence, Tuple
+
+from .breaker import CLOSED
+
+# Upper bounds in seconds, from sub-millisecond encoding to slow HTTP requests.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed buckets, in seconds."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.last = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+            self.last = seconds
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def snapshot(self) -> Tuple[Tuple[Tuple[str, int], ...], float, int]:
+        """Return the cumulative (le, count) buckets, sum and count."""
+        with self._lock:
+            cumulative = []
+            total = 0
+            for bound, count in zip(self.buckets, self.bucket_counts):
+                total += count
+                cumulative.append((str(bound), total))
+            cumulative.append(("+Inf", self.count))
+            return tuple(cumulative), self.sum, self.count
+
+
+class TargetStats:
+    """What a single remote write target sent and how it went."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.http_latency = LatencyHistogram()
+        self.responses: Counter[str] = Counter()
+        self.last_success: float | None = None
+        self.last_uncompressed_bytes = 0
+        self.last_compressed_bytes = 0
+        self.sent_batches = 0
+        self.dropped_batches = 0
+        self.circuit_state = CLOSED
+
+    def record_response(self, status: str, seconds: float) -> None:
+        """Record the outcome of one request, a status code or "error"."""
+        self.http_latency.observe(seconds)
+        self.responses[status] += 1
+
+
+class ExportStats:
+    """What the exporter translated and encoded, and the stats of its targets."""
+
+    def __init__(self, targets: Sequence[TargetStats] = ()) -> None:
+        self.targets = list(targets)
+        self.exports = 0
+        self.last_series = 0
+        self.last_samples = 0
+        self.last_uncompressed_bytes = 0
+        self.last_compressed_bytes = 0
+        self.translate_latency = LatencyHistogram()
+        self.serialize_latency = LatencyHistogram()
+        self.compress_latency = LatencyHistogram()
+
+    def record_export(self, series: int, samples: int, seconds: float) -> None:
+        self.exports += 1
+        self.last_series = series
+        self.last_samples = samples
+        self.translate_latency.observe(seconds)
+
+    def record_encode(
+        self,
+        uncompressed_bytes: int,
+        compressed_bytes: int,
+        serialize_seconds: float,
+        compress_seconds: float,
+    ) -> None:
+        self.last_uncompressed_bytes = uncompressed_bytes
+        self.last_compressed_bytes = compressed_bytes
+        self.serialize_latency.observe(serialize_seconds)
+        self.compress_latency.observe(compress_seconds)
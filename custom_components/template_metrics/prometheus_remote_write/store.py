@@ -0,0 +1,89 @@
+"""Latest gauge values written straight from the coordinator."""
+
+from __future__ import annotations
+
+import threading
+from array import array
+from typing import Any, Dict, Mapping, Tuple
+
+AttributesType = Tuple[Tuple[str, Any], ...]
+StoredSample = Tuple[str, AttributesType, float, int]
+
+
+class SeriesStore:
+    """Last value and timestamp of every gauge series, in flat arrays.
+
+    Each series gets a fixed slot the first time it is set, so later sets only
+    overwrite a double and an integer in place. Series are keyed like the
+    SampleBuffer keys them: metric name and attributes in the order they were
+    set. collect() returns only the series set since the previous collect,
+    which matches what an OpenTelemetry gauge reports per collection.
+    """
+
+    def __init__(self, resource_attributes: Mapping[str, Any] | None = None) -> None:
+        self.resource_labels = tuple(
+            (name, str(value)) for name, value in (resource_attributes or {}).items()
+        )
+        self._index: Dict[Tuple[str, AttributesType], int] = {}
+        self._keys: list[Tuple[str, AttributesType]] = []
+        self._values = array("d")
+        self._timestamps = array("q")
+        self._updated = bytearray()
+        self._dirty: list[int] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def set(
+        self,
+        name: str,
+        attributes: Mapping[str, Any] | None,
+        value: float,
+        timestamp_ms: int,
+    ) -> None:
+        """Store value as the current value of a series."""
+        key = (name, tuple((attributes or {}).items()))
+        with self._lock:
+            index = self._index.get(key)
+            if index is None:
+                index = self._index[key] = len(self._keys)
+                self._keys.append(key)
+                self._values.append(value)
+                self._timestamps.append(timestamp_ms)
+                self._updated.append(0)
+            else:
+                self._values[index] = value
+                self._timestamps[index] = timestamp_ms
+            if not self._updated[index]:
+                self._updated[index] = 1
+                self._dirty.append(index)
+
+    def collect(self) -> list[StoredSample]:
+        """Return (name, attributes, value, timestamp) of the series set since
+        the last collect, in the order they were first set."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, []
+            dirty.sort()
+            collected = []
+            for index in dirty:
+                self._updated[index] = 0
+                name, attributes = self._keys[index]
+                collected.append(
+                    (name, attributes, self._values[index], self._timestamps[index])
+                )
+            return collected
+
+    def remove(self, name: str) -> None:
+        """Forget every series of a metric."""
+        with self._lock:
+            kept = [index for index, key in enumerate(self._keys) if key[0] != name]
+            if len(kept) == len(self._keys):
+                return
+            remap = {old: new for new, old in enumerate(kept)}
+            self._keys = [self._keys[index] for index in kept]
+            self._values = array("d", (self._values[index] for index in kept))
+            self._timestamps = array("q", (self._timestamps[index] for index in kept))
+            self._updated = bytearray(self._updated[index] for index in kept)
+            self._dirty = [remap[index] for index in self._dirty if index in remap]
+            self._index = {key: index for index, key in enumerate(self._keys)}
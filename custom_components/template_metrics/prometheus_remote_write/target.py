@@ -0,0 +1,524 @@
+"""Remote write targets with independent send queues."""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+from .breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .compression import Codec, get_codec
+from .stats import TargetStats
+
+logger = logging.getLogger(__name__)
+
+REMOTE_WRITE_VERSION_1 = "1.0"
+REMOTE_WRITE_VERSION_2 = "2.0"
+REMOTE_WRITE_VERSIONS = (REMOTE_WRITE_VERSION_1, REMOTE_WRITE_VERSION_2)
+
+CONTENT_TYPE_V1 = "application/x-protobuf"
+CONTENT_TYPE_V2 = "application/x-protobuf;proto=io.prometheus.write.v2.Request"
+SAMPLES_WRITTEN_HEADER = "X-Prometheus-Remote-Write-Samples-Written"
+
+RETRYABLE_STATUS_CODES = frozenset({429})
+
+_STOP = object()
+
+
+class UnsupportedProtocolError(Exception):
+    """The endpoint does not accept the protocol version and may not fall back."""
+
+
+class RemoteWriteBatch:
+    """Translated series of one export, encoded at most once per wire format.
+
+    Every target sharing a protocol version and codec sends the same bytes, so
+    translation and encoding cost does not grow with the number of targets.
+    """
+
+    def __init__(
+        self,
+        series: Sequence,
+        encode: Callable[[Sequence, str, Codec], Tuple[int, bytes]],
+        on_delivered: Callable[[object], None] | None = None,
+    ) -> None:
+        self.series = series
+        self._encode = encode
+        self._on_delivered = on_delivered
+        self._messages: Dict[Tuple[str, str], Tuple[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def message(self, protocol_version: str, codec: Codec) -> Tuple[int, bytes]:
+        """Return the uncompressed size and compressed payload for a wire format."""
+        key = (protocol_version, codec.name)
+        with self._lock:
+            message = self._messages.get(key)
+            if message is None:
+                message = self._messages[key] = self._encode(
+                    self.series, protocol_version, codec
+                )
+        return message
+
+    def delivered(self, target: object) -> None:
+        """Record that a target accepted the batch."""
+        if self._on_delivered is not None:
+            self._on_delivered(target)
+
+
+class RemoteWriteTarget:
+    """
+    A remote write endpoint with its own queue, sender thread and retry state.
+
+    Args:
+        endpoint: url where data will be sent (Required)
+        basic_auth: username and password for authentication (Optional)
+        headers: additional headers for remote write request (Optional)
+        timeout: timeout for remote write requests in seconds, defaults to 30 (Optional)
+        proxies: dict mapping request proxy protocols to proxy urls (Optional)
+        tls_config: configuration for remote write TLS settings (Optional)
+        protocol_version: remote write protocol, "1.0" or "2.0", defaults to "1.0" (Optional)
+        compression: payload codec, one of snappy, snappy_framed, zstd or gzip,
+            defaults to snappy (Optional)
+        max_queue_size: batches waiting to be sent before the oldest is dropped,
+            defaults to 10 (Optional)
+        max_retries: retries of a batch after a retryable failure, defaults to 3 (Optional)
+        retry_backoff: first retry delay in seconds, doubled per retry up to
+            max_retry_backoff, defaults to 1 (Optional)
+        max_retry_backoff: longest retry delay in seconds, defaults to 30 (Optional)
+        failure_threshold: consecutive failed requests that open the circuit
+            breaker, defaults to 5 (Optional)
+        reset_timeout: seconds the circuit breaker stays open before a probe,
+            defaults to 60 (Optional)
+        protocol_fallback: fall back to 1.0 when the endpoint does not support
+            2.0, instead of raising UnsupportedProtocolError, defaults to True (Optional)
+        name: name in logs, stats and entities, defaults to the endpoint's
+            host (Optional)
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        basic_auth: Dict | None = None,
+        headers: Dict | None = None,
+        timeout: int = 30,
+        tls_config: Dict | None = None,
+        proxies: Dict | None = None,
+        protocol_version: str = REMOTE_WRITE_VERSION_1,
+        compression: str = "snappy",
+        max_queue_size: int = 10,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        max_retry_backoff: float = 30.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60.0,
+        protocol_fallback: bool = True,
+        name: str | None = None,
+    ) -> None:
+        self.endpoint = endpoint
+        self.basic_auth = basic_auth
+        self.headers = headers
+        self.timeout = timeout
+        self.tls_config = tls_config
+        self.proxies = proxies
+        self.protocol_version = protocol_version
+        self.compression = compression
+        if max_queue_size <= 0:
+            raise ValueError("max_queue_size must be greater than 0")
+        self.max_queue_size = max_queue_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.protocol_fallback = protocol_fallback
+
+        self.name = name or urlsplit(endpoint).netloc or endpoint
+        self.stats = TargetStats(self.name)
+        self.breaker = CircuitBreaker(
+            failure_threshold=failure_threshold, reset_timeout=reset_timeout
+        )
+
+        self._queue: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._deadline: float | None = None
+        self._thread: threading.Thread | None = None
+        self._thread_lock = threading.Lock()
+        self._session = requests.Session()
+
+    @property
+    def endpoint(self) -> str:
+        return self._endpoint
+
+    @endpoint.setter
+    def endpoint(self, endpoint: str) -> None:
+        if not endpoint:
+            raise ValueError("endpoint required")
+        self._endpoint = endpoint
+
+    @property
+    def protocol_version(self) -> str:
+        return self._protocol_version
+
+    @protocol_version.setter
+    def protocol_version(self, protocol_version: str) -> None:
+        if protocol_version not in REMOTE_WRITE_VERSIONS:
+            raise ValueError(
+                f"protocol_version must be one of {', '.join(REMOTE_WRITE_VERSIONS)}"
+            )
+        self._protocol_version = protocol_version
+
+    @property
+    def compression(self) -> str:
+        return self.codec.name
+
+    @compression.setter
+    def compression(self, compression: str) -> None:
+        self.codec: Codec = get_codec(compression)
+
+    @property
+    def basic_auth(self) -> Dict | None:
+        return self._basic_auth
+
+    @basic_auth.setter
+    def basic_auth(self, basic_auth: Dict | None) -> None:
+        if basic_auth:
+            if "username" not in basic_auth:
+                raise ValueError("username required in basic_auth")
+            if "password_file" in basic_auth:
+                if "password" in basic_auth:
+                    raise ValueError(
+                        "basic_auth cannot contain password and password_file"
+                    )
+                with open(  # pylint: disable=unspecified-encoding
+                    basic_auth["password_file"]
+                ) as file:
+                    basic_auth["password"] = file.readline().strip()
+            elif "password" not in basic_auth:
+                raise ValueError("password required in basic_auth")
+        self._basic_auth = basic_auth
+
+    @property
+    def timeout(self) -> int:
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout: int) -> None:
+        if timeout <= 0:
+            raise ValueError("timeout must be greater than 0")
+        self._timeout = timeout
+
+    @property
+    def tls_config(self) -> Dict | None:
+        return self._tls_config
+
+    @tls_config.setter
+    def tls_config(self, tls_config: Dict | None) -> None:
+        if tls_config:
+            new_config = {}
+            if "ca_file" in tls_config:
+                new_config["ca_file"] = tls_config["ca_file"]
+            if "cert_file" in tls_config and "key_file" in tls_config:
+                new_config["cert_file"] = tls_config["cert_file"]
+                new_config["key_file"] = tls_config["key_file"]
+            elif "cert_file" in tls_config or "key_file" in tls_config:
+                raise ValueError("tls_config requires both cert_file and key_file")
+            if "insecure_skip_verify" in tls_config:
+                new_config["insecure_skip_verify"] = tls_config["insecure_skip_verify"]
+        self._tls_config = tls_config
+
+    @property
+    def proxies(self) -> Dict | None:
+        return self._proxies
+
+    @proxies.setter
+    def proxies(self, proxies: Dict | None) -> None:
+        self._proxies = proxies
+
+    @property
+    def headers(self) -> Dict | None:
+        return self._headers
+
+    @headers.setter
+    def headers(self, headers: Dict | None) -> None:
+        self._headers = headers
+
+    @property
+    def pending_batches(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def submit(self, batch: RemoteWriteBatch) -> None:
+        """Queue a batch without blocking, dropping the oldest one when full."""
+        self._ensure_started()
+        while self._queue.qsize() >= self.max_queue_size:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            self.stats.dropped_batches += 1
+            logger.warning(
+                "Remote write queue for %s is full, dropped the oldest batch",
+                self.name,
+            )
+        self._queue.put(batch)
+
+    def flush(self, timeout: float) -> bool:
+        """Wait until every queued batch was sent or given up on."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: float) -> bool:
+        """Stop the sender thread after one last attempt at every pending batch.
+
+        Pending batches are sent without retries until timeout elapses, and
+        requests never outlast it. Batches still queued by then are dropped.
+        Returns whether every pending batch was handled in time.
+        """
+        self._deadline = time.monotonic() + timeout
+        self._stop.set()
+        pending = self.pending_batches
+        sent_batches = self.stats.sent_batches
+        with self._thread_lock:
+            thread = self._thread
+        finished = True
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            finished = not thread.is_alive()
+        if pending:
+            flushed = self.stats.sent_batches - sent_batches
+            if flushed < pending:
+                logger.warning(
+                    "Flushed %s of %s pending batches to %s on shutdown, dropped %s",
+                    flushed,
+                    pending,
+                    self.name,
+                    pending - flushed,
+                )
+            else:
+                logger.info(
+                    "Flushed %s pending batches to %s on shutdown", flushed, self.name
+                )
+        if finished:
+            self._session.close()
+        return finished
+
+    def _ensure_started(self) -> None:
+        with self._thread_lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(
+                    target=self._run, name=f"RemoteWrite-{self.name}", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is _STOP:
+                    return
+                if self._deadline is not None and time.monotonic() >= self._deadline:
+                    self.stats.dropped_batches += 1
+                    continue
+                self.send(batch)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Unexpected error sending to %s", self.name)
+            finally:
+                self._queue.task_done()
+
+    def send(self, batch: RemoteWriteBatch) -> bool:
+        """Send a batch, retrying retryable failures with exponential backoff.
+
+        While the circuit breaker is open the batch is dropped without a
+        request. Once it is half-open an empty request probes the endpoint
+        before the batch is sent.
+        """
+        if not self._breaker_allows():
+            self.stats.dropped_batches += 1
+            logger.debug("Circuit breaker for %s is open, dropped a batch", self.name)
+            return False
+        attempt = 0
+        while True:
+            protocol_version = self.protocol_version
+            uncompressed_size, message = batch.message(protocol_version, self.codec)
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                response = self._post(message, self._build_headers(protocol_version))
+            except requests.exceptions.RequestException as err:
+                self.stats.record_response("error", time.perf_counter() - started)
+                self._record_failure(isinstance(err, requests.exceptions.Timeout))
+                reason = str(err)
+                retryable = True
+            else:
+                self.stats.record_response(
+                    str(response.status_code), time.perf_counter() - started
+                )
+                if protocol_version == REMOTE_WRITE_VERSION_2 and (
+                    response.status_code == 415
+                    or (response.ok and SAMPLES_WRITTEN_HEADER not in response.headers)
+                ):
+                    # A receiver without 2.0 support either rejects the content
+                    # type or acknowledges without reporting written samples.
+                    if not self.protocol_fallback:
+                        raise UnsupportedProtocolError(
+                            f"{self.name} does not support remote write 2.0"
+                        )
+                    logger.warning(
+                        "Remote write endpoint %s does not support protocol 2.0, "
+                        "falling back to 1.0",
+                        self.name,
+                    )
+                    self.protocol_version = REMOTE_WRITE_VERSION_1
+                    continue
+                retryable = (
+                    response.status_code in RETRYABLE_STATUS_CODES
+                    or response.status_code >= 500
+                )
+                if retryable:
+                    self._record_failure()
+                else:
+                    self._record_success()
+                if response.ok:
+                    batch.delivered(self)
+                    self.stats.sent_batches += 1
+                    self.stats.last_success = time.time()
+                    self.stats.last_uncompressed_bytes = uncompressed_size
+                    self.stats.last_compressed_bytes = len(message)
+                    return True
+                reason = f"status code {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            if (
+                not retryable
+                or attempt >= self.max_retries
+                or self._stop.is_set()
+                or self.breaker.state == OPEN
+            ):
+                logger.error(
+                    "Export POST request to %s failed with reason: %s",
+                    self.name,
+                    reason,
+                )
+                return False
+            delay = min(self.retry_backoff * 2**attempt, self.max_retry_backoff)
+            if retry_after is not None and retry_after.isdigit():
+                delay = min(float(retry_after), self.max_retry_backoff)
+            attempt += 1
+            logger.debug(
+                "Export POST request to %s failed with reason: %s, retry %s in %ss",
+                self.name,
+                reason,
+                attempt,
+                delay,
+            )
+            if self._stop.wait(delay):
+                return False
+
+    def _breaker_allows(self) -> bool:
+        """Whether the circuit breaker lets a batch through, probing if half-open."""
+        if not self.breaker.allow():
+            return False
+        if self.breaker.state != HALF_OPEN:
+            return True
+        self.stats.circuit_state = HALF_OPEN
+        # An empty write request is valid for every receiver and costs nothing.
+        started = time.perf_counter()
+        try:
+            response = self._post(
+                self.codec.compress(b""), self._build_headers(self.protocol_version)
+            )
+        except requests.exceptions.RequestException as err:
+            self.stats.record_response("error", time.perf_counter() - started)
+            self._record_failure(isinstance(err, requests.exceptions.Timeout))
+            return False
+        self.stats.record_response(
+            str(response.status_code), time.perf_counter() - started
+        )
+        if (
+            response.status_code in RETRYABLE_STATUS_CODES
+            or response.status_code >= 500
+        ):
+            self._record_failure()
+            return False
+        self._record_success()
+        return True
+
+    def _record_success(self) -> None:
+        state = self.breaker.state
+        self.breaker.record_success()
+        self.stats.circuit_state = self.breaker.state
+        if state != CLOSED:
+            logger.info(
+                "Remote write endpoint %s recovered, circuit breaker closed", self.name
+            )
+
+    def _record_failure(self, timeout: bool = False) -> None:
+        state = self.breaker.state
+        self.breaker.record_failure(timeout)
+        self.stats.circuit_state = self.breaker.state
+        if state != OPEN and self.breaker.state == OPEN:
+            logger.warning(
+                "Remote write endpoint %s is failing, circuit breaker opened for %ss",
+                self.name,
+                self.breaker.reset_timeout,
+            )
+
+    def _build_headers(self, protocol_version: str) -> Dict:
+        if protocol_version == REMOTE_WRITE_VERSION_2:
+            headers = {
+                "Content-Encoding": self.codec.content_encoding,
+                "Content-Type": CONTENT_TYPE_V2,
+                "X-Prometheus-Remote-Write-Version": "2.0.0",
+            }
+        else:
+            headers = {
+                "Content-Encoding": self.codec.content_encoding,
+                "Content-Type": CONTENT_TYPE_V1,
+                "X-Prometheus-Remote-Write-Version": "0.1.0",
+            }
+        if self.headers:
+            for header_name, header_value in self.headers.items():
+                headers[header_name] = header_value
+        return headers
+
+    def _post(self, message: bytes, headers: Dict) -> requests.Response:
+        auth = None
+        if self.basic_auth:
+            auth = (self.basic_auth["username"], self.basic_auth["password"])
+
+        cert = None
+        verify = True
+        if self.tls_config:
+            if "ca_file" in self.tls_config:
+                verify = self.tls_config["ca_file"]
+            elif "insecure_skip_verify" in self.tls_config:
+                verify = self.tls_config["insecure_skip_verify"]
+
+            if "cert_file" in self.tls_config and "key_file" in self.tls_config:
+                cert = (
+                    self.tls_config["cert_file"],
+                    self.tls_config["key_file"],
+                )
+        timeout = self.timeout
+        if self._deadline is not None:
+            # Shutting down: no request may outlast the shutdown deadline.
+            timeout = max(min(timeout, self._deadline - time.monotonic()), 0.001)
+        return self._session.post(
+            self.endpoint,
+            data=message,
+            headers=headers,
+            auth=auth,
+            timeout=timeout,
+            proxies=self.proxies,
+            cert=cert,
+            verify=verify,
+        )
@@ -0,0 +1,143 @@
+"""Protobuf wire encoder for remote write requests.
+
+Writes ``prometheus.WriteRequest`` (1.0) and ``io.prometheus.write.v2.Request``
+(2.0) messages straight into a reusable ``bytearray`` instead of building a
+generated message object per series, label and sample. The output is byte for
+byte what the generated classes in ``gen`` serialize.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Dict, Iterable, Sequence, Tuple
+
+LabelsType = Tuple[Tuple[str, str], ...]
+SampleType = Tuple[float, int]
+
+_pack_double = struct.Struct("<d").pack
+_ZERO_DOUBLE = bytes(8)
+
+# Field tags (field number << 3 | wire type) used by the remote write protos.
+_TAG_1_LEN = b"\x0a"  # WriteRequest.timeseries, TimeSeries.labels, Label.name
+_TAG_2_LEN = b"\x12"  # TimeSeries.samples, Label.value
+_TAG_4_LEN = b"\x22"  # Request.symbols
+_TAG_5_LEN = b"\x2a"  # Request.timeseries, TimeSeries.metadata
+_TAG_1_DOUBLE = b"\x09"  # Sample.value
+_TAG_1_VARINT = b"\x08"  # Metadata.type
+_TAG_2_VARINT = b"\x10"  # Sample.timestamp
+
+_SMALL_VARINTS = [bytes((value,)) for value in range(0x80)]
+
+
+def encode_varint(value: int) -> bytes:
+    """Encode an int as a protobuf varint, negative values as 64-bit two's complement."""
+    if 0 <= value < 0x80:
+        return _SMALL_VARINTS[value]
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _encode_string_field(tag: bytes, string: str) -> bytes:
+    data = string.encode("utf-8")
+    return tag + encode_varint(len(data)) + data
+
+
+def encode_label_block(labels: LabelsType) -> bytes:
+    """Encode the repeated ``TimeSeries.labels`` field of a 1.0 series."""
+    block = bytearray()
+    for name, value in labels:
+        label = bytearray()
+        if name:
+            label += _encode_string_field(_TAG_1_LEN, name)
+        if value:
+            label += _encode_string_field(_TAG_2_LEN, value)
+        block += _TAG_1_LEN
+        block += encode_varint(len(label))
+        block += label
+    return bytes(block)
+
+
+class WriteRequestEncoder:
+    """Encode remote write requests into a buffer that is reused between calls."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._series = bytearray()
+        self._last_timestamp: int | None = None
+        self._last_timestamp_field = b""
+
+    def _encode_samples(self, out: bytearray, samples: Iterable[SampleType]) -> None:
+        for value, timestamp in samples:
+            packed = _pack_double(float(value))
+            if timestamp != self._last_timestamp:
+                self._last_timestamp = timestamp
+                self._last_timestamp_field = (
+                    _TAG_2_VARINT + encode_varint(timestamp) if timestamp else b""
+                )
+            timestamp_field = self._last_timestamp_field
+            if packed == _ZERO_DOUBLE:
+                out += _TAG_2_LEN
+                out += encode_varint(len(timestamp_field))
+            else:
+                out += _TAG_2_LEN
+                out += encode_varint(9 + len(timestamp_field))
+                out += _TAG_1_DOUBLE
+                out += packed
+            out += timestamp_field
+
+    def encode_v1(self, series: Iterable[Tuple[bytes, Sequence[SampleType]]]) -> bytes:
+        """Encode ``(label_block, samples)`` pairs as a 1.0 ``WriteRequest``."""
+        buffer = self._buffer
+        scratch = self._series
+        del buffer[:]
+        for label_block, samples in series:
+            del scratch[:]
+            scratch += label_block
+            self._encode_samples(scratch, samples)
+            buffer += _TAG_1_LEN
+            buffer += encode_varint(len(scratch))
+            buffer += scratch
+        return bytes(buffer)
+
+    def encode_v2(
+        self, series: Iterable[Tuple[LabelsType, Sequence[SampleType], int]]
+    ) -> bytes:
+        """Encode ``(labels, samples, metric_type)`` tuples as a 2.0 ``Request``."""
+        buffer = self._buffer
+        scratch = self._series
+        symbols: Dict[str, int] = {"": 0}
+        timeseries = bytearray()
+        for labels, samples, metric_type in series:
+            del scratch[:]
+            if labels:
+                refs = bytearray()
+                for name, value in labels:
+                    for string in (name, value):
+                        ref = symbols.get(string)
+                        if ref is None:
+                            ref = symbols[string] = len(symbols)
+                        refs += encode_varint(ref)
+                scratch += _TAG_1_LEN
+                scratch += encode_varint(len(refs))
+                scratch += refs
+            self._encode_samples(scratch, samples)
+            metadata = (
+                _TAG_1_VARINT + encode_varint(metric_type) if metric_type else b""
+            )
+            scratch += _TAG_5_LEN
+            scratch += encode_varint(len(metadata))
+            scratch += metadata
+            timeseries += _TAG_5_LEN
+            timeseries += encode_varint(len(scratch))
+            timeseries += scratch
+        del buffer[:]
+        for symbol in symbols:
+            buffer += _encode_string_field(_TAG_4_LEN, symbol)
+        buffer += timeseries
+        return bytes(buffer)
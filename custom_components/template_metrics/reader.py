@@ -0,0 +1,49 @@
+"""Metric reader that exports when the coordinator asks it to."""
+
+from __future__ import annotations
+
+import logging
+import threading
+
+from opentelemetry.sdk.metrics.export import (
+    MetricExporter,
+    MetricReader,
+    MetricsData,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CoordinatorMetricReader(MetricReader):
+    """Collect and export on demand instead of on an independent timer.
+
+    The coordinator calls ``collect`` right after each successful render, so
+    every update cycle produces exactly one export of freshly rendered values.
+    """
+
+    def __init__(self, exporter: MetricExporter) -> None:
+        """Initialize."""
+        super().__init__(
+            preferred_temporality=exporter._preferred_temporality,
+            preferred_aggregation=exporter._preferred_aggregation,
+        )
+        self._exporter = exporter
+        self._export_lock = threading.Lock()
+
+    def _receive_metrics(
+        self,
+        metrics_data: MetricsData,
+        timeout_millis: float = 10_000,
+        **kwargs,
+    ) -> None:
+        if metrics_data is None:
+            return
+        with self._export_lock:
+            self._exporter.export(metrics_data, timeout_millis=timeout_millis)
+
+    def force_flush(self, timeout_millis: float = 10_000) -> bool:
+        super().force_flush(timeout_millis=timeout_millis)
+        return self._exporter.force_flush(timeout_millis=timeout_millis)
+
+    def shutdown(self, timeout_millis: float = 30_000, **kwargs) -> None:
+        self._exporter.shutdown(timeout_millis=timeout_millis)
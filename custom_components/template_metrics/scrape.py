@@ -0,0 +1,183 @@
+"""Prometheus and OpenMetrics scrape endpoint for template metrics."""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import zlib
+from http import HTTPStatus
+from itertools import chain
+from typing import Any, Mapping, Sequence, Tuple
+
+from aiohttp import web
+from homeassistant.components.http import HomeAssistantView
+
+from .coordinator import TemplateMetricsCoordinator
+from .prometheus_remote_write import PrometheusRemoteWriteMetricsExporter
+
+SCRAPE_URL = "/api/template_metrics/metrics"
+
+CONTENT_TYPE_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+CONTENT_TYPE_OPENMETRICS = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+SeriesType = Sequence[Tuple[Mapping[str, Any], float]]
+
+_sanitize_string = PrometheusRemoteWriteMetricsExporter._sanitize_string
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_value(value: Any) -> str | None:
+    """Render an attribute value as a label value, or None to leave it out.
+
+    Primitives are used as they are. Lists of primitives, which attribute
+    templates return as JSON, are rendered as their tuple repr; any other
+    value has no label representation and is skipped.
+    """
+    if isinstance(value, (str, bool, int, float)):
+        return str(value)
+    if isinstance(value, (list, tuple)) and all(
+        isinstance(item, (str, bool, int, float)) for item in value
+    ):
+        return str(tuple(value))
+    return None
+
+
+def render_chunks(
+    series: Mapping[str, SeriesType],
+    openmetrics: bool = False,
+    resource_attributes: Mapping[str, str] | None = None,
+) -> list[bytes]:
+    """Render coordinator series in the Prometheus text or OpenMetrics format.
+
+    The exposition is split between metric families into chunks of about
+    STREAM_CHUNK_SIZE bytes. Resource attributes are added to every series,
+    as the remote write exporter adds them.
+    """
+    resource = tuple((resource_attributes or {}).items())
+    chunks: list[bytes] = []
+    lines: list[str] = []
+    size = 0
+    for metric_name, metric_series in series.items():
+        name = _sanitize_string(metric_name, "name")
+        lines.append(f"# HELP {name} HA {metric_name}")
+        lines.append(f"# TYPE {name} gauge")
+        for attributes, value in metric_series:
+            labels = []
+            for label_name, raw_value in sorted(chain(resource, attributes.items())):
+                label_value = _label_value(raw_value)
+                if label_value is None:
+                    continue
+                labels.append(
+                    f'{_sanitize_string(label_name, "label")}="'
+                    f'{_escape_label_value(label_value)}"'
+                )
+            label_block = "{" + ",".join(labels) + "}" if labels else ""
+            line = f"{name}{label_block} {_format_value(value)}"
+            lines.append(line)
+            size += len(line)
+        if size >= STREAM_CHUNK_SIZE:
+            chunks.append(("\n".join(lines) + "\n").encode("utf-8"))
+            lines, size = [], 0
+    if openmetrics:
+        # An OpenMetrics exposition always ends with # EOF, even with no series.
+        lines.append("# EOF")
+    if lines:
+        chunks.append(("\n".join(lines) + "\n").encode("utf-8"))
+    return chunks
+
+
+def render_exposition(
+    series: Mapping[str, SeriesType],
+    openmetrics: bool = False,
+    resource_attributes: Mapping[str, str] | None = None,
+) -> bytes:
+    """Render coordinator series as one exposition body."""
+    return b"".join(render_chunks(series, openmetrics, resource_attributes))
+
+
+def _gzip_chunks(chunks: Sequence[bytes]) -> list[bytes]:
+    """Compress chunks into one gzip stream, keeping it in pieces."""
+    compressor = zlib.compressobj(wbits=31)
+    compressed = [compressor.compress(chunk) for chunk in chunks]
+    compressed.append(compressor.flush())
+    return [chunk for chunk in compressed if chunk]
+
+
+class TemplateMetricsScrapeView(HomeAssistantView):
+    """Serve the latest rendered template metrics to Prometheus scrapers.
+
+    The exposition is rendered at most once per format and coordinator cycle,
+    so concurrent scrapes between two updates only stream cached bytes. It is
+    kept and written in chunks, never joined into one body.
+    """
+
+    url = SCRAPE_URL
+    name = "api:template_metrics:metrics"
+    requires_auth = True
+
+    def __init__(
+        self,
+        coordinator: TemplateMetricsCoordinator,
+        resource_attributes: Mapping[str, str] | None = None,
+    ) -> None:
+        """Initialize."""
+        self.coordinator = coordinator
+        self.resource_attributes = resource_attributes
+        self._cache: dict[bool, tuple[Any, list[bytes], list[bytes] | None]] = {}
+        self._lock = asyncio.Lock()
+
+    async def _async_get_chunks(self, openmetrics: bool, use_gzip: bool) -> list[bytes]:
+        # Keyed on the data itself, which stays None until the first refresh.
+        data = self.coordinator.data
+        async with self._lock:
+            cached = self._cache.get(openmetrics)
+            if cached is None or cached[0] is not data:
+                chunks = await self.coordinator.hass.async_add_executor_job(
+                    render_chunks,
+                    (data or {}).get("series", {}),
+                    openmetrics,
+                    self.resource_attributes,
+                )
+                cached = self._cache[openmetrics] = (data, chunks, None)
+            if not use_gzip:
+                return cached[1]
+            if cached[2] is None:
+                compressed = await self.coordinator.hass.async_add_executor_job(
+                    _gzip_chunks, cached[1]
+                )
+                cached = self._cache[openmetrics] = (data, cached[1], compressed)
+            return cached[2]
+
+    async def get(self, request: web.Request) -> web.StreamResponse:
+        """Return the current exposition."""
+        openmetrics = "application/openmetrics-text" in request.headers.get(
+            "Accept", ""
+        )
+        use_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+        chunks = await self._async_get_chunks(openmetrics, use_gzip)
+
+        response = web.StreamResponse(status=HTTPStatus.OK)
+        response.headers["Content-Type"] = (
+            CONTENT_TYPE_OPENMETRICS if openmetrics else CONTENT_TYPE_PROMETHEUS
+        )
+        if use_gzip:
+            response.headers["Content-Encoding"] = "gzip"
+        response.content_length = sum(len(chunk) for chunk in chunks)
+        await response.prepare(request)
+        for chunk in chunks:
+            await response.write(chunk)
+        await response.write_eof()
+        return response
@@ -0,0 +1,201 @@
+"""Diagnostic sensors describing the remote write exporter."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Callable
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.const import EntityCategory, UnitOfInformation, UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import slugify
+
+from . import TemplateMetricsCoordinator
+from .const import COORDINATOR, DOMAIN, EXPORT_STATS
+
+if TYPE_CHECKING:
+    from .prometheus_remote_write.stats import ExportStats, TargetStats
+
+
+@dataclass(frozen=True, kw_only=True)
+class TemplateMetricsSensorDescription(SensorEntityDescription):
+    """Describe a sensor reading a value from the export statistics."""
+
+    value_fn: Callable[[Any], Any]
+    attributes_fn: Callable[[Any], dict[str, Any]] | None = None
+
+
+def _milliseconds(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def _timestamp(epoch: float | None) -> datetime | None:
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, tz=timezone.utc)
+
+
+EXPORT_SENSORS: tuple[TemplateMetricsSensorDescription, ...] = (
+    TemplateMetricsSensorDescription(
+        key="exported_series",
+        name="Exported series",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: stats.last_series,
+    ),
+    TemplateMetricsSensorDescription(
+        key="exported_samples",
+        name="Exported samples",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: stats.last_samples,
+    ),
+    TemplateMetricsSensorDescription(
+        key="payload_size",
+        name="Payload size",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: stats.last_uncompressed_bytes,
+    ),
+    TemplateMetricsSensorDescription(
+        key="compressed_payload_size",
+        name="Compressed payload size",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: stats.last_compressed_bytes,
+    ),
+    TemplateMetricsSensorDescription(
+        key="translate_duration",
+        name="Translate duration",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: _milliseconds(stats.translate_latency.last),
+        attributes_fn=lambda stats: {
+            "mean_ms": _milliseconds(stats.translate_latency.mean)
+        },
+    ),
+    TemplateMetricsSensorDescription(
+        key="serialize_duration",
+        name="Serialize duration",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: _milliseconds(stats.serialize_latency.last),
+        attributes_fn=lambda stats: {
+            "mean_ms": _milliseconds(stats.serialize_latency.mean)
+        },
+    ),
+    TemplateMetricsSensorDescription(
+        key="compress_duration",
+        name="Compress duration",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: _milliseconds(stats.compress_latency.last),
+        attributes_fn=lambda stats: {
+            "mean_ms": _milliseconds(stats.compress_latency.mean)
+        },
+    ),
+)
+
+TARGET_SENSORS: tuple[TemplateMetricsSensorDescription, ...] = (
+    TemplateMetricsSensorDescription(
+        key="last_success",
+        name="last success",
+        device_class=SensorDeviceClass.TIMESTAMP,
+        value_fn=lambda target: _timestamp(target.last_success),
+    ),
+    TemplateMetricsSensorDescription(
+        key="request_duration",
+        name="request duration",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda target: _milliseconds(target.http_latency.last),
+        attributes_fn=lambda target: {
+            "mean_ms": _milliseconds(target.http_latency.mean),
+            "responses": dict(target.responses),
+            "dropped_batches": target.dropped_batches,
+        },
+    ),
+)
+
+
+async def async_setup_platform(
+    hass: HomeAssistant,
+    config: ConfigType,
+    async_add_entities: AddEntitiesCallback,
+    discovery_info: DiscoveryInfoType | None = None,
+) -> None:
+    """Set up the sensor platform."""
+
+    if discovery_info is None:
+        return
+
+    coordinator: TemplateMetricsCoordinator = hass.data[DOMAIN][COORDINATOR]
+    stats: ExportStats = hass.data[DOMAIN][EXPORT_STATS]
+
+    entities = [
+        TemplateMetricsStatsSensor(coordinator, stats, description, description.key)
+        for description in EXPORT_SENSORS
+    ]
+    for target in stats.targets:
+        entities.extend(
+            TemplateMetricsStatsSensor(
+                coordinator,
+                target,
+                replace(description, name=f"{target.name} {description.name}"),
+                f"{slugify(target.name)}_{description.key}",
+            )
+            for description in TARGET_SENSORS
+        )
+    async_add_entities(entities)
+
+
+class TemplateMetricsStatsSensor(CoordinatorEntity, SensorEntity):
+    """Diagnostic sensor for a value of the export statistics."""
+
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    entity_description: TemplateMetricsSensorDescription
+
+    def __init__(
+        self,
+        coordinator: TemplateMetricsCoordinator,
+        stats: ExportStats | TargetStats,
+        description: TemplateMetricsSensorDescription,
+        key: str,
+    ):
+        """Initialize."""
+        super().__init__(coordinator)
+        self.entity_description = description
+        self._stats = stats
+        self._attr_name = f"Template Metrics {description.name}"
+        self._attr_unique_id = f"{DOMAIN}_{key}"
+
+    @property
+    def native_value(self) -> Any:
+        """Return the current value of the statistic."""
+        return self.entity_description.value_fn(self._stats)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return related statistics."""
+        if self.entity_description.attributes_fn is None:
+            return None
+        return self.entity_description.attributes_fn(self._stats)
+
+    @property
+    def available(self) -> bool:
+        """Statistics are available regardless of the last render."""
+        return True
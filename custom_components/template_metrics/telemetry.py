@@ -0,0 +1,266 @@
+"""Build the meter provider and remote write exporter.
+
+This module imports the OpenTelemetry SDK, requests, snappy and the generated
+protobuf modules. It is only imported from an executor job once the
+integration is actually set up, which keeps those imports off Home Assistant's
+startup path.
+"""
+
+from __future__ import annotations
+
+import base64
+import math
+from typing import Any, Dict, List, NamedTuple
+from urllib.parse import urlsplit
+
+from opentelemetry import metrics
+from opentelemetry.sdk.metrics import Meter, MeterProvider
+from opentelemetry.sdk.metrics.export import (
+    MetricReader,
+    PeriodicExportingMetricReader,
+)
+from opentelemetry.sdk.resources import Resource
+
+from .const import (
+    BACKEND,
+    BACKEND_DIRECT,
+    COMPRESSION,
+    EXPORT_MODE,
+    EXPORT_MODE_COORDINATOR,
+    EXPORT_MODE_PERIODIC,
+    FAILURE_THRESHOLD,
+    FILE_SINK,
+    FILE_SINK_PATH,
+    FSYNC_INTERVAL,
+    HEARTBEAT,
+    INSTANCE_LABEL,
+    MAX_FILE_AGE,
+    MAX_FILE_SIZE,
+    MAX_RETRIES,
+    MAX_TOTAL_SIZE,
+    METRIC_LABEL_INSTANCE,
+    QUEUE_SIZE,
+    REMOTE_WRITE,
+    REMOTE_WRITE_URL,
+    REMOTE_WRITE_VERSION,
+    REMOTE_WRITE_VERSION_1,
+    RENDER_INTERVAL,
+    RESET_TIMEOUT,
+    RESOURCE_ATTRIBUTES,
+    SELF_METRICS,
+    SEND_ON_CHANGE,
+    TARGET_URL,
+    TIMEOUT,
+    TOKEN,
+    UPDATE_INTERVAL,
+    USER,
+    WRITE_RELABEL_CONFIGS,
+)
+from .prometheus_remote_write import (
+    FileSink,
+    PrometheusRemoteWriteMetricsExporter,
+    Relabeler,
+    RemoteWriteTarget,
+    SampleBuffer,
+    SeriesStore,
+)
+from .prometheus_remote_write.stats import ExportStats
+from .direct import (
+    DirectMeterProvider,
+    PeriodicStoreReader,
+    StoreMeter,
+    StoreReader,
+)
+from .reader import CoordinatorMetricReader
+
+
+class Telemetry(NamedTuple):
+    """The meter provider and what the coordinator needs from the export side."""
+
+    provider: MeterProvider | DirectMeterProvider
+    meter: Meter | StoreMeter
+    reader: MetricReader | StoreReader | None = None
+    sample_buffer: SampleBuffer | None = None
+    stats: ExportStats | None = None
+    series_store: SeriesStore | None = None
+    exporter: PrometheusRemoteWriteMetricsExporter | None = None
+    file_sink: FileSink | None = None
+
+
+def _build_targets(config_data: Dict[str, Any]) -> list[RemoteWriteTarget]:
+    """Create a remote write target per configured endpoint.
+
+    The top-level remote_write_url, user and token describe the first target;
+    remote_write entries add more. Top-level protocol version and compression
+    are the defaults for every target.
+    """
+    target_configs = list(config_data.get(REMOTE_WRITE, []))
+    if config_data.get(REMOTE_WRITE_URL):
+        target_configs.insert(
+            0,
+            {
+                TARGET_URL: config_data[REMOTE_WRITE_URL],
+                USER: config_data.get(USER),
+                TOKEN: config_data.get(TOKEN),
+            },
+        )
+
+    names = _target_names(
+        [target_config[TARGET_URL] for target_config in target_configs]
+    )
+    targets = []
+    for name, target_config in zip(names, target_configs):
+        headers = None
+        if target_config.get(USER):
+            credentials = f"{target_config[USER]}:{target_config[TOKEN]}"
+            headers = {
+                "Authorization": f"Basic {base64.b64encode(credentials.encode()).decode()}"
+            }
+        targets.append(
+            RemoteWriteTarget(
+                endpoint=target_config[TARGET_URL],
+                headers=headers,
+                timeout=target_config.get(TIMEOUT, 30),
+                protocol_version=target_config.get(
+                    REMOTE_WRITE_VERSION,
+                    config_data.get(REMOTE_WRITE_VERSION, REMOTE_WRITE_VERSION_1),
+                ),
+                compression=target_config.get(
+                    COMPRESSION, config_data.get(COMPRESSION, "snappy")
+                ),
+                max_queue_size=target_config.get(QUEUE_SIZE, 10),
+                max_retries=target_config.get(MAX_RETRIES, 3),
+                failure_threshold=target_config.get(FAILURE_THRESHOLD, 5),
+                reset_timeout=target_config.get(RESET_TIMEOUT, 60),
+                name=name,
+            )
+        )
+    return targets
+
+
+def _target_names(urls: List[str]) -> List[str]:
+    """
+    Name targets by host, which names their entities and self-metrics.
+
+    Targets sharing a host are named by host and path instead, and any that
+    still collide get a number.
+    """
+    hosts = [urlsplit(url).netloc or url for url in urls]
+    names = [
+        f"{host}{urlsplit(url).path}" if hosts.count(host) > 1 else host
+        for host, url in zip(hosts, urls)
+    ]
+    unique: List[str] = []
+    for name in names:
+        candidate, number = name, 1
+        while candidate in unique:
+            number += 1
+            candidate = f"{name} {number}"
+        unique.append(candidate)
+    return unique
+
+
+def _build_file_sink(config_data: Dict[str, Any]) -> FileSink | None:
+    """Create the file sink, writing the same wire format as the targets."""
+    sink_config = config_data.get(FILE_SINK)
+    if not sink_config:
+        return None
+    mebibyte = 1024 * 1024
+    return FileSink(
+        sink_config[FILE_SINK_PATH],
+        protocol_version=config_data.get(REMOTE_WRITE_VERSION, REMOTE_WRITE_VERSION_1),
+        compression=config_data.get(COMPRESSION, "snappy"),
+        max_file_bytes=sink_config.get(MAX_FILE_SIZE, 16) * mebibyte,
+        max_file_age=sink_config.get(MAX_FILE_AGE, 3600),
+        max_total_bytes=sink_config.get(MAX_TOTAL_SIZE, 512) * mebibyte,
+        fsync_interval=sink_config.get(FSYNC_INTERVAL, 60),
+    )
+
+
+def setup_telemetry(config_data: Dict[str, Any]) -> Telemetry:
+    """Create the exporter for the configured targets and the meter provider.
+
+    The direct backend replaces the OpenTelemetry meter provider, its readers
+    and their MetricsData with a SeriesStore the exporter reads from.
+    """
+    resource_attributes = dict(RESOURCE_ATTRIBUTES)
+    direct = config_data.get(BACKEND) == BACKEND_DIRECT
+    store = SeriesStore(resource_attributes) if direct else None
+
+    metric_readers = []
+    exporter = reader = sample_buffer = stats = None
+    targets: list[RemoteWriteTarget | FileSink] = _build_targets(config_data)
+    file_sink = _build_file_sink(config_data)
+    if file_sink is not None:
+        targets.append(file_sink)
+    if targets:
+        export_mode = config_data.get(EXPORT_MODE, EXPORT_MODE_PERIODIC)
+        if config_data.get(RENDER_INTERVAL) and export_mode == EXPORT_MODE_PERIODIC:
+            # Keep every render between two exports, plus one for timer drift.
+            sample_buffer = SampleBuffer(
+                max_samples=math.ceil(
+                    config_data.get(UPDATE_INTERVAL, 60) / config_data[RENDER_INTERVAL]
+                )
+                + 1
+            )
+        stats = ExportStats([target.stats for target in targets])
+        self_metrics_attributes = {}
+        if config_data.get(INSTANCE_LABEL):
+            self_metrics_attributes[METRIC_LABEL_INSTANCE] = config_data[INSTANCE_LABEL]
+        exporter = PrometheusRemoteWriteMetricsExporter(
+            targets=targets,
+            send_on_change=config_data.get(SEND_ON_CHANGE, False),
+            heartbeat=config_data.get(HEARTBEAT, 240),
+            sample_buffer=sample_buffer,
+            stats=stats,
+            self_metrics=config_data.get(SELF_METRICS, False),
+            self_metrics_attributes=self_metrics_attributes,
+            resource_attributes=resource_attributes,
+            relabeler=Relabeler.from_config(config_data.get(WRITE_RELABEL_CONFIGS, [])),
+        )
+        export_interval_millis = 1000 * config_data.get(UPDATE_INTERVAL, 60)
+        if export_mode == EXPORT_MODE_COORDINATOR:
+            # Export right after each render instead of on a separate timer.
+            if direct:
+                reader = StoreReader(exporter, store)
+            else:
+                reader = CoordinatorMetricReader(exporter)
+            metric_readers.append(reader)
+        elif direct:
+            metric_readers.append(
+                PeriodicStoreReader(
+                    exporter, store, export_interval_millis=export_interval_millis
+                )
+            )
+        else:
+            metric_readers.append(
+                PeriodicExportingMetricReader(
+                    exporter, export_interval_millis=export_interval_millis
+                )
+            )
+    if direct:
+        provider = DirectMeterProvider(store, metric_readers)
+        return Telemetry(
+            provider=provider,
+            meter=provider.get_meter("ha_metrics"),
+            reader=reader,
+            sample_buffer=sample_buffer,
+            stats=stats,
+            series_store=store,
+            exporter=exporter,
+            file_sink=file_sink,
+        )
+    provider = MeterProvider(
+        resource=Resource(attributes=resource_attributes),
+        metric_readers=metric_readers,
+    )
+    metrics.set_meter_provider(provider)
+    return Telemetry(
+        provider=provider,
+        meter=metrics.get_meter("ha_metrics"),
+        reader=reader,
+        sample_buffer=sample_buffer,
+        stats=stats,
+        exporter=exporter,
+        file_sink=file_sink,
+    )
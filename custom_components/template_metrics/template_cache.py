@@ -0,0 +1,114 @@
+"""Compiled template code kept across restarts."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import importlib.util
+import logging
+import marshal
+from typing import Dict
+
+import jinja2
+from homeassistant.const import __version__ as HA_VERSION
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.template import Template
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = f"{DOMAIN}.template_cache"
+STORAGE_VERSION = 1
+
+
+def _environment() -> str:
+    """What compiled code depends on besides the source.
+
+    Code objects only load in the Python they were marshalled by, and the code
+    Jinja generates depends on the Jinja and Home Assistant versions.
+    """
+    return "/".join((HA_VERSION, jinja2.__version__, importlib.util.MAGIC_NUMBER.hex()))
+
+
+def _digest(source: str) -> str:
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def _supports_code(template: Template) -> bool:
+    """Whether templates still keep their code in _compiled_code.
+
+    It is a Home Assistant internal; without it the cache does nothing and
+    templates are compiled as usual.
+    """
+    return hasattr(template, "_compiled_code")
+
+
+class TemplateCodeCache:
+    """Code objects of compiled templates, stored under .storage by source hash.
+
+    The whole cache is dropped when Home Assistant, Jinja or Python changes.
+    Saving keeps only the templates used since the cache was loaded, so
+    removed metrics do not accumulate.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store: Store[Dict[str, str]] = Store(
+            hass, STORAGE_VERSION, STORAGE_KEY, private=True
+        )
+        self._codes: Dict[str, str] = {}
+        self._used: set[str] = set()
+        self._changed = False
+
+    async def async_load(self) -> None:
+        data = await self._store.async_load()
+        if data and data.get("environment") == _environment():
+            self._codes = data["templates"]
+        elif data:
+            _LOGGER.debug("Template cache is from another version, recompiling")
+            self._changed = True
+
+    def apply(self, template: Template) -> bool:
+        """Give a template its cached code, so it is not compiled again."""
+        if (
+            template.is_static
+            or not _supports_code(template)
+            or template._compiled_code is not None
+        ):
+            return False
+        digest = _digest(template.template)
+        code = self._codes.get(digest)
+        if code is None:
+            return False
+        try:
+            template._compiled_code = marshal.loads(base64.b64decode(code))
+        except (EOFError, ValueError, TypeError):
+            del self._codes[digest]
+            self._changed = True
+            return False
+        self._used.add(digest)
+        return True
+
+    def add(self, template: Template) -> None:
+        """Remember the compiled code of a template."""
+        if getattr(template, "_compiled_code", None) is None:
+            return
+        digest = _digest(template.template)
+        self._used.add(digest)
+        if digest not in self._codes:
+            self._codes[digest] = base64.b64encode(
+                marshal.dumps(template._compiled_code)
+            ).decode()
+            self._changed = True
+
+    async def async_save(self) -> None:
+        unused = self._codes.keys() - self._used
+        if not unused and not self._changed:
+            return
+        for digest in unused:
+            del self._codes[digest]
+        await self._store.async_save(
+            {"environment": _environment(), "templates": self._codes}
+        )
+        self._changed = False
@@ -6,6 +6,8 @@ import pytest
 
 from custom_components.template_metrics.const import DOMAIN
 
+from .receiver import RemoteWriteReceiver
+
 
 if "HA_CLONE" in os.environ:
     # Rewire the testing package to the cloned test modules
@@ -47,9 +49,19 @@ def mock_opentelemetry(mocker):
     mock_meter = mocker.patch("opentelemetry.metrics.get_meter")
     mock_gauge = mocker.MagicMock()
     mocker.patch(
-        "custom_components.template_metrics.PrometheusRemoteWriteMetricsExporter"
+        "custom_components.template_metrics.telemetry.PrometheusRemoteWriteMetricsExporter"
+    )
+    mocker.patch(
+        "custom_components.template_metrics.telemetry.PeriodicExportingMetricReader"
     )
-    mocker.patch("custom_components.template_metrics.PeriodicExportingMetricReader")
 
     mock_meter.return_value.create_gauge.return_value = mock_gauge
     return mock_gauge
+
+
+@pytest.fixture
+def remote_write_receiver(socket_enabled):  # pylint: disable=unused-argument
+    """Run a local remote write receiver for the duration of a test."""
+    receiver = RemoteWriteReceiver().start()
+    yield receiver
+    receiver.stop()
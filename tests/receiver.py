@@ -0,0 +1,239 @@
+"""Local stand-in for a Prometheus remote write receiver."""
+
+from __future__ import annotations
+
+import gzip
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Tuple
+
+import snappy
+
+from custom_components.template_metrics.prometheus_remote_write.gen.remote_pb2 import (
+    WriteRequest,
+)
+from custom_components.template_metrics.prometheus_remote_write.gen.write_v2_pb2 import (
+    Request,
+)
+from custom_components.template_metrics.prometheus_remote_write.target import (
+    CONTENT_TYPE_V2,
+    SAMPLES_WRITTEN_HEADER,
+)
+
+DROP = "drop"
+
+
+@dataclass
+class ReceivedSeries:
+    """A series as the receiver decoded it."""
+
+    labels: Dict[str, str]
+    samples: list[Tuple[float, int]]
+
+    @property
+    def name(self) -> str:
+        return self.labels.get("__name__", "")
+
+
+@dataclass
+class ReceivedRequest:
+    """A successfully decoded remote write request."""
+
+    headers: Dict[str, str]
+    body_size: int
+    series: list[ReceivedSeries] = field(default_factory=list)
+
+
+def _decompress(body: bytes, content_encoding: str) -> bytes:
+    if content_encoding == "snappy":
+        return snappy.decompress(body)
+    if content_encoding == "x-snappy-framed":
+        return snappy.StreamDecompressor().decompress(body)
+    if content_encoding == "gzip":
+        return gzip.decompress(body)
+    if content_encoding == "zstd":
+        import zstandard  # pylint: disable=import-outside-toplevel
+
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise ValueError(f"unsupported Content-Encoding {content_encoding}")
+
+
+def decode_request(
+    body: bytes, content_type: str, content_encoding: str
+) -> list[ReceivedSeries]:
+    """Decode a remote write 1.0 or 2.0 request body into its series."""
+    payload = _decompress(body, content_encoding)
+    if content_type == CONTENT_TYPE_V2:
+        request = Request()
+        request.ParseFromString(payload)
+        symbols = request.symbols
+        return [
+            ReceivedSeries(
+                {
+                    symbols[ref]: symbols[value_ref]
+                    for ref, value_ref in zip(
+                        timeseries.labels_refs[::2], timeseries.labels_refs[1::2]
+                    )
+                },
+                [(sample.value, sample.timestamp) for sample in timeseries.samples],
+            )
+            for timeseries in request.timeseries
+        ]
+    write_request = WriteRequest()
+    write_request.ParseFromString(payload)
+    return [
+        ReceivedSeries(
+            {label.name: label.value for label in timeseries.labels},
+            [(sample.value, sample.timestamp) for sample in timeseries.samples],
+        )
+        for timeseries in write_request.timeseries
+    ]
+
+
+class RemoteWriteReceiver:
+    """Threaded HTTP receiver on 127.0.0.1 that records what it was sent.
+
+    Queue faults with fail() to answer the next requests with a status code, or
+    with DROP to close the connection without answering, and set latency to
+    delay every answer. Requests that end in a fault are counted in attempts but
+    not stored.
+    """
+
+    def __init__(self, v2: bool = True) -> None:
+        self.v2 = v2
+        self.latency = 0.0
+        self.requests: list[ReceivedRequest] = []
+        self.attempts = 0
+        self._faults: Deque[Tuple[int | str, Dict[str, str]]] = deque()
+        self._condition = threading.Condition()
+        self._connections: set[socket.socket] = set()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        # Join request threads on stop so no handler outlives the test.
+        self._server.daemon_threads = False
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            name="RemoteWriteReceiver",
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/write"
+
+    def start(self) -> RemoteWriteReceiver:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        with self._condition:
+            # Close idle keep-alive connections so their handler threads end.
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        self._server.server_close()
+        self._thread.join()
+
+    def fail(self, *faults: int | str, headers: Dict[str, str] | None = None) -> None:
+        """Answer the next requests with these status codes or DROP."""
+        with self._condition:
+            self._faults.extend((fault, headers or {}) for fault in faults)
+
+    def wait_for_requests(self, count: int, timeout: float = 5.0) -> bool:
+        """Wait until count requests were stored."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: len(self.requests) >= count, timeout
+            )
+
+    @property
+    def series(self) -> list[ReceivedSeries]:
+        with self._condition:
+            return [series for request in self.requests for series in request.series]
+
+    def samples(self, name: str, **labels: str) -> list[Tuple[float, int]]:
+        """Return every received sample of the series matching name and labels."""
+        return [
+            sample
+            for series in self.series
+            if series.name == name
+            and all(series.labels.get(key) == value for key, value in labels.items())
+            for sample in series.samples
+        ]
+
+    def assert_received(self, name: str, value: float, **labels: str) -> None:
+        values = [sample_value for sample_value, _ in self.samples(name, **labels)]
+        assert value in values, f"{name}{labels} received {values}, not {value}"
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        body = handler.rfile.read(int(handler.headers.get("Content-Length", 0)))
+        with self._condition:
+            self.attempts += 1
+            fault = self._faults.popleft() if self._faults else None
+        if self.latency:
+            time.sleep(self.latency)
+        if fault is not None:
+            status, headers = fault
+            if status == DROP:
+                handler.close_connection = True
+                handler.connection.shutdown(socket.SHUT_RDWR)
+                return
+            handler.send_response(status)
+            for name, value in headers.items():
+                handler.send_header(name, value)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        content_type = handler.headers.get("Content-Type", "")
+        if content_type == CONTENT_TYPE_V2 and not self.v2:
+            handler.send_response(415)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        series = decode_request(
+            body, content_type, handler.headers.get("Content-Encoding", "")
+        )
+        with self._condition:
+            self.requests.append(
+                ReceivedRequest(dict(handler.headers.items()), len(body), series)
+            )
+            self._condition.notify_all()
+        handler.send_response(204)
+        if content_type == CONTENT_TYPE_V2:
+            handler.send_header(
+                SAMPLES_WRITTEN_HEADER, str(sum(len(item.samples) for item in series))
+            )
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                with receiver._condition:
+                    receiver._connections.add(self.connection)
+
+            def finish(self) -> None:
+                with receiver._condition:
+                    receiver._connections.discard(self.connection)
+                super().finish()
+
+            def do_POST(self) -> None:  # noqa: N802
+                receiver._handle(self)
+
+            def log_message(self, format, *args) -> None:  # noqa: A002
+                return
+
+        return Handler
@@ -117,3 +117,24 @@ async def test_binary_sensor_recovers_after_failure(
 
     state = hass.states.get("binary_sensor.template_metrics_connection")
     assert state.state == "on"
+
+
+async def test_binary_sensor_circuit_breaker(
+    hass: HomeAssistant, mock_config, mock_opentelemetry
+):
+    """The connection is off while a target's circuit breaker is open."""
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+
+    state = hass.states.get("binary_sensor.template_metrics_connection")
+    assert state.attributes["circuit_breakers"] == {"prometheus.example.com": "closed"}
+
+    hass.data[DOMAIN]["export_stats"].targets[0].circuit_state = "open"
+    hass.data[DOMAIN]["coordinator"].async_update_listeners()
+    await hass.async_block_till_done()
+
+    state = hass.states.get("binary_sensor.template_metrics_connection")
+    assert state.state == "off"
+    assert state.attributes["circuit_breakers"] == {"prometheus.example.com": "open"}
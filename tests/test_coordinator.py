@@ -1,12 +1,21 @@
 """Tests for Home Assistant Metrics Coordinator."""
 
+import copy
+from datetime import timedelta
+
 import pytest
 
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.template import Template
 from homeassistant.helpers.update_coordinator import UpdateFailed
 from homeassistant.setup import async_setup_component
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
 
+from custom_components.template_metrics import CONFIG_SCHEMA
 from custom_components.template_metrics.const import DOMAIN
+from custom_components.template_metrics.cost import classify
+from custom_components.template_metrics.template_cache import TemplateCodeCache
 
 
 async def test_coordinator_update(hass: HomeAssistant, mock_config, mock_opentelemetry):
@@ -201,3 +210,372 @@ async def test_invalid_jinja_template(
     hass.states.async_set("sensor.temp", "20.0")
     assert not await async_setup_component(hass, DOMAIN, mock_config)
     await hass.async_block_till_done()
+
+
+async def test_coordinator_export_mode(
+    hass: HomeAssistant, mock_config, mocker, mock_opentelemetry
+):
+    """In coordinator mode every successful render triggers exactly one export."""
+    reader = mocker.patch(
+        "custom_components.template_metrics.telemetry.CoordinatorMetricReader"
+    ).return_value
+    mocker.patch("custom_components.template_metrics.telemetry.MeterProvider")
+    mock_config[DOMAIN]["export_mode"] = "coordinator"
+
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    assert reader.collect.call_count == 1
+
+    coordinator = hass.data[DOMAIN]["coordinator"]
+    await coordinator.async_refresh()
+    assert reader.collect.call_count == 2
+
+    hass.states.async_set("sensor.temp", "unknown")
+    await coordinator.async_refresh()
+    assert not coordinator.last_update_success
+    assert reader.collect.call_count == 2
+
+
+async def test_coordinator_render_interval_buffers_samples(
+    hass: HomeAssistant, mock_config, mock_opentelemetry
+):
+    """Renders between two exports are buffered with their render time."""
+    mock_config[DOMAIN]["update_interval"] = 60
+    mock_config[DOMAIN]["render_interval"] = 15
+
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+
+    coordinator = hass.data[DOMAIN]["coordinator"]
+    assert coordinator.update_interval.total_seconds() == 15
+    hass.states.async_set("sensor.temp", "30.0")
+    await coordinator.async_refresh()
+
+    sample_buffer = hass.data[DOMAIN]["sample_buffer"]
+    assert sample_buffer.max_samples == 5
+    samples = sample_buffer.drain()["ha_temperature_adjusted"][
+        (("instance", "test-instance"),)
+    ]
+    assert [value for value, _ in samples] == pytest.approx([24.0, 35.0])
+    assert samples[0][1] <= samples[1][1]
+
+
+async def test_slowest_templates_service(
+    hass: HomeAssistant, mock_config, mock_opentelemetry, caplog
+):
+    """Render times are profiled per template and reported slowest first."""
+    mock_config[DOMAIN]["render_budget_ms"] = 0.000001
+    mock_config[DOMAIN]["metrics"][0]["attributes"] = {"unit": "{{ 'C' }}"}
+    mock_config[DOMAIN]["metrics"].append(
+        {
+            "name": "battery quantities",
+            "template": '{{ [{"value": 3, "attributes": {"type": "AA"}}, {"value": 5, "attributes": {"type": "AAA"}}] | tojson }}',
+        }
+    )
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    await hass.data[DOMAIN]["coordinator"].async_refresh()
+
+    response = await hass.services.async_call(
+        DOMAIN, "slowest_templates", {"top": 3}, blocking=True, return_response=True
+    )
+
+    templates = {item["template"]: item for item in response["templates"]}
+    assert set(templates) == {
+        "ha_temperature_adjusted",
+        "ha_temperature_adjusted.attributes.unit",
+        "battery quantities",
+    }
+    assert templates["battery quantities"]["series"] == 2
+    assert templates["battery quantities"]["renders"] == 2
+    assert templates["ha_temperature_adjusted.attributes.unit"]["output_size"] == 1
+    p95 = [item["p95_ms"] for item in response["templates"]]
+    assert p95 == sorted(p95, reverse=True)
+    assert "over the 0.0 ms budget" in caplog.text
+
+
+async def test_reload_service(hass: HomeAssistant, mock_config, mocker, caplog):
+    """Reloading recompiles only changed metrics and keeps the pipeline."""
+    exporter = mocker.patch(
+        "custom_components.template_metrics.telemetry.PrometheusRemoteWriteMetricsExporter"
+    )
+    mocker.patch("custom_components.template_metrics.telemetry.MeterProvider")
+    mocker.patch(
+        "custom_components.template_metrics.telemetry.PeriodicExportingMetricReader"
+    )
+    mocker.patch("opentelemetry.metrics.set_meter_provider")
+    mocker.patch("opentelemetry.metrics.get_meter")
+    mock_config[DOMAIN]["metrics"].append(
+        {"name": "ha_humidity", "template": "{{ 40 }}"}
+    )
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN]["coordinator"]
+    unchanged = coordinator._templates["ha_temperature_adjusted"][1]
+
+    new_config = copy.deepcopy(mock_config)
+    new_config[DOMAIN]["update_interval"] = 30
+    new_config[DOMAIN]["metrics"] = [
+        mock_config[DOMAIN]["metrics"][0],
+        {"name": "ha_pressure", "template": "{{ 1013 }}"},
+    ]
+    mocker.patch(
+        "custom_components.template_metrics.async_integration_yaml_config",
+        return_value=CONFIG_SCHEMA(new_config),
+    )
+    response = await hass.services.async_call(
+        DOMAIN, "reload", blocking=True, return_response=True
+    )
+
+    assert response == {
+        "added": ["ha_pressure"],
+        "changed": [],
+        "removed": ["ha_humidity"],
+        "invalid": {},
+        "restart_required": ["update_interval"],
+    }
+    assert coordinator._templates["ha_temperature_adjusted"][1] is unchanged
+    assert "ha_humidity" not in coordinator._templates
+    assert coordinator.data["data"] == {
+        "ha_temperature_adjusted": pytest.approx(24.0),
+        "ha_pressure": 1013.0,
+    }
+    assert {item["template"] for item in coordinator.profiler.report()} == {
+        "ha_temperature_adjusted",
+        "ha_pressure",
+    }
+    assert exporter.call_count == 1
+    assert "Changes to update_interval take effect after a restart" in caplog.text
+
+
+@pytest.mark.parametrize(
+    ("source", "cost"),
+    [
+        ("{{ states('sensor.temp') | float }}", "entity"),
+        ("{{ states.sensor.temp.state }}", "entity"),
+        (
+            "{{ states.sensor | selectattr('state', 'eq', 'on') | list | count }}",
+            "domain",
+        ),
+        ("{{ area_entities('kitchen') | count }}", "domain"),
+        ("{{ states | count }}", "all_states"),
+        ("{% for state in states %}{{ state.entity_id }}{% endfor %}", "all_states"),
+        ("{{ integration_entities('hue') | expand | count }}", "all_states"),
+    ],
+)
+def test_template_cost_classes(source, cost):
+    """Templates are classified by the most expensive state access they make."""
+    assert classify(source) == cost
+
+
+async def test_expensive_metrics_are_rate_limited(
+    hass: HomeAssistant, mock_config, mock_opentelemetry
+):
+    """A full-state metric reuses its last value until its min interval passed."""
+    mock_config[DOMAIN]["metrics"].append(
+        {
+            "name": "ha_state_count",
+            "template": "{{ states | selectattr('entity_id', 'eq', 'sensor.other') "
+            "| list | count }}",
+        }
+    )
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN]["coordinator"]
+    assert coordinator.costs == {
+        "ha_temperature_adjusted": "entity",
+        "ha_state_count": "all_states",
+    }
+
+    hass.states.async_set("sensor.other", "1")
+    hass.states.async_set("sensor.temp", "30.0")
+    data = await coordinator._async_update_data()
+    assert data["data"] == {"ha_temperature_adjusted": 35.0, "ha_state_count": 0.0}
+
+    rendered_at, series, multi_series = coordinator._last_renders["ha_state_count"]
+    coordinator._last_renders["ha_state_count"] = (
+        rendered_at - 300,
+        series,
+        multi_series,
+    )
+    data = await coordinator._async_update_data()
+    assert data["data"]["ha_state_count"] == 1.0
+
+    response = await hass.services.async_call(
+        DOMAIN, "slowest_templates", {"top": 2}, blocking=True, return_response=True
+    )
+    templates = {item["template"]: item for item in response["templates"]}
+    assert templates["ha_state_count"]["cost"] == "all_states"
+    assert templates["ha_state_count"]["min_interval"] == 300
+    assert templates["ha_state_count"]["renders"] == 2
+    assert templates["ha_temperature_adjusted"]["min_interval"] == 0
+
+
+async def test_min_interval_over_refresh_cycles(
+    hass: HomeAssistant, mock_config, mock_opentelemetry, freezer
+):
+    """Metrics render once per min_interval over real refresh cycles."""
+    mock_config[DOMAIN]["metrics"] += [
+        {"name": "ha_sensor_count", "template": "{{ states.sensor | count }}"},
+        {"name": "ha_state_count", "template": "{{ states | count }}"},
+    ]
+    # Refreshes are scheduled on whole seconds, start just past one.
+    started = dt_util.parse_datetime("2026-01-01T00:00:00.1+00:00")
+    freezer.move_to(started)
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN]["coordinator"]
+    record_render = coordinator._record_render
+
+    def slow_record_render(*args):
+        # Renders take time, so each one is stamped after its cycle started.
+        freezer.tick(0.05)
+        record_render(*args)
+
+    coordinator._record_render = slow_record_render
+
+    # Cycles start every 60 seconds however long the renders took.
+    for cycle in range(1, 11):
+        freezer.move_to(started + timedelta(seconds=60 * cycle))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+
+    renders = {
+        item["template"]: item["renders"] for item in coordinator.template_report(10)
+    }
+    # The first render at setup, then one per 60 and 300 seconds.
+    assert renders["ha_temperature_adjusted"] == 11
+    assert renders["ha_sensor_count"] == 11
+    assert renders["ha_state_count"] == 3
+
+
+async def test_adaptive_interval(hass: HomeAssistant, mock_config, mock_opentelemetry):
+    """Unchanged metrics back off and snap back when an entity they read changes."""
+    mock_config[DOMAIN]["adaptive_interval"] = {
+        "unchanged_renders": 2,
+        "max_interval": 240,
+    }
+    mock_config[DOMAIN]["metrics"].append(
+        {"name": "ha_humidity", "template": "{{ states('sensor.humidity') }}"}
+    )
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    hass.states.async_set("sensor.humidity", "40")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN]["coordinator"]
+
+    def renders():
+        return {
+            item["template"]: item["renders"] for item in coordinator.template_report()
+        }
+
+    await coordinator._async_update_data()
+    assert coordinator.render_interval("ha_humidity") == 0
+    await coordinator._async_update_data()
+    assert coordinator.render_interval("ha_humidity") == 120
+    data = await coordinator._async_update_data()
+    assert renders() == {"ha_temperature_adjusted": 3, "ha_humidity": 3}
+    # Backed off metrics keep exporting their last value.
+    assert data["data"]["ha_humidity"] == 40.0
+
+    hass.states.async_set("sensor.temp", "30.0")
+    await hass.async_block_till_done()
+    data = await coordinator._async_update_data()
+    assert data["data"]["ha_temperature_adjusted"] == pytest.approx(35.0)
+    assert renders() == {"ha_temperature_adjusted": 4, "ha_humidity": 3}
+    assert coordinator.render_interval("ha_temperature_adjusted") == 0
+    assert coordinator.render_interval("ha_humidity") == 120
+
+    for _ in range(3):
+        coordinator._last_renders["ha_humidity"] = (
+            0.0,
+            *coordinator._last_renders["ha_humidity"][1:],
+        )
+        await coordinator._async_update_data()
+    assert coordinator.render_interval("ha_humidity") == 240
+
+
+async def test_adaptive_interval_tracks_attribute_templates(
+    hass: HomeAssistant, mock_config, mock_opentelemetry, mocker
+):
+    """An entity read only by an attribute template resets the backoff too."""
+    mock_config[DOMAIN]["adaptive_interval"] = {"unchanged_renders": 1}
+    mock_config[DOMAIN]["metrics"] = [
+        {
+            "name": "ha_humidity",
+            "template": "{{ states('sensor.humidity') }}",
+            "attributes": {"room": "{{ states('input_text.room') }}"},
+        }
+    ]
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.humidity", "40")
+    hass.states.async_set("input_text.room", "kitchen")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN]["coordinator"]
+    state_changed = mocker.spy(coordinator, "_async_state_changed")
+
+    await coordinator._async_update_data()
+    await coordinator._async_update_data()
+    assert coordinator.render_interval("ha_humidity") == 120
+
+    # Only the states the backed off metric read are listened to.
+    hass.states.async_set("sensor.temp", "25.0")
+    await hass.async_block_till_done()
+    assert not state_changed.called
+
+    hass.states.async_set("input_text.room", "bathroom")
+    await hass.async_block_till_done()
+    assert coordinator.render_interval("ha_humidity") == 0
+    data = await coordinator._async_update_data()
+    assert data["series"]["ha_humidity"][0][0]["room"] == "bathroom"
+
+
+async def test_invalid_templates_are_isolated(
+    hass: HomeAssistant, mock_config, mock_opentelemetry, hass_storage
+):
+    """A template that does not compile only takes its own metric out."""
+    mock_config[DOMAIN]["metrics"].append(
+        {"name": "broken", "template": "{{ states('sensor.temp') | float + }}"}
+    )
+
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+
+    coordinator = hass.data[DOMAIN]["coordinator"]
+    assert list(coordinator.invalid_metrics) == ["broken"]
+    assert coordinator.data["data"] == {"ha_temperature_adjusted": pytest.approx(24.0)}
+    stored = hass_storage["template_metrics.template_cache"]["data"]
+    assert len(stored["templates"]) == 1
+
+    # A restart loads the compiled code instead of compiling the template.
+    cache = TemplateCodeCache(hass)
+    await cache.async_load()
+    template = Template(mock_config[DOMAIN]["metrics"][0]["template"], hass)
+    assert cache.apply(template)
+    assert template.async_render() == pytest.approx(24.0)
+
+
+async def test_template_cache_without_compiled_code(hass: HomeAssistant, mocker):
+    """Templates without _compiled_code are neither cached nor restored."""
+    cache = TemplateCodeCache(hass)
+    await cache.async_load()
+    template = mocker.Mock(spec=["template", "is_static"], is_static=False)
+    template.template = "{{ 1 }}"
+    cache.add(template)
+    assert not cache.apply(template)
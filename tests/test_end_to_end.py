@@ -0,0 +1,540 @@
+"""End-to-end tests of the exporter against a local remote write receiver."""
+
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.resources import Resource
+
+from homeassistant.core import HomeAssistant, State
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.setup import async_setup_component
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.template_metrics.const import DOMAIN
+from custom_components.template_metrics.prometheus_remote_write import (
+    FileSink,
+    PrometheusRemoteWriteMetricsExporter,
+    RemoteWriteTarget,
+)
+
+from custom_components.template_metrics.prometheus_remote_write import sink
+
+from .receiver import DROP
+
+
+def _collect(value: float = 1.0, series_count: int = 3):
+    reader = InMemoryMetricReader()
+    provider = MeterProvider(
+        resource=Resource(attributes={"service.name": "homeassistant"}),
+        metric_readers=[reader],
+    )
+    gauge = provider.get_meter("test").create_gauge("battery_level")
+    for index in range(series_count):
+        gauge.set(value + index, attributes={"entity_id": f"sensor.b{index}"})
+    return reader.get_metrics_data()
+
+
+@pytest.fixture
+def make_target(remote_write_receiver):
+    """Create targets pointing at the receiver, shut down after the test."""
+    targets = []
+
+    def _make_target(**kwargs):
+        kwargs.setdefault("retry_backoff", 0.01)
+        target = RemoteWriteTarget(remote_write_receiver.url, **kwargs)
+        targets.append(target)
+        return target
+
+    yield _make_target
+    for target in targets:
+        target.shutdown(timeout=5)
+
+
+@pytest.mark.parametrize(
+    ("protocol_version", "compression"),
+    [("1.0", "snappy"), ("2.0", "snappy"), ("1.0", "gzip"), ("2.0", "snappy_framed")],
+)
+def test_series_received(
+    remote_write_receiver, make_target, protocol_version, compression
+):
+    """Every exported series arrives with its labels and value."""
+    exporter = PrometheusRemoteWriteMetricsExporter(
+        targets=[
+            make_target(protocol_version=protocol_version, compression=compression)
+        ]
+    )
+    exporter.export(_collect())
+    assert exporter.force_flush(timeout_millis=5_000)
+
+    assert len(remote_write_receiver.requests) == 1
+    for index in range(3):
+        remote_write_receiver.assert_received(
+            "battery_level",
+            1.0 + index,
+            entity_id=f"sensor.b{index}",
+            service_name="homeassistant",
+        )
+
+
+def test_v2_falls_back_against_v1_receiver(remote_write_receiver, make_target):
+    """A receiver rejecting 2.0 gets the same series as 1.0."""
+    remote_write_receiver.v2 = False
+    target = make_target(protocol_version="2.0")
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[target])
+    exporter.export(_collect())
+    assert exporter.force_flush(timeout_millis=5_000)
+
+    assert target.protocol_version == "1.0"
+    assert remote_write_receiver.attempts == 2
+    assert len(remote_write_receiver.series) == 3
+
+
+def test_ship_v2_segment_to_v1_receiver(remote_write_receiver, tmp_path):
+    """Frames written as 2.0 are not re-encoded, so a 1.0 receiver is an error."""
+    remote_write_receiver.v2 = False
+    file_sink = FileSink(tmp_path, protocol_version="2.0")
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[file_sink])
+    exporter.export(_collect())
+    file_sink.shutdown()
+
+    with pytest.raises(OSError, match="written with remote write 2.0"):
+        sink.ship(sink.segments(tmp_path), remote_write_receiver.url)
+    assert len(sink.segments(tmp_path)) == 1
+    assert remote_write_receiver.attempts == 1
+
+    with pytest.raises(SystemExit) as exit_info:
+        sink.main([str(tmp_path), remote_write_receiver.url])
+    assert exit_info.value.code == 1
+
+
+def test_retries_until_accepted(remote_write_receiver, make_target):
+    """429, 5xx and dropped connections are retried until the batch is stored."""
+    remote_write_receiver.fail(429, headers={"Retry-After": "0"})
+    remote_write_receiver.fail(503, DROP)
+    target = make_target(max_retries=3)
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[target])
+    exporter.export(_collect())
+    assert exporter.force_flush(timeout_millis=5_000)
+
+    assert remote_write_receiver.attempts == 4
+    assert len(remote_write_receiver.requests) == 1
+    assert target.stats.responses == {"429": 1, "503": 1, "error": 1, "204": 1}
+
+
+def test_gives_up_after_max_retries(remote_write_receiver, make_target):
+    """A batch is dropped once its retries are used up."""
+    remote_write_receiver.fail(500, 500, 500)
+    target = make_target(max_retries=2)
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[target])
+    exporter.export(_collect())
+    assert exporter.force_flush(timeout_millis=5_000)
+
+    assert remote_write_receiver.attempts == 3
+    assert not remote_write_receiver.requests
+    assert target.stats.last_success is None
+
+
+def test_backpressure_drops_oldest(remote_write_receiver, make_target):
+    """A slow receiver makes the queue drop the oldest exports, not block."""
+    remote_write_receiver.latency = 0.2
+    target = make_target(max_queue_size=1)
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[target])
+    for value in range(5):
+        exporter.export(_collect(value=value * 10.0, series_count=1))
+    assert exporter.force_flush(timeout_millis=5_000)
+
+    assert target.stats.dropped_batches >= 3
+    received = [value for value, _ in remote_write_receiver.samples("battery_level")]
+    assert received[-1] == 40.0
+    assert len(received) == 5 - target.stats.dropped_batches
+
+
+def test_shutdown_flush_is_bounded(remote_write_receiver, make_target, caplog):
+    """Shutdown sends what it can before its deadline and drops the rest."""
+    remote_write_receiver.latency = 0.3
+    target = make_target()
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[target])
+    for value in range(3):
+        exporter.export(_collect(value=value))
+
+    started = time.monotonic()
+    exporter.shutdown(timeout_millis=400)
+
+    assert time.monotonic() - started < 1.0
+    assert 1 <= target.stats.sent_batches < 3
+    assert "of 3 pending batches" in caplog.text
+
+
+def test_circuit_breaker_stops_requests(remote_write_receiver, make_target):
+    """An open breaker drops batches without requests until a probe succeeds."""
+    target = make_target(max_retries=0, failure_threshold=2, reset_timeout=0.2)
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[target])
+    remote_write_receiver.fail(500, 500)
+    for value in range(4):
+        exporter.export(_collect(value=value))
+        assert exporter.force_flush(timeout_millis=5_000)
+
+    assert remote_write_receiver.attempts == 2
+    assert target.stats.circuit_state == "open"
+    assert target.stats.dropped_batches == 2
+
+    time.sleep(0.2)
+    exporter.export(_collect(value=10))
+    assert exporter.force_flush(timeout_millis=5_000)
+
+    probe, batch = remote_write_receiver.requests
+    assert not probe.series
+    assert len(batch.series) == 3
+    assert target.stats.circuit_state == "closed"
+
+
+def test_throughput(remote_write_receiver, make_target):
+    """Thousands of series per export arrive intact."""
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[make_target()])
+    for value in range(3):
+        exporter.export(_collect(value=value, series_count=2_000))
+    assert exporter.force_flush(timeout_millis=10_000)
+
+    assert remote_write_receiver.wait_for_requests(3)
+    assert len(remote_write_receiver.series) == 6_000
+
+
+async def test_integration_end_to_end(
+    hass: HomeAssistant, mock_config, mocker, remote_write_receiver
+):
+    """Rendered templates reach the receiver through the real exporter."""
+    providers = []
+    mocker.patch(
+        "opentelemetry.metrics.set_meter_provider", side_effect=providers.append
+    )
+    mocker.patch(
+        "opentelemetry.metrics.get_meter",
+        side_effect=lambda name: providers[-1].get_meter(name),
+    )
+    mock_config[DOMAIN]["remote_write_url"] = remote_write_receiver.url
+    mock_config[DOMAIN]["export_mode"] = "coordinator"
+
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    hass.states.async_set("sensor.temp", "30.0")
+    await hass.data[DOMAIN]["coordinator"].async_refresh()
+    await hass.async_add_executor_job(remote_write_receiver.wait_for_requests, 2)
+
+    assert remote_write_receiver.samples(
+        "ha_temperature_adjusted", instance="test-instance"
+    )
+    remote_write_receiver.assert_received("ha_temperature_adjusted", 35.0)
+    assert (
+        remote_write_receiver.requests[0].headers["Authorization"].startswith("Basic ")
+    )
+    await hass.async_add_executor_job(providers[-1].shutdown)
+    assert not [
+        thread
+        for thread in threading.enumerate()
+        if thread.name.startswith("RemoteWrite-")
+    ]
+
+
+@pytest.mark.parametrize("export_mode", ["coordinator", "periodic"])
+async def test_integration_direct_backend(
+    hass: HomeAssistant, mock_config, mocker, remote_write_receiver, export_mode
+):
+    """The direct backend exports without an OpenTelemetry meter provider."""
+    set_meter_provider = mocker.patch("opentelemetry.metrics.set_meter_provider")
+    mock_config[DOMAIN]["remote_write_url"] = remote_write_receiver.url
+    mock_config[DOMAIN]["export_mode"] = export_mode
+    mock_config[DOMAIN]["backend"] = "direct"
+
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    hass.states.async_set("sensor.temp", "30.0")
+    await hass.data[DOMAIN]["coordinator"].async_refresh()
+    # Shutting down runs the final export of a periodic reader.
+    await hass.async_add_executor_job(hass.data[DOMAIN]["provider"].shutdown)
+
+    assert not set_meter_provider.called
+    assert remote_write_receiver.wait_for_requests(1)
+    remote_write_receiver.assert_received(
+        "ha_temperature_adjusted",
+        35.0,
+        instance="test-instance",
+        service_name="homeassistant",
+    )
+
+
+async def test_backfill_service(
+    hass: HomeAssistant, mock_config, mocker, remote_write_receiver
+):
+    """Backfilled samples are rendered from history and sent in time order."""
+    from custom_components.template_metrics import backfill
+
+    start = dt_util.parse_datetime("2024-01-01T00:00:00+00:00")
+    history = {
+        "sensor.temp": [
+            State("sensor.temp", "10.0", last_updated=start),
+            State(
+                "sensor.temp",
+                "20.0",
+                last_updated=start + timedelta(minutes=2),
+            ),
+        ]
+    }
+    get_significant_states = mocker.patch.object(
+        backfill.history, "get_significant_states", return_value=history
+    )
+    mocker.patch.object(backfill, "get_instance", return_value=hass)
+    mock_config[DOMAIN]["remote_write_url"] = remote_write_receiver.url
+    mock_config[DOMAIN]["export_mode"] = "coordinator"
+    mock_config[DOMAIN]["backend"] = "direct"
+
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "30.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    hass.config.components.add("recorder")
+    requests = len(remote_write_receiver.requests)
+
+    summary = await hass.services.async_call(
+        DOMAIN,
+        "backfill",
+        {
+            "start": start,
+            "end": start + timedelta(minutes=4),
+            "step": 60,
+            "max_samples": 2,
+            "request_interval": 0.1,
+        },
+        blocking=True,
+        return_response=True,
+    )
+
+    assert summary == {"samples": 4, "requests": 2, "skipped": 0}
+    assert get_significant_states.call_args.args[3] == ["sensor.temp"]
+    assert len(remote_write_receiver.requests) == requests + 2
+    timestamp = int(start.timestamp() * 1000)
+    samples = remote_write_receiver.samples("ha_temperature_adjusted")
+    assert [sample[1] for sample in samples[-4:]] == [
+        timestamp + minute * 60_000 for minute in range(4)
+    ]
+    assert [sample[0] for sample in samples[-4:]] == pytest.approx(
+        [13.0, 13.0, 24.0, 24.0]
+    )
+    # The live state is left alone.
+    assert hass.states.get("sensor.temp").state == "30.0"
+
+    with pytest.raises(HomeAssistantError):
+        await hass.services.async_call(
+            DOMAIN,
+            "backfill",
+            {"start": start, "end": start, "metrics": ["unknown"]},
+            blocking=True,
+            return_response=True,
+        )
+
+
+async def test_backfill_skips_unavailable_quietly(
+    hass: HomeAssistant, mock_config, mocker, remote_write_receiver, caplog
+):
+    """Steps where a template renders no number are skipped without errors."""
+    from custom_components.template_metrics import backfill
+
+    start = dt_util.parse_datetime("2024-01-01T00:00:00+00:00")
+    history = {
+        "sensor.temp": [
+            State("sensor.temp", "10.0", last_updated=start),
+            State(
+                "sensor.temp",
+                "unavailable",
+                last_updated=start + timedelta(minutes=1),
+            ),
+        ]
+    }
+    mocker.patch.object(
+        backfill.history, "get_significant_states", return_value=history
+    )
+    mocker.patch.object(backfill, "get_instance", return_value=hass)
+    mock_config[DOMAIN]["remote_write_url"] = remote_write_receiver.url
+    mock_config[DOMAIN]["export_mode"] = "coordinator"
+    mock_config[DOMAIN]["backend"] = "direct"
+    mock_config[DOMAIN]["metrics"].append(
+        {"name": "ha_temperature", "template": "{{ states('sensor.temp') }}"}
+    )
+
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "30.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    hass.config.components.add("recorder")
+    caplog.clear()
+
+    summary = await hass.services.async_call(
+        DOMAIN,
+        "backfill",
+        {
+            "start": start,
+            "end": start + timedelta(minutes=4),
+            "step": 60,
+            "metrics": ["ha_temperature"],
+            "request_interval": 0.1,
+        },
+        blocking=True,
+        return_response=True,
+    )
+
+    assert summary == {"samples": 1, "requests": 1, "skipped": 3}
+    assert not [record for record in caplog.records if record.levelname == "ERROR"]
+    assert "Skipped 3 metric steps" in caplog.text
+
+
+async def test_backfill_requests_stay_within_max_samples(
+    hass: HomeAssistant, mock_config, mocker, remote_write_receiver
+):
+    """A step whose samples do not fit is split across requests."""
+    from custom_components.template_metrics import backfill
+
+    start = dt_util.parse_datetime("2024-01-01T00:00:00+00:00")
+    history = {"sensor.temp": [State("sensor.temp", "10.0", last_updated=start)]}
+    mocker.patch.object(
+        backfill.history, "get_significant_states", return_value=history
+    )
+    mocker.patch.object(backfill, "get_instance", return_value=hass)
+    mock_config[DOMAIN]["remote_write_url"] = remote_write_receiver.url
+    mock_config[DOMAIN]["export_mode"] = "coordinator"
+    mock_config[DOMAIN]["backend"] = "direct"
+    mock_config[DOMAIN]["metrics"].append(
+        {"name": "ha_temperature", "template": "{{ states('sensor.temp') }}"}
+    )
+
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "30.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    hass.config.components.add("recorder")
+    requests = len(remote_write_receiver.requests)
+
+    summary = await hass.services.async_call(
+        DOMAIN,
+        "backfill",
+        {
+            "start": start,
+            "end": start + timedelta(minutes=4),
+            "step": 60,
+            "max_samples": 3,
+            "request_interval": 0,
+        },
+        blocking=True,
+        return_response=True,
+    )
+
+    assert summary == {"samples": 8, "requests": 3, "skipped": 0}
+    assert [
+        sum(len(series.samples) for series in request.series)
+        for request in remote_write_receiver.requests[requests:]
+    ] == [3, 3, 2]
+
+
+async def test_push_on_state_change(
+    hass: HomeAssistant, mock_config, mocker, remote_write_receiver
+):
+    """A push_on entity changing sends its metric at once, in its own request."""
+    mock_config[DOMAIN]["remote_write_url"] = remote_write_receiver.url
+    mock_config[DOMAIN]["export_mode"] = "coordinator"
+    mock_config[DOMAIN]["backend"] = "direct"
+    mock_config[DOMAIN]["metrics"][0]["push_on"] = {"entities": "sensor.temp"}
+    mock_config[DOMAIN]["metrics"].append(
+        {
+            "name": "ha_door",
+            "template": "{{ 1 if is_state('binary_sensor.door', 'on') else 0 }}",
+            "push_on": {"events": ["door_event"]},
+        }
+    )
+
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    assert await hass.async_add_executor_job(remote_write_receiver.wait_for_requests, 1)
+    requests = len(remote_write_receiver.requests)
+
+    hass.states.async_set("sensor.temp", "30.0")
+    await hass.async_block_till_done()
+    assert await hass.async_add_executor_job(
+        remote_write_receiver.wait_for_requests, requests + 1
+    )
+    pushed = remote_write_receiver.requests[requests]
+    assert {series.name for series in pushed.series} == {"ha_temperature_adjusted"}
+    remote_write_receiver.assert_received("ha_temperature_adjusted", 35.0)
+
+    # An event pushes only the metrics listening to it.
+    hass.states.async_set("binary_sensor.door", "on")
+    hass.bus.async_fire("door_event")
+    await hass.async_block_till_done()
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=1))
+    await hass.async_block_till_done()
+    assert await hass.async_add_executor_job(
+        remote_write_receiver.wait_for_requests, requests + 2
+    )
+    remote_write_receiver.assert_received("ha_door", 1.0)
+
+    response = await hass.services.async_call(
+        DOMAIN, "push", {"metrics": ["ha_door"]}, blocking=True, return_response=True
+    )
+    assert response == {"pushed": ["ha_door"]}
+    with pytest.raises(HomeAssistantError):
+        await hass.services.async_call(
+            DOMAIN, "push", {"metrics": ["unknown"]}, blocking=True
+        )
+    await hass.async_add_executor_job(hass.data[DOMAIN]["provider"].shutdown)
+
+
+async def test_file_sink_ship_service(
+    hass: HomeAssistant, mock_config, remote_write_receiver, tmp_path
+):
+    """Metrics written to the file sink reach the receiver when shipped."""
+    del mock_config[DOMAIN]["remote_write_url"]
+    del mock_config[DOMAIN]["user"]
+    del mock_config[DOMAIN]["token"]
+    mock_config[DOMAIN]["export_mode"] = "coordinator"
+    mock_config[DOMAIN]["backend"] = "direct"
+    mock_config[DOMAIN]["remote_write_version"] = "2.0"
+    mock_config[DOMAIN]["file_sink"] = {"path": str(tmp_path)}
+
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    hass.states.async_set("sensor.temp", "30.0")
+    await hass.data[DOMAIN]["coordinator"].async_refresh()
+    assert not remote_write_receiver.requests
+
+    summary = await hass.services.async_call(
+        DOMAIN,
+        "ship",
+        {"url": remote_write_receiver.url},
+        blocking=True,
+        return_response=True,
+    )
+
+    assert summary == {"segments": 1, "frames": 2, "bytes": summary["bytes"]}
+    assert (
+        remote_write_receiver.requests[0]
+        .headers["Content-Type"]
+        .endswith("io.prometheus.write.v2.Request")
+    )
+    assert [
+        value
+        for value, _ in remote_write_receiver.samples(
+            "ha_temperature_adjusted", instance="test-instance"
+        )
+    ] == pytest.approx([24.0, 35.0])
+    assert not list(tmp_path.iterdir())
+    await hass.async_add_executor_job(hass.data[DOMAIN]["provider"].shutdown)
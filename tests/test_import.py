@@ -0,0 +1,59 @@
+"""Tests that importing the integration stays cheap."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+from custom_components.template_metrics import const
+from custom_components.template_metrics.prometheus_remote_write.breaker import OPEN
+from custom_components.template_metrics.prometheus_remote_write.compression import (
+    CODECS,
+)
+from custom_components.template_metrics.prometheus_remote_write.target import (
+    REMOTE_WRITE_VERSIONS,
+)
+
+HEAVY_MODULES = ("opentelemetry", "snappy", "google.protobuf", "zstandard")
+MODULES = (
+    "custom_components.template_metrics",
+    "custom_components.template_metrics.binary_sensor",
+    "custom_components.template_metrics.switch",
+    "custom_components.template_metrics.sensor",
+)
+
+
+def test_import_defers_heavy_modules():
+    """Importing the integration and its platforms loads no exporter dependency."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(MODULES)}"],
+        capture_output=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+        text=True,
+    )
+    imported = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            imported[name.strip()] = int(cumulative)
+
+    heavy = sorted(
+        name
+        for name in imported
+        if any(
+            name == module or name.startswith(f"{module}.") for module in HEAVY_MODULES
+        )
+    )
+    assert not heavy, (
+        f"importing the integration took {imported.get(MODULES[0], 0) / 1000:.1f} ms "
+        f"and loaded {heavy}"
+    )
+
+
+def test_schema_constants_match_exporter():
+    """The lightweight constants used by the schema match the exporter."""
+    assert const.REMOTE_WRITE_VERSIONS == REMOTE_WRITE_VERSIONS
+    assert const.COMPRESSION_CODECS == tuple(CODECS)
+    assert const.CIRCUIT_BREAKER_OPEN == OPEN
@@ -1,5 +1,9 @@
 """Tests for Grafana Metrics Sender setup."""
 
+import time
+
+import pytest
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
 from homeassistant.core import HomeAssistant
 from homeassistant.setup import async_setup_component
 
@@ -33,3 +37,144 @@ async def test_async_invalid_config(
     hass.states.async_set("sensor.temp", "20.0")
     assert not await async_setup_component(hass, DOMAIN, mock_config)
     await hass.async_block_till_done()
+
+
+async def test_async_setup_multiple_targets(
+    hass: HomeAssistant, mock_config, mocker, mock_opentelemetry
+):
+    """Each remote_write entry becomes a target next to the top-level one."""
+    exporter = mocker.patch(
+        "custom_components.template_metrics.telemetry.PrometheusRemoteWriteMetricsExporter"
+    )
+    mock_config[DOMAIN]["remote_write_version"] = "2.0"
+    mock_config[DOMAIN]["remote_write"] = [
+        {
+            "url": "http://victoria.local:8428/api/v1/write",
+            "compression": "gzip",
+            "remote_write_version": "1.0",
+            "timeout": 5,
+        }
+    ]
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+
+    grafana, victoria = exporter.call_args.kwargs["targets"]
+    assert grafana.endpoint == "https://prometheus.example.com/api/prom/push"
+    assert grafana.headers["Authorization"].startswith("Basic ")
+    assert grafana.protocol_version == "2.0"
+    assert victoria.endpoint == "http://victoria.local:8428/api/v1/write"
+    assert victoria.headers is None
+    assert victoria.compression == "gzip"
+    assert victoria.protocol_version == "1.0"
+    assert victoria.timeout == 5
+
+
+async def test_async_setup_requires_target(
+    hass: HomeAssistant, mock_config, mock_opentelemetry
+):
+    """Setup fails without any remote write target."""
+    del mock_config[DOMAIN]["remote_write_url"]
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert not await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"remote_write": [{"url": "http://victoria.local/write", "timeout": 0}]},
+        {"remote_write": [{"url": "http://victoria.local/write", "queue_size": 0}]},
+        {
+            "remote_write": [
+                {"url": "http://victoria.local/write", "failure_threshold": 0}
+            ]
+        },
+        {"heartbeat": 0},
+        {"file_sink": {"path": "metrics", "max_file_size": 0}},
+        {"file_sink": {"path": "metrics", "max_file_size": 64, "max_total_size": 32}},
+    ],
+)
+async def test_async_setup_rejects_invalid_sizes(
+    hass: HomeAssistant, mock_config, mock_opentelemetry, options
+):
+    """Values the export pipeline cannot work with fail validation, not setup."""
+    mock_config[DOMAIN].update(options)
+    await async_setup_component(hass, "homeassistant", {})
+    assert not await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        {"action": "hashmod", "source_labels": ["entity_id"], "target_label": "s"},
+        {"action": "replace", "source_labels": ["entity_id"]},
+        {"action": "labeldrop", "regex": "entity_id("},
+        {
+            "action": "hashmod",
+            "source_labels": ["entity_id"],
+            "target_label": "s",
+            "modulus": 0,
+        },
+    ],
+)
+async def test_async_setup_rejects_invalid_relabel_rules(
+    hass: HomeAssistant, mock_config, mock_opentelemetry, rule
+):
+    """Relabel rules missing what their action needs fail validation."""
+    mock_config[DOMAIN]["write_relabel_configs"] = [rule]
+    await async_setup_component(hass, "homeassistant", {})
+    assert not await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+
+
+async def test_shutdown_is_bounded(
+    hass: HomeAssistant, mock_config, mocker, mock_opentelemetry, caplog
+):
+    """HA stop waits for the final flush no longer than shutdown_timeout."""
+    provider = mocker.patch(
+        "custom_components.template_metrics.telemetry.MeterProvider"
+    ).return_value
+    calls = []
+
+    def _slow_shutdown(timeout_millis):
+        calls.append(timeout_millis)
+        time.sleep(0.5)
+
+    # A plain function, as the test harness runs mocks inline on the loop.
+    provider.shutdown = _slow_shutdown
+    mock_config[DOMAIN]["shutdown_timeout"] = 0.1
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+
+    started = time.monotonic()
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_STOP)
+    await hass.async_block_till_done()
+
+    assert time.monotonic() - started < 0.4
+    assert calls == [100.0]
+    assert "not flushed within 0.1 seconds" in caplog.text
+
+
+def test_target_names_are_unique():
+    """Targets are named by host, then by path, then numbered."""
+    from custom_components.template_metrics.telemetry import _target_names
+
+    assert _target_names(
+        [
+            "https://prometheus.example.com/api/prom/push",
+            "http://victoria.local/api/v1/write",
+            "http://victoria.local/otlp/v1/metrics",
+            "http://victoria.local/otlp/v1/metrics",
+        ]
+    ) == [
+        "prometheus.example.com",
+        "victoria.local/api/v1/write",
+        "victoria.local/otlp/v1/metrics",
+        "victoria.local/otlp/v1/metrics 2",
+    ]
@@ -0,0 +1,728 @@
+"""Tests for the vendored Prometheus remote write exporter."""
+
+import gzip
+import os
+import threading
+import time
+
+import pytest
+import snappy
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader, MetricExportResult
+from opentelemetry.sdk.resources import Resource
+
+from custom_components.template_metrics.prometheus_remote_write import (
+    FileSink,
+    PrometheusRemoteWriteMetricsExporter,
+    RemoteWriteTarget,
+    SampleBuffer,
+    SeriesStore,
+)
+from custom_components.template_metrics.prometheus_remote_write.relabel import (
+    Relabeler,
+)
+from custom_components.template_metrics.prometheus_remote_write.wire import (
+    encode_label_block,
+)
+from custom_components.template_metrics.prometheus_remote_write.breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+)
+from custom_components.template_metrics.prometheus_remote_write.sink import (
+    read_frames,
+    read_header,
+    segments,
+)
+from custom_components.template_metrics.prometheus_remote_write.gen.remote_pb2 import (
+    WriteRequest,
+)
+from custom_components.template_metrics.prometheus_remote_write.gen.write_v2_pb2 import (
+    Metadata,
+    Request,
+)
+from custom_components.template_metrics.prometheus_remote_write.target import (
+    CONTENT_TYPE_V2,
+    SAMPLES_WRITTEN_HEADER,
+)
+
+ENDPOINT = "https://prometheus.example.com/api/prom/push"
+
+
+def _collect_metrics(series_count: int = 3):
+    """Record a gauge with several series and return the collected MetricsData."""
+    reader = InMemoryMetricReader()
+    provider = MeterProvider(
+        resource=Resource(attributes={"service.name": "homeassistant"}),
+        metric_readers=[reader],
+    )
+    gauge = provider.get_meter("test").create_gauge("battery_level")
+    for index in range(series_count):
+        gauge.set(
+            float(index),
+            attributes={"instance": "test-instance", "entity_id": f"sensor.b{index}"},
+        )
+    return reader.get_metrics_data()
+
+
+def _response(mocker, status_code: int = 204, headers: dict | None = None):
+    response = mocker.MagicMock()
+    response.status_code = status_code
+    response.ok = 200 <= status_code < 300
+    response.headers = headers or {}
+    return response
+
+
+@pytest.fixture
+def make_exporter():
+    """Create exporters whose sender threads are stopped after the test."""
+    exporters = []
+
+    def _make_exporter(*args, **kwargs):
+        exporter = PrometheusRemoteWriteMetricsExporter(*args, **kwargs)
+        exporters.append(exporter)
+        return exporter
+
+    yield _make_exporter
+    for exporter in exporters:
+        exporter.shutdown(timeout_millis=1_000)
+
+
+def _export(exporter, metrics_data) -> None:
+    assert exporter.export(metrics_data) == MetricExportResult.SUCCESS
+    assert exporter.force_flush(timeout_millis=5_000)
+
+
+def test_build_message_v2_interns_symbols():
+    """Label strings shared by several series are stored once."""
+    exporter = PrometheusRemoteWriteMetricsExporter(ENDPOINT)
+    series = exporter._translate_data(_collect_metrics())
+
+    request = Request()
+    request.ParseFromString(exporter._build_message_v2(series))
+
+    symbols = list(request.symbols)
+    assert symbols[0] == ""
+    assert len(symbols) == len(set(symbols))
+    assert symbols.count("battery_level") == 1
+    assert len(request.timeseries) == 3
+    for item in request.timeseries:
+        assert item.metadata.type == Metadata.METRIC_TYPE_GAUGE
+        labels = dict(
+            zip(
+                (symbols[ref] for ref in item.labels_refs[::2]),
+                (symbols[ref] for ref in item.labels_refs[1::2]),
+            )
+        )
+        assert labels["__name__"] == "battery_level"
+        assert labels["service_name"] == "homeassistant"
+        assert float(labels["entity_id"][-1]) == item.samples[0].value
+
+
+def test_build_message_v2_is_smaller_than_v1():
+    """Interning shrinks multi-series payloads before compression."""
+    exporter = PrometheusRemoteWriteMetricsExporter(ENDPOINT)
+    series = exporter._translate_data(_collect_metrics(series_count=50))
+
+    v1 = exporter._build_message(series)
+    v2 = exporter._build_message_v2(series)
+    assert len(v2) < len(v1)
+
+
+def test_export_v2_headers(mocker, make_exporter):
+    """A 2.0 receiver gets the negotiated content type and version."""
+    post = mocker.patch(
+        "requests.Session.post",
+        return_value=_response(mocker, headers={SAMPLES_WRITTEN_HEADER: "3"}),
+    )
+    exporter = make_exporter(ENDPOINT, protocol_version="2.0")
+
+    _export(exporter, _collect_metrics())
+    headers = post.call_args.kwargs["headers"]
+    assert headers["Content-Type"] == CONTENT_TYPE_V2
+    assert headers["X-Prometheus-Remote-Write-Version"] == "2.0.0"
+    assert exporter.targets[0].protocol_version == "2.0"
+
+
+@pytest.mark.parametrize(
+    "first_response",
+    [{"status_code": 415}, {"status_code": 204, "headers": {}}],
+    ids=["unsupported-media-type", "no-written-header"],
+)
+def test_export_v2_falls_back_to_v1(mocker, make_exporter, first_response):
+    """A receiver that rejects 2.0 gets the same data re-sent as 1.0."""
+    post = mocker.patch(
+        "requests.Session.post",
+        side_effect=[_response(mocker, **first_response), _response(mocker)],
+    )
+    exporter = make_exporter(ENDPOINT, protocol_version="2.0")
+
+    _export(exporter, _collect_metrics())
+    assert exporter.targets[0].protocol_version == "1.0"
+    assert post.call_count == 2
+    retry = post.call_args_list[1].kwargs
+    assert retry["headers"]["Content-Type"] == "application/x-protobuf"
+    write_request = WriteRequest()
+    write_request.ParseFromString(snappy.decompress(retry["data"]))
+    assert len(write_request.timeseries) == 3
+
+
+def test_invalid_protocol_version():
+    """Unknown protocol versions are rejected up front."""
+    with pytest.raises(ValueError):
+        PrometheusRemoteWriteMetricsExporter(ENDPOINT, protocol_version="3.0")
+
+
+def test_label_blocks_cached_between_exports(mocker):
+    """Stable series reuse their translated labels instead of re-sanitizing."""
+    exporter = PrometheusRemoteWriteMetricsExporter(ENDPOINT)
+    first = exporter._translate_data(_collect_metrics())
+
+    sanitize = mocker.spy(exporter, "_sanitize_string")
+    second = exporter._translate_data(_collect_metrics())
+
+    assert all(call.args[1] == "name" for call in sanitize.call_args_list)
+    assert [item.label_block for item in second] == [item.label_block for item in first]
+
+
+def _collect_values(values):
+    """Record one gauge series per value and return the collected MetricsData."""
+    reader = InMemoryMetricReader()
+    provider = MeterProvider(metric_readers=[reader])
+    gauge = provider.get_meter("test").create_gauge("battery_level")
+    for index, value in enumerate(values):
+        gauge.set(value, attributes={"entity_id": f"sensor.b{index}"})
+    return reader.get_metrics_data()
+
+
+def test_send_on_change_skips_unchanged_series(make_exporter, mocker):
+    """Only series whose value changed are sent again."""
+    post = mocker.patch("requests.Session.post", return_value=_response(mocker))
+    exporter = make_exporter(ENDPOINT, send_on_change=True)
+
+    _export(exporter, _collect_values([1.0, 2.0, float("nan")]))
+    _export(exporter, _collect_values([1.0, 3.0, float("nan")]))
+    _export(exporter, _collect_values([1.0, 3.0, float("nan")]))
+
+    assert post.call_count == 2
+    write_request = WriteRequest()
+    write_request.ParseFromString(snappy.decompress(post.call_args.kwargs["data"]))
+    assert [
+        sample.value for ts in write_request.timeseries for sample in ts.samples
+    ] == [3.0]
+
+
+def test_send_on_change_resends_until_accepted(make_exporter, mocker):
+    """A change a target did not accept is sent again with the next export."""
+    post = mocker.patch(
+        "requests.Session.post",
+        side_effect=[_response(mocker, 400), _response(mocker)],
+    )
+    exporter = make_exporter(ENDPOINT, send_on_change=True)
+
+    _export(exporter, _collect_values([1.0]))
+    _export(exporter, _collect_values([1.0]))
+    _export(exporter, _collect_values([1.0]))
+
+    assert post.call_count == 2
+
+
+def test_send_on_change_heartbeat(mocker):
+    """Unchanged series are sent again once their heartbeat elapsed."""
+    exporter = PrometheusRemoteWriteMetricsExporter(
+        ENDPOINT, send_on_change=True, heartbeat=0.001
+    )
+    assert len(exporter._translate_data(_collect_values([1.0, 2.0]))) == 2
+    time.sleep(0.01)
+    assert len(exporter._translate_data(_collect_values([1.0, 2.0]))) == 2
+
+
+def test_buffered_samples_sent_per_series():
+    """Samples rendered between exports are all sent, in render order."""
+    sample_buffer = SampleBuffer(max_samples=2)
+    exporter = PrometheusRemoteWriteMetricsExporter(
+        ENDPOINT, sample_buffer=sample_buffer
+    )
+    for value, timestamp in ((7.0, 1_000), (8.0, 2_000), (9.0, 3_000)):
+        sample_buffer.add("battery_level", {"entity_id": "sensor.b0"}, value, timestamp)
+
+    series = exporter._translate_data(
+        _collect_values([9.0, 2.0]), sample_buffer.drain()
+    )
+
+    assert [list(item.samples) for item in series][0] == [(8.0, 2_000), (9.0, 3_000)]
+    assert [value for value, _ in series[1].samples] == [2.0]
+    assert not len(sample_buffer)
+
+
+def test_export_store_matches_metrics_data():
+    """A SeriesStore translates to the same series as the OpenTelemetry path."""
+    exporter = PrometheusRemoteWriteMetricsExporter(ENDPOINT)
+    store = SeriesStore({"service.name": "homeassistant"})
+    for index in range(3):
+        store.set(
+            "battery_level",
+            {"instance": "test-instance", "entity_id": f"sensor.b{index}"},
+            float(index),
+            1_000,
+        )
+
+    expected = exporter._translate_data(_collect_metrics())
+    series = exporter._translate_store(store)
+
+    assert [item.labels for item in series] == [item.labels for item in expected]
+    assert [item.samples for item in series] == [[(float(i), 1_000)] for i in range(3)]
+    assert all(item.metric_type == Metadata.METRIC_TYPE_GAUGE for item in series)
+    assert exporter._translate_store(store) == []
+
+
+def test_periodic_store_reader_shutdown_is_bounded(mocker):
+    """Shutdown shares one deadline between the last export and the targets."""
+    from custom_components.template_metrics.direct import PeriodicStoreReader
+
+    targets = [RemoteWriteTarget(ENDPOINT), RemoteWriteTarget(ENDPOINT)]
+    timeouts = []
+
+    def _slow_shutdown(timeout):
+        timeouts.append(timeout)
+        time.sleep(timeout)
+
+    for target in targets:
+        mocker.patch.object(target, "shutdown", side_effect=_slow_shutdown)
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=targets)
+    exporting = threading.Event()
+
+    def _slow_export(store, timeout_millis):
+        exporting.set()
+        time.sleep(0.15)
+
+    mocker.patch.object(exporter, "export_store", side_effect=_slow_export)
+    reader = PeriodicStoreReader(exporter, SeriesStore(), export_interval_millis=10)
+    assert exporting.wait(1)
+
+    started = time.monotonic()
+    reader.shutdown(timeout_millis=400)
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.55
+    # The targets shut down in parallel, each with the same remaining time.
+    assert len(timeouts) == 2
+    assert timeouts[0] == timeouts[1] > 0
+
+
+def test_series_store_collects_updated_series():
+    """Only series set since the last collect are returned, with their last value."""
+    store = SeriesStore()
+    store.set("a", {"entity_id": "sensor.a"}, 1.0, 1_000)
+    store.set("b", None, 2.0, 1_000)
+    store.set("a", {"entity_id": "sensor.a"}, 3.0, 2_000)
+    assert store.collect() == [
+        ("a", (("entity_id", "sensor.a"),), 3.0, 2_000),
+        ("b", (), 2.0, 1_000),
+    ]
+
+    store.set("b", None, 4.0, 3_000)
+    store.set("c", None, 5.0, 3_000)
+    store.remove("a")
+    assert len(store) == 2
+    assert store.collect() == [("b", (), 4.0, 3_000), ("c", (), 5.0, 3_000)]
+
+
+def test_label_cache_evicts_least_recently_used():
+    """The label cache never grows past its size bound."""
+    exporter = PrometheusRemoteWriteMetricsExporter(ENDPOINT, label_cache_size=2)
+    exporter._translate_data(_collect_metrics(series_count=3))
+
+    assert len(exporter._label_cache) == 2
+    assert (
+        exporter._label_cache.get(
+            (
+                (("service.name", "homeassistant"),),
+                (
+                    ("instance", "test-instance"),
+                    ("entity_id", "sensor.b0"),
+                    ("__name__", "battery_level"),
+                ),
+            )
+        )
+        is None
+    )
+
+
+def test_relabel_rules():
+    """Series are dropped and their labels rewritten before they are encoded."""
+    relabeler = Relabeler.from_config(
+        [
+            {
+                "action": "drop",
+                "source_labels": ["entity_id"],
+                "regex": "sensor\\.b2",
+            },
+            {"action": "labeldrop", "regex": "service_name|instance"},
+            {
+                "source_labels": ["entity_id"],
+                "regex": "sensor\\.(.*)",
+                "target_label": "battery",
+            },
+            {
+                "action": "hashmod",
+                "source_labels": ["entity_id"],
+                "target_label": "shard",
+                "modulus": 4,
+            },
+            {"action": "labelkeep", "regex": "__name__|battery|shard"},
+        ]
+    )
+    exporter = PrometheusRemoteWriteMetricsExporter(ENDPOINT, relabeler=relabeler)
+
+    series = exporter._translate_data(_collect_metrics())
+
+    assert [item.labels for item in series] == [
+        (("__name__", "battery_level"), ("battery", "b0"), ("shard", "0")),
+        (("__name__", "battery_level"), ("battery", "b1"), ("shard", "3")),
+    ]
+    assert [item.label_block for item in series] == [
+        encode_label_block(item.labels) for item in series
+    ]
+
+
+@pytest.mark.parametrize(
+    ("regex", "replacement", "expected"),
+    [
+        ("sensor\\..*", "$1", None),
+        ("sensor\\.(.*)", "$1_x", None),
+        ("sensor\\.(.*)", "${1}_x", "b0_x"),
+        ("sensor\\.(?P<name>.*)", "${name}", "b0"),
+        ("sensor\\.(.*)", "$$", "$"),
+        ("sensor\\.(.*)", "$$1", "$1"),
+    ],
+)
+def test_relabel_replacement_groups(regex, replacement, expected):
+    """Missing groups expand to nothing instead of failing, as in Prometheus."""
+    relabeler = Relabeler.from_config(
+        [
+            {
+                "source_labels": ["entity_id"],
+                "regex": regex,
+                "target_label": "battery",
+                "replacement": replacement,
+            }
+        ]
+    )
+
+    labels = relabeler.relabel(
+        (("__name__", "battery_level"), ("entity_id", "sensor.b0"))
+    )
+
+    assert dict(labels).get("battery") == expected
+
+
+def test_relabel_results_cached_per_label_set(mocker):
+    """Rules run once per label set, including for dropped series."""
+    relabeler = Relabeler.from_config(
+        [{"action": "keep", "source_labels": ["entity_id"], "regex": "sensor\\.b0"}]
+    )
+    relabel = mocker.spy(relabeler, "relabel")
+    exporter = PrometheusRemoteWriteMetricsExporter(ENDPOINT, relabeler=relabeler)
+
+    assert len(exporter._translate_data(_collect_metrics())) == 1
+    assert len(exporter._translate_data(_collect_metrics())) == 1
+    assert relabel.call_count == 3
+
+
+def test_relabel_dropping_every_series_is_not_a_failure(make_exporter, mocker):
+    """An export whose series were all dropped succeeds without a request."""
+    post = mocker.patch("requests.Session.post", return_value=_response(mocker))
+    exporter = make_exporter(
+        ENDPOINT,
+        relabeler=Relabeler.from_config(
+            [{"action": "drop", "source_labels": ["__name__"], "regex": "battery_.*"}]
+        ),
+    )
+
+    _export(exporter, _collect_metrics())
+
+    assert not post.called
+
+
+@pytest.mark.parametrize(
+    ("compression", "content_encoding", "decompress"),
+    [
+        ("snappy", "snappy", snappy.decompress),
+        (
+            "snappy_framed",
+            "x-snappy-framed",
+            lambda data: snappy.StreamDecompressor().decompress(data),
+        ),
+        ("gzip", "gzip", gzip.decompress),
+    ],
+)
+def test_export_compression(
+    mocker, make_exporter, compression, content_encoding, decompress
+):
+    """Payloads use the configured codec and report their size before and after."""
+    post = mocker.patch("requests.Session.post", return_value=_response(mocker))
+    exporter = make_exporter(ENDPOINT, compression=compression)
+
+    _export(exporter, _collect_metrics())
+    kwargs = post.call_args.kwargs
+    assert kwargs["headers"]["Content-Encoding"] == content_encoding
+    write_request = WriteRequest()
+    write_request.ParseFromString(decompress(kwargs["data"]))
+    assert len(write_request.timeseries) == 3
+    target = exporter.targets[0]
+    assert target.stats.last_compressed_bytes == len(kwargs["data"])
+    assert target.stats.last_uncompressed_bytes == write_request.ByteSize()
+
+
+def test_export_zstd(mocker, make_exporter):
+    """Zstandard is available when the optional package is installed."""
+    zstandard = pytest.importorskip("zstandard")
+    post = mocker.patch("requests.Session.post", return_value=_response(mocker))
+    exporter = make_exporter(ENDPOINT, compression="zstd")
+
+    _export(exporter, _collect_metrics())
+    kwargs = post.call_args.kwargs
+    assert kwargs["headers"]["Content-Encoding"] == "zstd"
+    write_request = WriteRequest()
+    write_request.ParseFromString(
+        zstandard.ZstdDecompressor().decompress(kwargs["data"])
+    )
+    assert len(write_request.timeseries) == 3
+
+
+def test_invalid_compression():
+    """Unknown codecs are rejected up front."""
+    with pytest.raises(ValueError):
+        PrometheusRemoteWriteMetricsExporter(ENDPOINT, compression="lz4")
+
+
+def test_fan_out_encodes_once_per_wire_format(mocker, make_exporter):
+    """Targets sharing a wire format share one encoded payload."""
+    post = mocker.patch("requests.Session.post", return_value=_response(mocker))
+    exporter = make_exporter(
+        targets=[
+            RemoteWriteTarget("https://grafana.example.com/push"),
+            RemoteWriteTarget("http://victoria.local:8428/api/v1/write"),
+            RemoteWriteTarget("http://mimir.local/api/v1/push", compression="gzip"),
+        ]
+    )
+    encode = mocker.spy(exporter, "_encode")
+
+    _export(exporter, _collect_metrics())
+    assert encode.call_count == 2
+    assert post.call_count == 3
+    payloads = {call.args[0]: call.kwargs["data"] for call in post.call_args_list}
+    assert (
+        payloads["https://grafana.example.com/push"]
+        == payloads["http://victoria.local:8428/api/v1/write"]
+    )
+
+
+def test_slow_target_does_not_delay_others(mocker, make_exporter):
+    """Each target sends from its own queue and retries independently."""
+    release = threading.Event()
+
+    def _post(session, url, **kwargs):
+        if "down" in url:
+            release.wait(5)
+            return _response(mocker, status_code=503)
+        return _response(mocker)
+
+    mocker.patch("requests.Session.post", autospec=True, side_effect=_post)
+    down = RemoteWriteTarget("http://down.local/push", max_retries=0)
+    up = RemoteWriteTarget("http://up.local/push")
+    exporter = make_exporter(targets=[down, up])
+
+    assert exporter.export(_collect_metrics()) == MetricExportResult.SUCCESS
+    assert up.flush(timeout=5)
+    assert up.stats.last_compressed_bytes > 0
+    assert down.pending_batches == 1
+    release.set()
+    assert down.flush(timeout=5)
+    assert down.stats.last_compressed_bytes == 0
+
+
+def test_target_retries_retryable_failures(mocker, make_exporter):
+    """5xx and 429 responses are retried, other client errors are not."""
+    post = mocker.patch(
+        "requests.Session.post",
+        side_effect=[
+            _response(mocker, status_code=503),
+            _response(mocker, status_code=429, headers={"Retry-After": "0"}),
+            _response(mocker),
+            _response(mocker, status_code=400),
+        ],
+    )
+    target = RemoteWriteTarget(ENDPOINT, retry_backoff=0)
+    exporter = make_exporter(targets=[target])
+
+    _export(exporter, _collect_metrics())
+    assert post.call_count == 3
+    assert target.stats.last_compressed_bytes > 0
+
+    _export(exporter, _collect_metrics())
+    assert post.call_count == 4
+
+
+def test_target_queue_drops_oldest_batch_when_full(mocker):
+    """A full queue drops its oldest batch instead of blocking the exporter."""
+    target = RemoteWriteTarget(ENDPOINT, max_queue_size=1)
+    mocker.patch.object(target, "_ensure_started")
+    first, second = mocker.MagicMock(), mocker.MagicMock()
+
+    target.submit(first)
+    target.submit(second)
+    assert target.stats.dropped_batches == 1
+    assert target.pending_batches == 1
+    assert target._queue.get_nowait() is second
+
+
+def test_export_stats_and_self_metrics(make_exporter, mocker):
+    """Exports are recorded and optionally sent as template_metrics_* series."""
+    post = mocker.patch(
+        "requests.Session.post", return_value=_response(mocker, status_code=204)
+    )
+    exporter = make_exporter(
+        ENDPOINT, self_metrics=True, self_metrics_attributes={"instance": "ha"}
+    )
+    _export(exporter, _collect_metrics())
+    _export(exporter, _collect_metrics())
+
+    stats = exporter.stats
+    assert stats.exports == 2
+    assert stats.last_series == 3
+    assert stats.serialize_latency.count == 2
+    assert stats.targets[0].responses == {"204": 2}
+    assert stats.targets[0].last_success is not None
+
+    write_request = WriteRequest()
+    write_request.ParseFromString(snappy.decompress(post.call_args.kwargs["data"]))
+    series = {
+        tuple((label.name, label.value) for label in ts.labels): ts.samples[0].value
+        for ts in write_request.timeseries
+    }
+    assert (
+        series[
+            (
+                ("__name__", "template_metrics_http_responses_total"),
+                ("instance", "ha"),
+                ("service_name", "homeassistant"),
+                ("status", "204"),
+                ("target", "prometheus.example.com"),
+            )
+        ]
+        == 1
+    )
+    assert (
+        series[
+            (
+                ("__name__", "template_metrics_translate_seconds_count"),
+                ("instance", "ha"),
+                ("service_name", "homeassistant"),
+            )
+        ]
+        == 2
+    )
+
+
+def test_circuit_breaker_states():
+    """Consecutive failures open the breaker until a half-open probe succeeds."""
+    now = [0.0]
+    breaker = CircuitBreaker(
+        failure_threshold=2, reset_timeout=10, clock=lambda: now[0]
+    )
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == CLOSED
+    breaker.record_failure()
+    assert not breaker.allow() and breaker.state == OPEN
+
+    now[0] = 10
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_circuit_breaker_timeout_rate():
+    """Mostly timing out requests open the breaker without consecutive failures."""
+    breaker = CircuitBreaker(failure_threshold=100, timeout_rate=0.5, window=4)
+    for timeout in (True, False, True):
+        if timeout:
+            breaker.record_failure(timeout=True)
+        else:
+            breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.record_failure(timeout=True)
+    assert breaker.state == OPEN
+
+
+def test_file_sink_batches_writes(tmp_path, mocker):
+    """Frames reach the disk once per fsync interval and decode to the export."""
+    now = [0.0]
+    fsync = mocker.spy(os, "fsync")
+    sink = FileSink(tmp_path, fsync_interval=60, clock=lambda: now[0])
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[sink])
+
+    exporter.export(_collect_metrics())
+    exporter.export(_collect_metrics())
+    assert not segments(tmp_path)
+    now[0] = 60
+    exporter.export(_collect_metrics())
+    assert fsync.call_count == 1
+    assert sink.stats.sent_batches == 3
+
+    with open(segments(tmp_path)[0], "rb") as file:
+        assert read_header(file) == ("1.0", "snappy")
+        frames = list(read_frames(file))
+    assert len(frames) == 3
+    write_request = WriteRequest()
+    write_request.ParseFromString(snappy.uncompress(frames[0]))
+    assert len(write_request.timeseries) == 3
+
+
+def test_file_sink_rotates_and_enforces_retention(tmp_path):
+    """Segments close at their size or age limit and the oldest are deleted."""
+    now = [0.0]
+    sink = FileSink(
+        tmp_path,
+        max_file_bytes=1024,
+        max_file_age=300,
+        max_total_bytes=2048,
+        fsync_interval=0,
+        clock=lambda: now[0],
+    )
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[sink])
+
+    exporter.export(_collect_metrics())
+    now[0] = 300
+    exporter.export(_collect_metrics())
+    assert len(segments(tmp_path)) == 2
+    first = segments(tmp_path)[0]
+
+    for _ in range(20):
+        exporter.export(_collect_metrics(series_count=20))
+    assert not first.exists()
+    assert sum(path.stat().st_size for path in segments(tmp_path)) <= 2048 + 1024
+    assert sink.closed_segments() == segments(tmp_path)[:-1]
+    sink.shutdown()
+
+
+def test_file_sink_ignores_truncated_frame(tmp_path):
+    """A frame cut short by power loss ends the segment."""
+    sink = FileSink(tmp_path, fsync_interval=0)
+    exporter = PrometheusRemoteWriteMetricsExporter(targets=[sink])
+    exporter.export(_collect_metrics())
+    exporter.export(_collect_metrics())
+    sink.shutdown()
+    path = segments(tmp_path)[0]
+    path.write_bytes(path.read_bytes()[:-5])
+
+    with open(path, "rb") as file:
+        read_header(file)
+        assert len(list(read_frames(file))) == 1
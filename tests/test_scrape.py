@@ -0,0 +1,129 @@
+"""Tests for the Home Assistant Metrics scrape endpoint."""
+
+import gzip
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+from homeassistant.setup import async_setup_component
+
+from custom_components.template_metrics import scrape
+from custom_components.template_metrics.const import DOMAIN
+
+
+@pytest.fixture
+async def scrape_client(
+    hass: HomeAssistant, hass_client, mock_config, mock_opentelemetry
+):
+    """Set up the integration with only the scrape endpoint enabled."""
+    for key in ("user", "token", "remote_write_url"):
+        del mock_config[DOMAIN][key]
+    mock_config[DOMAIN]["scrape_endpoint"] = True
+    mock_config[DOMAIN]["metrics"].append(
+        {
+            "name": "battery quantities",
+            "template": '{{ [{"value": 3, "attributes": {"type": "AA", "note": "say \\"hi\\""}}, {"value": 5, "attributes": {"type": ["AAA", "CR2032"], "skip": {"a": 1}}}] | tojson }}',
+        }
+    )
+    await async_setup_component(hass, "homeassistant", {})
+    await async_setup_component(hass, "http", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+    return await hass_client()
+
+
+async def test_scrape_prometheus_format(scrape_client):
+    """The endpoint serves the latest values in the Prometheus text format."""
+    response = await scrape_client.get(scrape.SCRAPE_URL)
+    assert response.status == 200
+    assert response.headers["Content-Type"] == scrape.CONTENT_TYPE_PROMETHEUS
+    body = await response.text()
+    assert body.splitlines() == [
+        "# HELP ha_temperature_adjusted HA ha_temperature_adjusted",
+        "# TYPE ha_temperature_adjusted gauge",
+        'ha_temperature_adjusted{instance="test-instance",service_name="homeassistant"}'
+        " 24.0",
+        "# HELP battery_quantities HA battery quantities",
+        "# TYPE battery_quantities gauge",
+        'battery_quantities{instance="test-instance",note="say \\"hi\\"",'
+        'service_name="homeassistant",type="AA"} 3.0',
+        'battery_quantities{instance="test-instance",service_name="homeassistant",'
+        "type=\"('AAA', 'CR2032')\"} 5.0",
+    ]
+
+
+async def test_scrape_openmetrics_gzip(scrape_client):
+    """OpenMetrics is negotiated through Accept and gzip through Accept-Encoding."""
+    response = await scrape_client.get(
+        scrape.SCRAPE_URL,
+        headers={
+            "Accept": "application/openmetrics-text; version=1.0.0",
+            "Accept-Encoding": "gzip",
+        },
+    )
+    assert response.status == 200
+    assert response.headers["Content-Type"] == scrape.CONTENT_TYPE_OPENMETRICS
+    assert response.headers["Content-Encoding"] == "gzip"
+    body = await response.text()
+    assert body.endswith("# EOF\n")
+
+
+async def test_scrape_cached_between_updates(
+    hass: HomeAssistant, scrape_client, mocker
+):
+    """Scrapes between two coordinator cycles reuse the rendered exposition."""
+    render = mocker.spy(scrape, "render_chunks")
+    for _ in range(3):
+        assert (await scrape_client.get(scrape.SCRAPE_URL)).status == 200
+    assert render.call_count == 1
+
+    hass.states.async_set("sensor.temp", "30.0")
+    await hass.data[DOMAIN]["coordinator"].async_refresh()
+    body = await (await scrape_client.get(scrape.SCRAPE_URL)).text()
+    assert render.call_count == 2
+    assert (
+        'ha_temperature_adjusted{instance="test-instance",service_name="homeassistant"}'
+        " 35.0" in body
+    )
+
+
+async def test_scrape_cached_before_first_refresh(
+    hass: HomeAssistant, scrape_client, mocker
+):
+    """Scrapes before the coordinator has data render the empty exposition once."""
+    mocker.patch.object(hass.data[DOMAIN]["coordinator"], "data", None)
+    render = mocker.spy(scrape, "render_chunks")
+    for _ in range(3):
+        response = await scrape_client.get(scrape.SCRAPE_URL)
+        assert response.status == 200
+        assert await response.text() == ""
+    assert render.call_count == 1
+
+
+def test_exposition_chunks(mocker):
+    """Large expositions are split between families and gzip as one stream."""
+    mocker.patch.object(scrape, "STREAM_CHUNK_SIZE", 100)
+    series = {f"metric_{index}": [({"entity": "x" * 40}, 1.0)] for index in range(5)}
+
+    chunks = scrape.render_chunks(series, openmetrics=True)
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith(b"# HELP") for chunk in chunks)
+    body = b"".join(chunks)
+    assert body == scrape.render_exposition(series, openmetrics=True)
+    assert body.endswith(b"# EOF\n")
+    assert gzip.decompress(b"".join(scrape._gzip_chunks(chunks))) == body
+
+
+async def test_scrape_requires_auth(hass: HomeAssistant, scrape_client, aiohttp_client):
+    """Scrapers must present a Home Assistant access token."""
+    client = await aiohttp_client(hass.http.app)
+    response = await client.get(scrape.SCRAPE_URL)
+    assert response.status == 401
+
+
+def test_empty_exposition():
+    """Without series OpenMetrics still ends with # EOF, the text format is empty."""
+    assert scrape.render_exposition({}, openmetrics=True) == b"# EOF\n"
+    assert scrape.render_exposition({}) == b""
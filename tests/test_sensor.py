@@ -0,0 +1,73 @@
+"""Tests for Home Assistant Metrics diagnostic sensors."""
+
+from homeassistant.core import HomeAssistant
+from homeassistant.setup import async_setup_component
+
+from custom_components.template_metrics.const import DOMAIN
+
+
+async def test_diagnostic_sensors(hass: HomeAssistant, mock_config, mock_opentelemetry):
+    """Export statistics are exposed as sensors and follow coordinator updates."""
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+
+    state = hass.states.get("sensor.template_metrics_exported_series")
+    assert state is not None
+    assert state.state == "0"
+    state = hass.states.get(
+        "sensor.template_metrics_prometheus_example_com_last_success"
+    )
+    assert state is not None
+    assert state.state == "unknown"
+
+    stats = hass.data[DOMAIN]["export_stats"]
+    stats.record_export(series=3, samples=6, seconds=0.002)
+    stats.targets[0].last_success = 1_700_000_000.0
+    stats.targets[0].record_response("204", 0.05)
+    hass.states.async_set("sensor.temp", "21.0")
+    await hass.data[DOMAIN]["coordinator"].async_refresh()
+
+    assert hass.states.get("sensor.template_metrics_exported_series").state == "3"
+    assert hass.states.get("sensor.template_metrics_translate_duration").state == "2.0"
+    state = hass.states.get(
+        "sensor.template_metrics_prometheus_example_com_request_duration"
+    )
+    assert state.state == "50.0"
+    assert state.attributes["responses"] == {"204": 1}
+    assert (
+        hass.states.get(
+            "sensor.template_metrics_prometheus_example_com_last_success"
+        ).state
+        == "2023-11-14T22:13:20+00:00"
+    )
+
+
+async def test_targets_on_one_host(
+    hass: HomeAssistant, mock_config, mock_opentelemetry
+):
+    """Targets sharing a host are told apart by their path."""
+    mock_config[DOMAIN]["remote_write"] = [
+        {"url": "http://victoria.local:8428/api/v1/write"},
+        {"url": "http://victoria.local:8428/insert/1/prometheus/api/v1/write"},
+    ]
+    await async_setup_component(hass, "homeassistant", {})
+    hass.states.async_set("sensor.temp", "20.0")
+    assert await async_setup_component(hass, DOMAIN, mock_config)
+    await hass.async_block_till_done()
+
+    for entity_id in (
+        "sensor.template_metrics_victoria_local_8428_api_v1_write_last_success",
+        "sensor.template_metrics_victoria_local_8428_insert_1_prometheus_api_v1_write"
+        "_last_success",
+    ):
+        assert hass.states.get(entity_id) is not None
+    breakers = hass.states.get("binary_sensor.template_metrics_connection").attributes[
+        "circuit_breakers"
+    ]
+    assert list(breakers) == [
+        "prometheus.example.com",
+        "victoria.local:8428/api/v1/write",
+        "victoria.local:8428/insert/1/prometheus/api/v1/write",
+    ]
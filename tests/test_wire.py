@@ -0,0 +1,102 @@
+"""Tests for the remote write protobuf wire encoder."""
+
+import math
+
+import pytest
+
+from custom_components.template_metrics.prometheus_remote_write.gen.remote_pb2 import (
+    WriteRequest,
+)
+from custom_components.template_metrics.prometheus_remote_write.gen.types_pb2 import (
+    Label,
+    Sample,
+    TimeSeries,
+)
+from custom_components.template_metrics.prometheus_remote_write.gen.write_v2_pb2 import (
+    Metadata,
+    Request,
+)
+from custom_components.template_metrics.prometheus_remote_write.wire import (
+    WriteRequestEncoder,
+    encode_label_block,
+    encode_varint,
+)
+
+SERIES = [
+    (
+        (("__name__", "battery_level"), ("entity_id", "sensor.remote"), ("type", "AA")),
+        [(87.5, 1_760_000_000_000)],
+        Metadata.METRIC_TYPE_GAUGE,
+    ),
+    (
+        (("__name__", "battery_level"), ("entity_id", "sensor.tür"), ("type", "")),
+        [(0.0, 1_760_000_000_000), (-0.0, 1_760_000_060_000), (math.inf, 0)],
+        Metadata.METRIC_TYPE_GAUGE,
+    ),
+    (
+        (("__name__", "requests_total"), ("le", "+Inf")),
+        [(3, -1), (1e300, 2**62)],
+        Metadata.METRIC_TYPE_COUNTER,
+    ),
+    ((), [], Metadata.METRIC_TYPE_UNSPECIFIED),
+]
+
+
+def _reference_v1(series) -> bytes:
+    write_request = WriteRequest()
+    for labels, samples, _ in series:
+        timeseries = TimeSeries()
+        for name, value in labels:
+            timeseries.labels.append(Label(name=name, value=value))
+        for value, timestamp in samples:
+            timeseries.samples.append(Sample(value=float(value), timestamp=timestamp))
+        write_request.timeseries.append(timeseries)
+    return write_request.SerializeToString()
+
+
+def _reference_v2(series) -> bytes:
+    write_request = Request()
+    symbols = {"": 0}
+    for labels, samples, metric_type in series:
+        timeseries = write_request.timeseries.add()
+        for name, value in labels:
+            for string in (name, value):
+                timeseries.labels_refs.append(symbols.setdefault(string, len(symbols)))
+        for value, timestamp in samples:
+            timeseries.samples.add(value=float(value), timestamp=timestamp)
+        timeseries.metadata.type = metric_type
+    write_request.symbols.extend(symbols)
+    return write_request.SerializeToString()
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 300, 2**35, 2**63 - 1, -1, -(2**63)])
+def test_encode_varint_matches_protobuf(value):
+    """Varints, including negative int64 values, match the generated classes."""
+    expected = Sample(timestamp=value).SerializeToString()
+    assert (b"\x10" + encode_varint(value) if value else b"") == expected
+
+
+def test_encode_v1_matches_generated_classes():
+    """The 1.0 encoder output is byte for byte the generated serialization."""
+    encoder = WriteRequestEncoder()
+    encoded = encoder.encode_v1(
+        (encode_label_block(labels), samples) for labels, samples, _ in SERIES
+    )
+    assert encoded == _reference_v1(SERIES)
+
+
+def test_encode_v2_matches_generated_classes():
+    """The 2.0 encoder output is byte for byte the generated serialization."""
+    encoder = WriteRequestEncoder()
+    assert encoder.encode_v2(SERIES) == _reference_v2(SERIES)
+
+
+def test_encoder_reuse():
+    """Reusing one encoder never leaks bytes from a previous request."""
+    encoder = WriteRequestEncoder()
+    encoder.encode_v2(SERIES)
+    encoder.encode_v1(
+        (encode_label_block(labels), samples) for labels, samples, _ in SERIES
+    )
+    assert encoder.encode_v2(SERIES[:1]) == _reference_v2(SERIES[:1])
+    assert encoder.encode_v1([]) == b""